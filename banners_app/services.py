@@ -1,12 +1,10 @@
-from datetime import datetime
 from banners_app.models import Banner
+from discounts_app.services import get_active_discounts_q
 
 
 def banner():
-    """Функция получения трех случаных баннеров для главной страницы"""
-    banners = Banner.objects.prefetch_related('discount'). \
-        filter(discount__valid_from__lte=datetime.now()). \
-        filter(discount__valid_to__gte=datetime.now()). \
-        filter(discount__is_active=True). \
+    """Функция получения трех случаных баннеров действующих скидок для главной страницы"""
+    banners = Banner.objects.select_related('discount'). \
+        filter(get_active_discounts_q('discount__')). \
         order_by('?')[:3]
     return banners
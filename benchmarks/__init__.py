@@ -0,0 +1,4 @@
+"""
+Benchmarks of the pricing hot paths: cart discounts, prices of products in shops and catalog views.
+Run them with ``python manage.py run_benchmarks``
+"""
@@ -0,0 +1,121 @@
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from benchmarks.data import SyntheticData
+from discounts_app.rule_sets import reset_discount_rules
+from discounts_app.services import DiscountsService, get_discounted_prices_for_seller_products
+from orders_app.models import OrderProduct
+from orders_app.services.cart import CartService
+from profiles_app.models import User
+from stores_app.models import SellerProduct
+
+CART_LINES = (1, 10, 50)
+PRODUCTS_COUNTS = (10, 1000, 100000)
+
+
+def measure(name: str, params: Dict, func: Callable, repeat: int, setup: Optional[Callable] = None) -> Dict:
+    """
+    Run the function repeat times and report wall time, then run it once more to count queries
+    and trace the peak memory. Setup is called before every run and is not measured
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'name': name,
+        'params': params,
+        'wall_time': {'min': min(timings), 'median': statistics.median(timings), 'max': max(timings)},
+        'queries': len(queries),
+        'peak_memory': peak_memory,
+    }
+
+
+def make_cart(data: SyntheticData, lines: int) -> CartService:
+    """
+    Make the cart of the customer with products in shops of the first seller
+    """
+    request = RequestFactory().get('/')
+    request.user = User.objects.get(pk=data.customer_id)
+    cart = CartService(request)
+    cart.cart.order_products.all().delete()
+    seller_products_ids = SellerProduct.objects.filter(seller_id=data.sellers_ids[0]).order_by('pk') \
+                                               .values_list('pk', flat=True)[:lines]
+    OrderProduct.objects.bulk_create(OrderProduct(order=cart.cart, seller_product_id=seller_product_id, quantity=1)
+                                     for seller_product_id in seller_products_ids)
+    return cart
+
+
+def cart_cases(data: SyntheticData, repeat: int) -> List[Dict]:
+    """
+    Time pricing of carts with cold and warm discount rule sets
+    """
+    results = []
+    for lines in CART_LINES:
+        cart = make_cart(data, lines)
+
+        def price_cart():
+            discount_service = DiscountsService(cart)
+            return [discount_service.get_discounted_price(product) for product in discount_service.goods]
+
+        results.append(measure('discounts_service', {'lines': lines, 'rule_sets': 'cold'}, price_cart, repeat,
+                               setup=lambda: reset_discount_rules(data.sellers_ids)))
+        results.append(measure('discounts_service', {'lines': lines, 'rule_sets': 'warm'}, price_cart, repeat))
+    return results
+
+
+def prices_cases(data: SyntheticData, repeat: int) -> List[Dict]:
+    """
+    Time prices after discounts of lists of products in shops
+    """
+    results = []
+    for count in PRODUCTS_COUNTS:
+        if count > len(data.seller_products_ids):
+            continue
+        products = list(SellerProduct.objects.filter(pk__in=data.seller_products_ids[:count]))
+        results.append(measure('discounted_prices', {'products': count},
+                               lambda: list(get_discounted_prices_for_seller_products(products)), repeat))
+    return results
+
+
+def catalog_cases(repeat: int) -> List[Dict]:
+    """
+    Time the catalog page and the sorted catalog page loaded by ajax with cold and warm caches
+    """
+    client = Client()
+
+    def get_page(url: str, params: Dict) -> None:
+        response = client.get(url, params)
+        if response.status_code != 200:
+            raise RuntimeError('{} responded with status {}'.format(url, response.status_code))
+
+    results = []
+    requests = [
+        ('catalog_page', reverse('goods-polls:catalog_url'), {}),
+        ('catalog_ajax', reverse('goods-polls:ajax_full'), {'sort_type': 'price_inc'}),
+    ]
+    for name, url, params in requests:
+        results.append(measure(name, {**params, 'cache': 'cold'}, lambda: get_page(url, params), repeat,
+                               setup=cache.clear))
+        results.append(measure(name, {**params, 'cache': 'warm'}, lambda: get_page(url, params), repeat))
+    return results
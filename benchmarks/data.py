@@ -0,0 +1,95 @@
+import math
+import random
+import uuid
+from decimal import Decimal
+from typing import List, NamedTuple
+
+from discounts_app.models import ProductDiscount, GroupDiscount, CartDiscount
+from discounts_app.services import refresh_effective_prices
+from goods_app.models import Product, ProductCategory
+from profiles_app.models import User
+from stores_app.models import Seller, SellerProduct
+
+BATCH_SIZE = 5000
+
+
+class SyntheticData(NamedTuple):
+    """
+    Ids of the generated data used by benchmark cases
+    """
+    customer_id: int
+    sellers_ids: List[int]
+    seller_products_ids: List[int]
+
+
+def generate_data(seller_products_count: int, sellers_count: int = 10, categories_count: int = 20,
+                  seed: int = 0) -> SyntheticData:
+    """
+    Generate sellers, categories, products, products in shops and product, group and cart discounts.
+    Every product is offered by every seller, every tenth product in shop has a product discount
+    (every tenth of them is a set discount), every seller has group discounts on three categories and a cart discount
+    """
+    rand = random.Random(seed)
+    prefix = 'bench-{}'.format(uuid.uuid4().hex[:8])
+
+    owner = User.objects.create_user(email=f'{prefix}-owner@example.com', password=uuid.uuid4().hex,
+                                     first_name='Benchmark', last_name='Owner', phone='+7(900)000-00-01')
+    customer = User.objects.create_user(email=f'{prefix}-customer@example.com', password=uuid.uuid4().hex,
+                                        first_name='Benchmark', last_name='Customer', phone='+7(900)000-00-02')
+    sellers = [Seller.objects.create(name=f'Seller {index}', slug=f'{prefix}-seller-{index}', owner=owner)
+               for index in range(sellers_count)]
+    categories = [ProductCategory.objects.create(name=f'Category {index}', slug=f'{prefix}-category-{index}')
+                  for index in range(categories_count)]
+
+    products_count = math.ceil(seller_products_count / sellers_count)
+    Product.objects.bulk_create(
+        (Product(category=rand.choice(categories), name=f'Product {index}', slug=f'{prefix}-product-{index}')
+         for index in range(products_count)),
+        batch_size=BATCH_SIZE,
+    )
+    products_ids = list(Product.objects.filter(slug__startswith=prefix).order_by('pk').values_list('pk', flat=True))
+    SellerProduct.objects.bulk_create(
+        (SellerProduct(seller=sellers[index % sellers_count], product_id=products_ids[index // sellers_count],
+                       price=Decimal(rand.randint(100, 10 ** 7)).scaleb(-2), quantity=rand.randint(1, 100))
+         for index in range(seller_products_count)),
+        batch_size=BATCH_SIZE,
+    )
+    seller_products = list(SellerProduct.objects.filter(seller__in=sellers).order_by('pk')
+                                                .values_list('pk', 'seller_id'))
+
+    discounts, links = [], []
+    for index in range(0, len(seller_products), 10):
+        seller_product_id, seller_id = seller_products[index]
+        set_discount = index % 100 == 0
+        discounts.append(ProductDiscount(
+            seller_id=seller_id, name=f'Discount {index}', slug=f'{prefix}-discount-{index}', is_active=True,
+            type_of_discount=rand.choice(['p', 'f', 'fp']), priority=rand.choice(['1', '2', '3']),
+            percent=rand.randint(1, 50), amount=rand.randint(1, 1000), fixed_price=rand.randint(1, 1000),
+            set_discount=set_discount,
+        ))
+        links.append([seller_product_id] + ([seller_products[index + 1][0]]
+                                            if set_discount and index + 1 < len(seller_products) else []))
+    ProductDiscount.objects.bulk_create(discounts, batch_size=BATCH_SIZE)
+    discounts_ids = list(ProductDiscount.objects.filter(slug__startswith=prefix).order_by('pk')
+                                                .values_list('pk', flat=True))
+    ProductDiscount.seller_products.through.objects.bulk_create(
+        (ProductDiscount.seller_products.through(productdiscount_id=discount_id, sellerproduct_id=seller_product_id)
+         for discount_id, seller_products_ids in zip(discounts_ids, links)
+         for seller_product_id in seller_products_ids),
+        batch_size=BATCH_SIZE,
+    )
+
+    GroupDiscount.objects.bulk_create(
+        GroupDiscount(seller=seller, product_category=category, name=f'Group {seller.pk}-{category.pk}',
+                      is_active=True, percent=rand.randint(1, 30), priority=rand.choice(['1', '2']))
+        for seller in sellers for category in rand.sample(categories, min(3, len(categories)))
+    )
+    CartDiscount.objects.bulk_create(
+        CartDiscount(seller=seller, name=f'Cart {seller.pk}', is_active=True, percent=5, priority='1',
+                     min_quantity_threshold=3, max_quantity_threshold=100)
+        for seller in sellers
+    )
+
+    refresh_effective_prices()
+    return SyntheticData(customer.pk, [seller.pk for seller in sellers],
+                         [seller_product_id for seller_product_id, _ in seller_products])
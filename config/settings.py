@@ -132,12 +132,17 @@ DATABASES = {
     }
 }
 
+# кэш должен быть общим для процессов приложения (например, memcached): в нем хранятся версии индексов в памяти
+# процессов и анонимные корзины. Локальный кэш процесса допустим только при DEBUG
+# (settings_app.utils.check_shared_cache)
 CACHES = {
     'default': {
         'BACKEND': env.str('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
         'LOCATION': env.str('CACHE_LOCATION', default=''),
     }
 }
+# время жизни версий данных, общих для процессов: по его истечении процессы перестраивают свои индексы, секунды
+CACHE_VERSION_TIME = 60 * 60
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -218,6 +223,12 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'profiles_app.User'
 
 CART_SESSION_ID = 'cart'
+CART_ID_SESSION_KEY = 'cart_id'
+# минимальный интервал сохранения снимка анонимной корзины из кэша в сессию, секунды
+CART_PERSIST_INTERVAL = 5 * 60
+
+# время резерва товаров корзины на складе, секунды
+STOCK_HOLD_TIME = 60 * 60
 
 SESSION_ENGINE = 'config.session_backend'
 
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from discounts_app.services import refresh_effective_prices
+from goods_app.services.card_cache import invalidate_cards
+from goods_app.services.catalog_cache import reset_catalog_cache
+from stores_app.models import SellerProduct
+
+
+class Command(BaseCommand):
+    help = 'Recalculate effective prices of all products in shops or products of one shop'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--seller',
+                            type=str,
+                            help='Slug of the shop, which products should be repriced')
+
+    def handle(self, *args, **kwargs) -> None:
+        seller_products_ids = None
+        if kwargs['seller']:
+            seller_products_ids = SellerProduct.objects.filter(seller__slug=kwargs['seller']) \
+                                                       .values_list('pk', flat=True)
+        changed_ids = refresh_effective_prices(seller_products_ids)
+        if changed_ids:
+            invalidate_cards(changed_ids)
+            reset_catalog_cache()
+        self.stdout.write(self.style.SUCCESS(
+            f'Effective prices were changed for {len(changed_ids)} products in shops!'
+        ))
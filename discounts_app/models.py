@@ -88,6 +88,9 @@ class ProductDiscount(Discount):
         verbose_name = _('product discount')
         verbose_name_plural = _('product discounts')
         db_table = 'product_discounts'
+        indexes = [
+            models.Index(fields=['is_active', 'valid_from', 'valid_to'], name='product_discount_active_idx'),
+        ]
 
     def get_absolute_url(self) -> Callable:
         return reverse('discounts-polls:discount-detail', kwargs={'slug': self.slug,
@@ -129,3 +132,22 @@ class CartDiscount(Discount):
         verbose_name = _('cart discount')
         verbose_name_plural = _('cart discounts')
         db_table = 'cart_discounts'
+
+
+class EffectivePrice(models.Model):
+    """
+    Модель текущей цены товара продавца с учетом приоритетной товарной скидки.
+    Пересчитывается сигналами скидок и товаров продавцов, а также периодической задачей
+    при наступлении next_change_at - ближайшей границы срока действия скидок товара
+    """
+    seller_product = models.OneToOneField(SellerProduct, on_delete=models.CASCADE, primary_key=True,
+                                          related_name='effective_price', verbose_name=_('Seller product'))
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_('Price'))
+    discount = models.ForeignKey(ProductDiscount, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='effective_prices', verbose_name=_('Discount'))
+    next_change_at = models.DateTimeField(null=True, blank=True, db_index=True, verbose_name=_('Next change at'))
+
+    class Meta:
+        verbose_name = _('effective price')
+        verbose_name_plural = _('effective prices')
+        db_table = 'effective_prices'
@@ -0,0 +1,161 @@
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, Mapping, NamedTuple, Set, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from discounts_app.models import ProductDiscount, GroupDiscount, CartDiscount
+
+
+class SellerRuleSet(NamedTuple):
+    """
+    Compiled active and future discounts of the seller:
+    product discounts by product in shop id (sorted by priority), group discounts by category id, cart discounts,
+    products in shops and sums of their prices for set discounts by discount id
+    """
+    seller_id: int
+    version: str
+    product_discounts: Mapping[int, Tuple[ProductDiscount, ...]]
+    group_discounts: Mapping[int, Tuple[GroupDiscount, ...]]
+    cart_discounts: Tuple[CartDiscount, ...]
+    set_products: Mapping[int, FrozenSet[int]]
+    set_sums: Mapping[int, Decimal]
+
+
+_rule_sets: Dict[int, SellerRuleSet] = {}
+# продавцы, наборы правил которых сброшены в еще не зафиксированной транзакции процесса
+_uncommitted_sellers: Set[int] = set()
+
+
+def get_rules_version_key(seller_id: int) -> str:
+    """
+    Get cache key of the discount rule set version of the seller
+    """
+    return 'discount_rules:{}:version'.format(seller_id)
+
+
+def reset_discount_rules(sellers_ids: Iterable[int]) -> None:
+    """
+    Mark discount rule sets of the sellers as stale. The current process drops them at once and does not keep
+    rule sets compiled inside the transaction; other processes get new versions, when the transaction is committed,
+    so they do not compile rule sets from changes, which are not committed yet
+    """
+    sellers_ids = set(sellers_ids)
+    if not sellers_ids:
+        return
+    for seller_id in sellers_ids:
+        _rule_sets.pop(seller_id, None)
+    _uncommitted_sellers.update(sellers_ids)
+
+    def reset_versions():
+        cache.delete_many([get_rules_version_key(seller_id) for seller_id in sellers_ids])
+        _uncommitted_sellers.difference_update(sellers_ids)
+
+    transaction.on_commit(reset_versions)
+
+
+def get_rules_versions(sellers_ids: Iterable[int]) -> Dict[int, str]:
+    """
+    Get rule set versions of the sellers by one cache request. Missing version gets a new random value.
+    Versions expire in CACHE_VERSION_TIME, so a rule set is never kept in memory longer
+    """
+    keys = {get_rules_version_key(seller_id): seller_id for seller_id in sellers_ids}
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, settings.CACHE_VERSION_TIME)
+        versions.update(missing)
+    return {seller_id: versions[key] for key, seller_id in keys.items()}
+
+
+def is_discount_valid(discount, now: datetime) -> bool:
+    """
+    Check that the current moment is inside the validity period of the discount
+    """
+    return (discount.valid_from is None or discount.valid_from <= now) and \
+        (discount.valid_to is None or discount.valid_to >= now)
+
+
+def group_by(pairs: Iterable[Tuple[int, object]]) -> Dict[int, list]:
+    result: Dict[int, list] = {}
+    for key, value in pairs:
+        result.setdefault(key, []).append(value)
+    return result
+
+
+def compile_rule_sets(versions: Dict[int, str]) -> Dict[int, SellerRuleSet]:
+    """
+    Compile rule sets of the sellers by a fixed number of queries. Expired and inactive discounts are skipped
+    """
+    sellers_ids = list(versions)
+    not_expired = Q(valid_to__isnull=True) | Q(valid_to__gte=timezone.now())
+
+    cart_discounts = group_by((discount.seller_id, discount) for discount in CartDiscount.objects.filter(
+        not_expired, seller_id__in=sellers_ids, is_active=True).order_by('pk'))
+    group_discounts = group_by((discount.seller_id, discount) for discount in GroupDiscount.objects.filter(
+        not_expired, seller_id__in=sellers_ids, is_active=True).order_by('pk'))
+
+    through = ProductDiscount.seller_products.through.objects
+    links = list(through.filter(
+        sellerproduct__seller_id__in=sellers_ids,
+        productdiscount__in=ProductDiscount.objects.filter(not_expired, is_active=True),
+    ).values_list('sellerproduct__seller_id', 'sellerproduct_id', 'productdiscount_id'))
+    discounts = ProductDiscount.objects.in_bulk({discount_id for _, _, discount_id in links})
+    set_discounts_ids = [discount.pk for discount in discounts.values() if discount.set_discount]
+    set_products: Dict[int, set] = {}
+    set_sums: Dict[int, Decimal] = {}
+    for discount_id, seller_product_id, price in through.filter(productdiscount_id__in=set_discounts_ids) \
+            .values_list('productdiscount_id', 'sellerproduct_id', 'sellerproduct__price'):
+        set_products.setdefault(discount_id, set()).add(seller_product_id)
+        set_sums[discount_id] = set_sums.get(discount_id, Decimal(0)) + price
+
+    rule_sets = {}
+    for seller_id in sellers_ids:
+        seller_links = [(seller_product_id, discounts[discount_id])
+                        for link_seller_id, seller_product_id, discount_id in links if link_seller_id == seller_id]
+        product_discounts = {
+            seller_product_id: tuple(sorted(items, key=lambda discount: (-int(discount.priority), discount.pk)))
+            for seller_product_id, items in group_by(seller_links).items()
+        }
+        seller_set_ids = {discount.pk for _, discount in seller_links if discount.set_discount}
+        rule_sets[seller_id] = SellerRuleSet(
+            seller_id=seller_id,
+            version=versions[seller_id],
+            product_discounts=MappingProxyType(product_discounts),
+            group_discounts=MappingProxyType({
+                category_id: tuple(items) for category_id, items in group_by(
+                    (discount.product_category_id, discount) for discount in group_discounts.get(seller_id, [])
+                ).items()
+            }),
+            cart_discounts=tuple(cart_discounts.get(seller_id, [])),
+            set_products=MappingProxyType({discount_id: frozenset(set_products.get(discount_id, ()))
+                                           for discount_id in seller_set_ids}),
+            set_sums=MappingProxyType({discount_id: set_sums.get(discount_id, Decimal(0))
+                                       for discount_id in seller_set_ids}),
+        )
+    return rule_sets
+
+
+def get_rule_sets(sellers_ids: Iterable[int]) -> Dict[int, SellerRuleSet]:
+    """
+    Get discount rule sets of the sellers from the process memory. Versions are checked by one cache request,
+    only stale or not loaded rule sets are compiled from the database. Rule sets of the sellers changed in
+    the not committed transaction are compiled inside it for every call and are not kept in memory
+    """
+    versions = get_rules_versions(set(sellers_ids))
+    stale = {seller_id: version for seller_id, version in versions.items()
+             if seller_id not in _rule_sets or _rule_sets[seller_id].version != version}
+    compiled = compile_rule_sets(stale) if stale else {}
+    in_transaction = transaction.get_connection().in_atomic_block
+    for seller_id, rule_set in compiled.items():
+        if not in_transaction or seller_id not in _uncommitted_sellers:
+            _uncommitted_sellers.discard(seller_id)
+            _rule_sets[seller_id] = rule_set
+    return {seller_id: compiled[seller_id] if seller_id in compiled else _rule_sets[seller_id]
+            for seller_id in versions}
@@ -1,12 +1,36 @@
 import decimal
-from datetime import date
+from datetime import datetime
 from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import transaction
+from django.db.models import Case, When, F, Q, QuerySet, DecimalField, Min, Sum
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from discounts_app.models import ProductDiscount, EffectivePrice
+from discounts_app.rule_sets import SellerRuleSet, get_rule_sets, is_discount_valid
+from goods_app.services.category_tree import get_category_ancestors
+from settings_app.utils import get_cache_version, bump_cache_version
+from stores_app.models import SellerProduct
+
+ACTIVE_DISCOUNTS_VERSION_KEY = 'active_discounts:version'
+ACTIVE_DISCOUNTS_CACHE_TIME = 10 * 60
 
 
 class DiscountsService:
     """
     Сервис расчета скидок
 
+    Скидки на товары корзины (корзинные скидки продавцов, групповые скидки категорий и товарные скидки) берутся
+    из скомпилированных наборов правил продавцов корзины в памяти процесса, без запросов к БД.
+    Групповая скидка действует на товары категории и всех ее подкатегорий: категории товара и ее предков
+    берутся из карты предков дерева категорий
+
     get_all_discounts_for_products: метод получения всех скидок на список товаров
     get_all_discounts_for_product: метод получения всех скидок на список товаров
     get_priority_discounts_for_products: метод получения приоритетных скидок на список товаров
@@ -16,8 +40,41 @@ class DiscountsService:
 
     def __init__(self, cart):
         self.cart = cart
+        self.goods = list(cart.get_goods())
+        self.seller_products = [self.get_seller_product(product) for product in self.goods]
+        self.total_sum = self.get_cart_total_sum()
+        self.load_discounts()
         self.discounts = self.get_priority_discounts_for_products()
 
+    @staticmethod
+    def get_seller_product(product) -> SellerProduct:
+        """
+        Получить товар продавца строки корзины
+        """
+        if product.__class__.__name__ == 'OrderProduct':
+            return product.seller_product
+        return product['seller_product']
+
+    def get_cart_total_sum(self) -> Decimal:
+        """
+        Получить общую стоимость товаров корзины без скидок
+        """
+        if self.goods and self.goods[0].__class__.__name__ == 'OrderProduct':
+            return Decimal(sum(product.seller_product.price * product.quantity for product in self.goods))
+        return self.cart.get_total_sum()
+
+    def load_discounts(self) -> None:
+        """
+        Загрузить наборы правил скидок продавцов корзины, товары и суммы наборов наборных скидок
+        """
+        self.now = timezone.now()
+        self.rule_sets = get_rule_sets(seller_product.seller_id for seller_product in self.seller_products)
+        self.category_ancestors = get_category_ancestors()
+        self.set_products, self.set_sums = {}, {}
+        for rule_set in self.rule_sets.values():
+            self.set_products.update(rule_set.set_products)
+            self.set_sums.update(rule_set.set_sums)
+
     def get_all_discounts_for_products(self) -> set:
         """
         Получить все скидки на список товаров
@@ -25,8 +82,7 @@ class DiscountsService:
         discounts: список иснтансов скидок
         """
         discounts = []
-        products = self.cart.get_goods()
-        for product in products:
+        for product in self.goods:
             discounts += self.get_all_discounts_for_product(product)
 
         return set(discounts)
@@ -55,55 +111,22 @@ class DiscountsService:
 
         return priority_discounts
 
-    @staticmethod
-    def get_all_discounts_for_product(product):
+    def get_all_discounts_for_product(self, product) -> list:
         """
         Получить все скидки на товар
 
         discounts: список иснтансов скидок
         """
+        seller_product = self.get_seller_product(product)
+        rule_set = self.rule_sets[seller_product.seller_id]
         discounts = []
+        discounts += rule_set.cart_discounts
+        category_id = seller_product.product.category_id
+        for ancestor_id in self.category_ancestors.get(category_id, (category_id,)):
+            discounts += rule_set.group_discounts.get(ancestor_id, ())
+        discounts += rule_set.product_discounts.get(seller_product.pk, ())
 
-        if product.__class__.__name__ == 'OrderProduct':
-            discounts += product.seller_product.seller.cart_discounts.filter(valid_from=None,
-                                                                             valid_to=None,
-                                                                             is_active=True).all() | \
-                         product.seller_product.seller.cart_discounts.filter(valid_from__lte=date.today(),
-                                                                             valid_to__gte=date.today(),
-                                                                             is_active=True).all()
-            discounts += product.seller_product.product.category.group_discounts.filter(valid_from=None,
-                                                                                        valid_to=None,
-                                                                                        is_active=True).all() | \
-                         product.seller_product.product.category.group_discounts.filter(valid_from__lte=date.today(),
-                                                                                        valid_to__gte=date.today(),
-                                                                                        is_active=True).all()
-            discounts += product.seller_product.product_discounts.filter(valid_from=None,
-                                                                         valid_to=None,
-                                                                         is_active=True).all() | \
-                         product.seller_product.product_discounts.filter(valid_from__lte=date.today(),
-                                                                         valid_to__gte=date.today(),
-                                                                         is_active=True).all()
-        else:
-            discounts += product['seller_product'].seller.cart_discounts.filter(valid_from=None,
-                                                                                valid_to=None,
-                                                                                is_active=True).all() | \
-                         product['seller_product'].seller.cart_discounts.filter(valid_from__lte=date.today(),
-                                                                                valid_to__gte=date.today(),
-                                                                                is_active=True).all()
-            discounts += product['seller_product'].product.category.group_discounts.filter(valid_from=None,
-                                                                                           valid_to=None,
-                                                                                           is_active=True).all() | \
-                         product['seller_product'].product.category.group_discounts.filter(valid_from__lte=date.today(),
-                                                                                           valid_to__gte=date.today(),
-                                                                                           is_active=True).all()
-            discounts += product['seller_product'].product_discounts.filter(valid_from=None,
-                                                                            valid_to=None,
-                                                                            is_active=True).all() | \
-                         product['seller_product'].product_discounts.filter(valid_from__lte=date.today(),
-                                                                            valid_to__gte=date.today(),
-                                                                            is_active=True).all()
-
-        return discounts
+        return [discount for discount in discounts if is_discount_valid(discount, self.now)]
 
     def get_priority_discounts_for_product(self, product):
         """
@@ -127,23 +150,13 @@ class DiscountsService:
         """
         Проверка применимости корзинной скидки для данной корзины
         """
-        cart_products = self.cart.get_goods()
-        if cart_products.__class__.__name__ == 'QuerySet':
-            ids = []
-            for product in cart_products:
-                ids.append(product.seller_product.seller.id)
-            length = len(set(ids))
-        else:
-            ids = []
-            for product in cart_products:
-                ids.append(product['seller_product'].seller.id)
-            length = len(set(ids))
+        length = len({seller_product.seller_id for seller_product in self.seller_products})
 
         if length > 1:
             return False
-        if discount.min_quantity_threshold <= len(self.cart) <= discount.max_quantity_threshold:
+        if discount.min_quantity_threshold <= len(self.goods) <= discount.max_quantity_threshold:
             return True
-        if discount.total_sum_min_threshold <= self.cart.get_total_sum() <= discount.total_sum_max_threshold:
+        if discount.total_sum_min_threshold <= self.total_sum <= discount.total_sum_max_threshold:
             return True
 
         return False
@@ -152,13 +165,8 @@ class DiscountsService:
         """
         Проверка применимости наборной скидки для данного набора
         """
-        cart_products = self.cart.get_goods()
-        if cart_products.__class__.__name__ == 'QuerySet':
-            cart_products = [item.seller_product for item in cart_products]
-        else:
-            cart_products = [item['seller_product'] for item in cart_products]
-        discount_set_products = [item for item in discount.seller_products.all()]
-        if set(discount_set_products) & set(cart_products) == set(discount_set_products):
+        discount_set_products = self.set_products.get(discount.pk, frozenset())
+        if discount_set_products <= {seller_product.pk for seller_product in self.seller_products}:
             return True
         return False
 
@@ -176,10 +184,10 @@ class DiscountsService:
         if product_discounts:
             for discount in product_discounts:
                 if discount.__class__.__name__ == 'CartDiscount':
-                    cart_sum = self.cart.get_total_sum()
+                    cart_sum = self.total_sum
                     discounted_price = implement_discount(price, discount, cart_sum)
                 else:
-                    discounted_price = implement_discount(price, discount)
+                    discounted_price = implement_discount(price, discount, set_sum=self.set_sums.get(discount.pk))
                 prices.append(discounted_price)
 
         if prices:
@@ -197,15 +205,15 @@ class DiscountsService:
         return self.get_discounted_price_in_cart(product)
 
 
-def implement_discount(price: decimal, discount, cart_sum=None):
-    """Функция расчета цены со скидкой"""
+def implement_discount(price: decimal, discount, cart_sum=None, set_sum=None):
+    """Функция расчета цены со скидкой. set_sum - сумма цен товаров наборной скидки, если уже известна"""
     if discount.__class__.__name__ == 'ProductDiscount' and \
             discount.set_discount is True or cart_sum:
 
         if discount.type_of_discount == 'f':
             if cart_sum:
                 set_sum = cart_sum
-            else:
+            elif set_sum is None:
                 set_sum = sum([item.price for item in discount.seller_products.all()])
             set_sum_with_discount = set_sum - Decimal(discount.amount)
             price = Decimal(price * set_sum_with_discount / set_sum)
@@ -224,34 +232,261 @@ def implement_discount(price: decimal, discount, cart_sum=None):
     return Decimal(round(price, 2))
 
 
+def get_set_sums(discounts: Iterable) -> Dict[int, Decimal]:
+    """
+    Функция получения сумм цен товаров наборных скидок одним запросом. Возвращает словарь {id скидки: сумма}
+    """
+    discounts_ids = {discount.pk for discount in discounts
+                     if discount.__class__.__name__ == 'ProductDiscount' and discount.set_discount is True}
+    if not discounts_ids:
+        return {}
+    set_sums = ProductDiscount.objects.filter(pk__in=discounts_ids).annotate(set_sum=Sum('seller_products__price'))
+    return {discount_id: set_sum or Decimal(0) for discount_id, set_sum in set_sums.values_list('pk', 'set_sum')}
+
+
+def calculate_discounted_prices(prices: Sequence, discounts: Sequence,
+                                set_sums: Optional[Dict[int, Decimal]] = None) -> List[Decimal]:
+    """
+    Функция пакетного расчета цен со скидкой для списка цен и списка соответствующих им скидок.
+    Цены в копейках и параметры скидок загружаются в массивы numpy, скидки всех типов применяются векторно.
+    Результат совпадает с implement_discount: цены, которые при вычислениях с плавающей точкой оказались
+    около половины копейки (там погрешность может изменить округление), пересчитываются через implement_discount
+    """
+    if not prices:
+        return []
+    if set_sums is None:
+        set_sums = get_set_sums(discounts)
+
+    cents = [Decimal(price).scaleb(2) for price in prices]
+    is_whole = np.array([price == price.to_integral_value() for price in cents])
+    cents = np.array([float(price) for price in cents])
+
+    # параметры загружаются один раз для каждой скидки и раскладываются по ценам индексом
+    positions, unique_discounts = {}, []
+    for discount in discounts:
+        if id(discount) not in positions:
+            positions[id(discount)] = len(unique_discounts)
+            unique_discounts.append(discount)
+    index = np.array([positions[id(discount)] for discount in discounts])
+    types = np.array([discount.type_of_discount for discount in unique_discounts])[index]
+    percent = np.array([discount.percent for discount in unique_discounts], dtype=float)[index]
+    amount = np.array([discount.amount for discount in unique_discounts], dtype=float)[index] * 100
+    fixed_price = np.array([discount.fixed_price for discount in unique_discounts], dtype=float)[index] * 100
+    is_set = np.array([discount.__class__.__name__ == 'ProductDiscount' and discount.set_discount is True
+                       for discount in unique_discounts])[index]
+    set_sum = np.array([float(set_sums.get(discount.pk, 0)) for discount in unique_discounts])[index] * 100
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        amount_result = np.where(is_set, cents * (set_sum - amount) / set_sum, cents - amount)
+        result = np.select([types == 'p', types == 'f'],
+                           [cents * ((100 - percent) / 100), amount_result],
+                           fixed_price)
+        tolerance = (np.abs(cents) + np.abs(amount) + np.abs(fixed_price) + np.abs(set_sum) + np.abs(result)) \
+            * 1e-9
+        fallback = ~is_whole | ~np.isfinite(result) | (np.abs(result - np.floor(result) - 0.5) <= tolerance)
+        rounded = np.where(fallback, 0, np.rint(result)).astype(np.int64)
+
+    discounted_prices = [Decimal(price).scaleb(-2) for price in rounded.tolist()]
+    for position in np.flatnonzero(fallback).tolist():
+        discount = discounts[position]
+        discounted_prices[position] = implement_discount(prices[position], discount,
+                                                         set_sum=set_sums.get(discount.pk))
+    return discounted_prices
+
+
+def get_active_discounts_q(prefix: str = '') -> Q:
+    """
+    Условие действующей скидки: скидка активна и текущий момент попадает в срок ее действия (границы срока
+    необязательны). prefix - путь к скидке для условий по связанным моделям, например 'product_discounts__'
+    """
+    now = timezone.now()
+    return Q(**{f'{prefix}is_active': True}) & \
+        (Q(**{f'{prefix}valid_from__isnull': True}) | Q(**{f'{prefix}valid_from__lte': now})) & \
+        (Q(**{f'{prefix}valid_to__isnull': True}) | Q(**{f'{prefix}valid_to__gte': now}))
+
+
+def get_active_product_discounts() -> QuerySet:
+    """
+    Функция получения действующих товарных скидок с продавцами одним запросом
+    """
+    return ProductDiscount.objects.filter(get_active_discounts_q()).select_related('seller').order_by('pk')
+
+
+def reset_active_discounts_cache() -> None:
+    """
+    Функция сброса закэшированных страниц списка действующих скидок
+    """
+    bump_cache_version(ACTIVE_DISCOUNTS_VERSION_KEY)
+
+
+def get_active_discounts_cache_time() -> int:
+    """
+    Функция получения времени кэширования списка действующих скидок: не дольше, чем до ближайшего начала
+    или окончания срока действия скидки
+    """
+    now = timezone.now()
+    boundaries = ProductDiscount.objects.filter(is_active=True).aggregate(
+        next_start=Min('valid_from', filter=Q(valid_from__gt=now)),
+        next_end=Min('valid_to', filter=Q(valid_to__gte=now)),
+    )
+    boundaries = [boundary for boundary in boundaries.values() if boundary is not None]
+    if not boundaries:
+        return ACTIVE_DISCOUNTS_CACHE_TIME
+    return max(1, min(ACTIVE_DISCOUNTS_CACHE_TIME, int((min(boundaries) - now).total_seconds()) + 1))
+
+
+def get_active_discounts_page(page_number, per_page: int) -> Page:
+    """
+    Функция получения страницы списка действующих товарных скидок. Количество скидок и скидки страницы кэшируются
+    по версии списка, которую сбрасывают сигналы товарных скидок, но не дольше, чем до границы срока действия скидок
+    """
+    version = get_cache_version(ACTIVE_DISCOUNTS_VERSION_KEY)
+    paginator = Paginator(get_active_product_discounts(), per_page)
+    count_key = 'active_discounts:{}:count'.format(version)
+    count = cache.get(count_key)
+    if count is None:
+        count = paginator.count
+        cache.set(count_key, count, get_active_discounts_cache_time())
+    paginator.count = count
+
+    page = paginator.get_page(page_number)
+    page_key = 'active_discounts:{}:{}:{}'.format(version, per_page, page.number)
+    discounts = cache.get(page_key)
+    if discounts is None:
+        discounts = list(page.object_list)
+        cache.set(page_key, discounts, get_active_discounts_cache_time())
+    page.object_list = discounts
+    return page
+
+
+def get_effective_discount(discounts: list, now: datetime) -> Tuple[Optional[ProductDiscount], Optional[datetime]]:
+    """
+    Функция выбора скидки для текущей цены товара продавца. Принимает товарные (не наборные) скидки товара
+    из набора правил продавца, упорядоченные по приоритету. Возвращает кортеж (приоритетная действующая скидка,
+    ближайшая граница срока действия скидок, когда цена может измениться)
+    """
+    discount = next((discount for discount in discounts if is_discount_valid(discount, now)), None)
+    boundaries = [discount.valid_from for discount in discounts
+                  if discount.valid_from is not None and discount.valid_from > now]
+    boundaries += [discount.valid_to for discount in discounts
+                   if discount.valid_to is not None and discount.valid_to >= now]
+    return discount, min(boundaries, default=None)
+
+
+def get_regular_discounts(rule_set: SellerRuleSet, seller_product_id: int) -> List[ProductDiscount]:
+    """
+    Функция получения товарных (не наборных) скидок товара продавца из набора правил, упорядоченных по приоритету
+    """
+    return [discount for discount in rule_set.product_discounts.get(seller_product_id, ()) if not discount.set_discount]
+
+
+def refresh_effective_prices(seller_products_ids: Optional[Iterable[int]] = None) -> List[int]:
+    """
+    Функция пересчета текущих цен (EffectivePrice) списка товаров продавцов или всех товаров продавцов.
+    Возвращает список id товаров продавцов, у которых изменилась цена или скидка
+    """
+    now = timezone.now()
+    seller_products = SellerProduct.objects.only('pk', 'price', 'seller_id')
+    effective_prices = EffectivePrice.objects.all()
+    if seller_products_ids is not None:
+        seller_products_ids = list(seller_products_ids)
+        seller_products = seller_products.filter(pk__in=seller_products_ids)
+        effective_prices = effective_prices.filter(pk__in=seller_products_ids)
+    seller_products = list(seller_products)
+    effective_prices = effective_prices.in_bulk()
+    rule_sets = get_rule_sets(seller_product.seller_id for seller_product in seller_products)
+
+    seller_products = [
+        (seller_product, *get_effective_discount(
+            get_regular_discounts(rule_sets[seller_product.seller_id], seller_product.pk), now
+        ))
+        for seller_product in seller_products
+    ]
+    discounted = [(seller_product, discount) for seller_product, discount, _ in seller_products if discount]
+    discounted_prices = calculate_discounted_prices([seller_product.price for seller_product, _ in discounted],
+                                                    [discount for _, discount in discounted], {})
+    discounted_prices = {seller_product.pk: max(price, Decimal(1))
+                         for (seller_product, _), price in zip(discounted, discounted_prices)}
+
+    changed_ids, to_create, to_update = [], [], []
+    for seller_product, discount, next_change_at in seller_products:
+        price = discounted_prices.get(seller_product.pk, seller_product.price)
+        discount_id = discount.pk if discount is not None else None
+        effective_price = effective_prices.get(seller_product.pk)
+        if effective_price is None:
+            to_create.append(EffectivePrice(seller_product=seller_product, price=price, discount=discount,
+                                            next_change_at=next_change_at))
+            changed_ids.append(seller_product.pk)
+            continue
+        if effective_price.price != price or effective_price.discount_id != discount_id:
+            changed_ids.append(seller_product.pk)
+        elif effective_price.next_change_at == next_change_at:
+            continue
+        effective_price.price = price
+        effective_price.discount = discount
+        effective_price.next_change_at = next_change_at
+        to_update.append(effective_price)
+
+    with transaction.atomic():
+        EffectivePrice.objects.bulk_create(to_create)
+        EffectivePrice.objects.bulk_update(to_update, ['price', 'discount', 'next_change_at'])
+    return changed_ids
+
+
+def refresh_due_effective_prices() -> List[int]:
+    """
+    Функция пересчета текущих цен, у которых наступила граница срока действия скидок, и цен товаров продавцов,
+    для которых текущая цена еще не рассчитана. Возвращает список id товаров продавцов с изменившейся ценой
+    """
+    due_ids = list(EffectivePrice.objects.filter(next_change_at__lte=timezone.now())
+                                         .values_list('seller_product_id', flat=True))
+    due_ids += SellerProduct.objects.filter(effective_price__isnull=True).values_list('pk', flat=True)
+    if not due_ids:
+        return []
+    return refresh_effective_prices(due_ids)
+
+
 def get_discounted_prices_for_seller_products(products: list, default_discount=None) -> zip:
     """
     Функция расчета цен со скидкой для тоавров продавцов, отображаемых на различных страницах сайта.
     Принимает на вход спискок товаров в магазине SellerProducts и необязательный аргумент - дефолтную скидку.
+    Цены с приоритетными скидками для всех товаров получаются одним запросом из таблицы текущих цен.
     Возвращает zip из кортежей (SellerProduct, цена со скидкой, сама скидка)
     """
+    products = list(products)
+    if default_discount is not None:
+        discounted_prices = calculate_discounted_prices([product.price for product in products],
+                                                        [default_discount] * len(products))
+        discounted_prices = [max(price, Decimal(1)) for price in discounted_prices]
+        discounts = [default_discount] * len(products)
+        return zip(products, discounted_prices, discounts)
+
     discounted_prices = []
     discounts = []
-
+    effective_prices = EffectivePrice.objects.select_related('discount').filter(discount__isnull=False) \
+                                     .in_bulk([product.pk for product in products])
     for product in products:
-        price = product.price
-        if default_discount is None:
-            discount = product.product_discounts.filter(
-                is_active=True,
-                set_discount=False
-            ).order_by('-priority').first()
-        else:
-            discount = default_discount
-
-        if not discount:
+        effective_price = effective_prices.get(product.pk)
+        if effective_price is None:
             discounted_prices.append(None)
             discounts.append(None)
         else:
-            price = implement_discount(price, discount)
-
-            if price < 1:
-                price = 1
-            discounted_prices.append(Decimal(price))
-            discounts.append(discount)
+            discounted_prices.append(effective_price.price)
+            discounts.append(effective_price.discount)
     products = zip(products, discounted_prices, discounts)
     return products
+
+
+def annotate_discounted_prices(products: QuerySet) -> QuerySet:
+    """
+    Функция добавляет к выборке SellerProduct поля из таблицы текущих цен:
+    discounted_price - цена с учетом приоритетной скидки (NULL, если скидки нет),
+    total - итоговая цена (цена со скидкой либо исходная цена)
+    """
+    price_field = DecimalField(max_digits=10, decimal_places=2)
+    discounted_price = Case(When(effective_price__discount__isnull=False, then=F('effective_price__price')),
+                            output_field=price_field)
+    return products.annotate(
+        discounted_price=discounted_price,
+        total=Cast(Coalesce(discounted_price, F('price')), output_field=price_field),
+    )
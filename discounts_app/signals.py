@@ -1,8 +1,13 @@
 from django.core.cache import cache
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
 
 from discounts_app.models import ProductDiscount, GroupDiscount, CartDiscount
+from discounts_app.rule_sets import reset_discount_rules
+from discounts_app.services import refresh_effective_prices, reset_active_discounts_cache
+from goods_app.services.catalog_cache import reset_catalog_cache
+from goods_app.services.card_cache import invalidate_cards
+from stores_app.models import Seller, SellerProduct
 
 
 @receiver(post_save, sender=ProductDiscount)
@@ -12,6 +17,8 @@ def product_discount_reset_cache_save_handler(sender, **kwargs) -> None:
     """
     user_id = kwargs['instance'].seller.owner_id
     cache.delete('owner_product_discounts:{}'.format(user_id))
+    reset_catalog_cache()
+    reset_active_discounts_cache()
 
 
 @receiver(pre_delete, sender=ProductDiscount)
@@ -23,6 +30,8 @@ def product_discount_cache_del_handler(sender, **kwargs) -> None:
     instance.image.delete()
     user_id = instance.seller.owner_id
     cache.delete('owner_product_discounts:{}'.format(user_id))
+    reset_catalog_cache()
+    reset_active_discounts_cache()
 
 
 @receiver(post_save, sender=GroupDiscount)
@@ -59,3 +68,201 @@ def cart_discounts_cache_del_handler(sender, **kwargs) -> None:
     """
     user_id = kwargs['instance'].seller.owner_id
     cache.delete('owner_card_discounts:{}'.format(user_id))
+
+
+@receiver(post_save, sender=ProductDiscount)
+def product_discount_cards_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for invalidating rendered cards of discounted products in shops
+    """
+    if not kwargs.get('created'):
+        invalidate_cards(kwargs['instance'].seller_products.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=ProductDiscount)
+def product_discount_cards_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for invalidating rendered cards of discounted products in shops
+    """
+    invalidate_cards(kwargs['instance'].seller_products.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=ProductDiscount.seller_products.through)
+def product_discount_products_cards_handler(sender, **kwargs) -> None:
+    """
+    Signal for invalidating rendered cards, when discounted products in shops were changed
+    """
+    action, instance = kwargs['action'], kwargs['instance']
+    if action in ('post_add', 'post_remove'):
+        if isinstance(instance, ProductDiscount):
+            invalidate_cards(kwargs['pk_set'])
+        else:
+            invalidate_cards([instance.pk])
+    elif action == 'pre_clear':
+        if isinstance(instance, ProductDiscount):
+            invalidate_cards(instance.seller_products.values_list('pk', flat=True))
+        else:
+            invalidate_cards([instance.pk])
+
+
+@receiver(m2m_changed, sender=ProductDiscount.seller_products.through)
+def product_discount_products_catalog_handler(sender, **kwargs) -> None:
+    """
+    Signal for clearing catalog cache, when discounted products in shops were changed
+    """
+    if kwargs['action'] in ('post_add', 'post_remove', 'post_clear'):
+        reset_catalog_cache()
+
+
+def get_discount_sellers_ids(discount: ProductDiscount) -> set:
+    """
+    Get ids of the discount seller and sellers of discounted products in shops
+    """
+    return {discount.seller_id, *discount.seller_products.values_list('seller_id', flat=True)}
+
+
+def get_set_discounts_sellers_ids(seller_product: SellerProduct) -> set:
+    """
+    Get ids of sellers of products in shops in set discounts, which include the product in shop
+    """
+    set_discounts = ProductDiscount.objects.filter(seller_products=seller_product, set_discount=True)
+    return {seller_product.seller_id,
+            *SellerProduct.objects.filter(product_discounts__in=set_discounts).values_list('seller_id', flat=True)}
+
+
+@receiver(post_save, sender=ProductDiscount)
+def product_discount_rules_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for resetting discount rule sets of sellers
+    """
+    reset_discount_rules(get_discount_sellers_ids(kwargs['instance']))
+
+
+@receiver(pre_delete, sender=ProductDiscount)
+def product_discount_rules_pre_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for remembering sellers, which discount rule sets include the discount
+    """
+    instance = kwargs['instance']
+    instance.rules_sellers_ids = get_discount_sellers_ids(instance)
+
+
+@receiver(post_delete, sender=ProductDiscount)
+def product_discount_rules_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for resetting discount rule sets of sellers after the discount is deleted
+    """
+    reset_discount_rules(getattr(kwargs['instance'], 'rules_sellers_ids', ()))
+
+
+@receiver(m2m_changed, sender=ProductDiscount.seller_products.through)
+def product_discount_products_rules_handler(sender, **kwargs) -> None:
+    """
+    Signal for resetting discount rule sets, when discounted products in shops were changed
+    """
+    action, instance = kwargs['action'], kwargs['instance']
+    if not isinstance(instance, ProductDiscount):
+        if action in ('pre_add', 'pre_remove', 'pre_clear'):
+            instance.rules_sellers_ids = get_set_discounts_sellers_ids(instance)
+        elif action in ('post_add', 'post_remove', 'post_clear'):
+            reset_discount_rules(instance.rules_sellers_ids | get_set_discounts_sellers_ids(instance))
+    elif action in ('pre_add', 'pre_remove', 'pre_clear'):
+        instance.rules_sellers_ids = get_discount_sellers_ids(instance)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        reset_discount_rules(instance.rules_sellers_ids | get_discount_sellers_ids(instance))
+
+
+@receiver(post_save, sender=GroupDiscount)
+@receiver(post_delete, sender=GroupDiscount)
+@receiver(post_save, sender=CartDiscount)
+@receiver(post_delete, sender=CartDiscount)
+def seller_discount_rules_handler(sender, **kwargs) -> None:
+    """
+    Signal for resetting discount rule set of the seller
+    """
+    reset_discount_rules([kwargs['instance'].seller_id])
+
+
+@receiver(post_save, sender=Seller)
+def seller_rules_handler(sender, **kwargs) -> None:
+    """
+    Signal for resetting discount rule set of the new seller
+    """
+    if kwargs.get('created'):
+        reset_discount_rules([kwargs['instance'].pk])
+
+
+@receiver(post_save, sender=SellerProduct)
+def seller_product_rules_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for resetting discount rule sets with sums of set discounts, which include the product in shop
+    """
+    update_fields = kwargs.get('update_fields')
+    if kwargs.get('raw') or (update_fields and 'price' not in update_fields):
+        return
+    reset_discount_rules(get_set_discounts_sellers_ids(kwargs['instance']))
+
+
+@receiver(pre_delete, sender=SellerProduct)
+def seller_product_rules_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for resetting discount rule sets, which include the product in shop
+    """
+    instance = kwargs['instance']
+    reset_discount_rules({instance.seller_id,
+                          *SellerProduct.objects.filter(product_discounts__seller_products=instance)
+                                                .values_list('seller_id', flat=True)})
+
+
+@receiver(post_save, sender=ProductDiscount)
+def product_discount_effective_prices_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for recalculating effective prices of discounted products in shops
+    """
+    if not kwargs.get('raw') and not kwargs.get('created'):
+        refresh_effective_prices(kwargs['instance'].seller_products.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=ProductDiscount)
+def product_discount_effective_prices_pre_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for remembering discounted products in shops before the discount is deleted
+    """
+    instance = kwargs['instance']
+    instance.effective_prices_ids = list(instance.seller_products.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=ProductDiscount)
+def product_discount_effective_prices_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for recalculating effective prices of products in shops of the deleted discount
+    """
+    refresh_effective_prices(getattr(kwargs['instance'], 'effective_prices_ids', []))
+
+
+@receiver(m2m_changed, sender=ProductDiscount.seller_products.through)
+def product_discount_products_effective_prices_handler(sender, **kwargs) -> None:
+    """
+    Signal for recalculating effective prices, when discounted products in shops were changed
+    """
+    action, instance = kwargs['action'], kwargs['instance']
+    if not isinstance(instance, ProductDiscount):
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            refresh_effective_prices([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        refresh_effective_prices(kwargs['pk_set'])
+    elif action == 'pre_clear':
+        instance.effective_prices_ids = list(instance.seller_products.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        refresh_effective_prices(getattr(instance, 'effective_prices_ids', []))
+
+
+@receiver(post_save, sender=SellerProduct)
+def seller_product_effective_price_handler(sender, **kwargs) -> None:
+    """
+    Signal for recalculating effective price of the product in shop
+    """
+    update_fields = kwargs.get('update_fields')
+    if kwargs.get('raw') or (update_fields and 'price' not in update_fields):
+        return
+    refresh_effective_prices([kwargs['instance'].pk])
@@ -0,0 +1,28 @@
+from celery.schedules import crontab
+from config.celery import app
+
+
+@app.on_after_configure.connect
+def set_periodic(sender, **kwargs) -> None:
+    """
+    Функция запуска периодической задачи
+    """
+    sender.add_periodic_task(
+        crontab(minute="*"),
+        refresh_due_effective_prices_task.s()
+    )
+
+
+@app.task
+def refresh_due_effective_prices_task() -> None:
+    """
+    Функция пересчета текущих цен товаров продавцов, у которых наступила граница срока действия скидок
+    """
+    from discounts_app.services import refresh_due_effective_prices
+    from goods_app.services.card_cache import invalidate_cards
+    from goods_app.services.catalog_cache import reset_catalog_cache
+
+    changed_ids = refresh_due_effective_prices()
+    if changed_ids:
+        invalidate_cards(changed_ids)
+        reset_catalog_cache()
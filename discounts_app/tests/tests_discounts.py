@@ -1,8 +1,10 @@
+from django.core.cache import cache
 from django.test import TestCase
 from django.shortcuts import reverse
 from goods_app.models import Product, SpecificationsNames, Specifications, ProductCategory
 from stores_app.models import SellerProduct, Seller
 from discounts_app.models import ProductDiscount, GroupDiscount, CartDiscount
+from discounts_app.services import get_active_discounts_page
 from profiles_app.models import User
 import tempfile
 
@@ -130,6 +132,19 @@ class DiscountsTest(TestCase):
         self.assertContains(response, "test_product_discount_description_1")
         self.assertContains(response, "test_product_discount_description_2")
 
+    def test_discounts_list_cache(self):
+        """Тест кэширования страниц списка действующих скидок и сброса кэша при изменении скидки"""
+        cache.clear()
+        self.assertEqual(list(get_active_discounts_page(1, 4)), [])
+
+        self.product_discount_1.valid_from = None
+        self.product_discount_1.valid_to = None
+        self.product_discount_1.save()
+        self.assertEqual(list(get_active_discounts_page(1, 4)), [self.product_discount_1])
+        with self.assertNumQueries(0):
+            page = get_active_discounts_page(1, 4)
+            self.assertEqual([discount.seller for discount in page], [self.seller_1])
+
     def test_discounts_detail_page(self):
         """Тест детальной страницы скидки"""
         response = self.client.get(reverse('discounts:discount-detail',
@@ -0,0 +1,272 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from hypothesis import example, given, settings, strategies as st
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from discounts_app.models import ProductDiscount, GroupDiscount, CartDiscount, EffectivePrice
+from discounts_app.rule_sets import get_rules_version_key
+from discounts_app.services import (DiscountsService, get_discounted_prices_for_seller_products,
+                                    annotate_discounted_prices, refresh_due_effective_prices, implement_discount,
+                                    calculate_discounted_prices)
+from goods_app.models import Product, ProductCategory
+from orders_app.models import OrderProduct
+from orders_app.services.cart import CartService
+from profiles_app.models import User
+from stores_app.models import SellerProduct, Seller
+
+# половины копеек и доли процентов, на которых проверяется округление
+percents = st.one_of(st.floats(min_value=0, max_value=100), st.sampled_from([50.0, 25.0, 12.5, 99.5]))
+amounts = st.one_of(st.floats(min_value=0, max_value=10 ** 6),
+                    st.decimals(min_value=0, max_value=10 ** 4, places=3).map(float))
+
+
+def make_discount(**kwargs) -> ProductDiscount:
+    return ProductDiscount(name='test', **kwargs)
+
+
+discounts = st.builds(make_discount, type_of_discount=st.sampled_from(['p', 'f', 'fp']), percent=percents,
+                      amount=amounts, fixed_price=amounts, set_discount=st.booleans())
+pricing_items = st.tuples(
+    st.decimals(min_value=Decimal('0.01'), max_value=Decimal('99999999.99'), places=2),
+    discounts,
+    st.decimals(min_value=Decimal('0.01'), max_value=Decimal('99999999.99'), places=2),
+)
+
+
+class CalculateDiscountedPricesTest(SimpleTestCase):
+    """ Тесты пакетного расчета цен со скидкой """
+
+    @settings(max_examples=300, deadline=None)
+    @given(st.lists(pricing_items, min_size=1, max_size=30))
+    @example([(Decimal('1.01'), make_discount(type_of_discount='p', percent=50.0), Decimal('1'))])
+    @example([(Decimal('10.00'), make_discount(type_of_discount='f', amount=0.005), Decimal('1'))])
+    @example([(Decimal('3.00'), make_discount(type_of_discount='f', amount=1.0, set_discount=True),
+               Decimal('8.00'))])
+    def test_matches_implement_discount(self, items):
+        """Тест совпадения пакетного расчета с implement_discount"""
+        prices, discounts_list, set_sums = [], [], {}
+        for index, (price, discount, set_sum) in enumerate(items, start=1):
+            discount.pk = index
+            prices.append(price)
+            discounts_list.append(discount)
+            set_sums[index] = set_sum
+
+        expected = [implement_discount(price, discount, set_sum=set_sums[discount.pk])
+                    for price, discount in zip(prices, discounts_list)]
+        self.assertEqual(calculate_discounted_prices(prices, discounts_list, set_sums), expected)
+
+
+class DiscountedPricesTest(TestCase):
+    """ Тесты расчета цен товаров продавцов со скидками """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(email='test@user.com', password='testp@sw0rd', first_name='user',
+                                        last_name='test', phone='+7(922)222-22-22')
+        cls.seller = Seller.objects.create(name='Test Store', slug='test-store', owner=user)
+        category = ProductCategory.objects.create(name='Test category', slug='test-category')
+        cls.seller_products = []
+        for index in range(5):
+            product = Product.objects.create(category=category, name=f'Product {index}', slug=f'product-{index}')
+            cls.seller_products.append(SellerProduct.objects.create(seller=cls.seller, product=product,
+                                                                    price=1000, quantity=10))
+
+        now = timezone.now()
+        cls.low = cls.create_discount('low', percent=10, priority='1', products=cls.seller_products[:2])
+        cls.high = cls.create_discount('high', percent=50, priority='3', products=cls.seller_products[1:2])
+        cls.fixed = cls.create_discount('fixed', type_of_discount='fp', fixed_price=300,
+                                        valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1),
+                                        products=cls.seller_products[2:3])
+        cls.create_discount('expired', percent=90, valid_to=now - timedelta(days=1),
+                            products=cls.seller_products[3:4])
+        cls.create_discount('future', percent=90, valid_from=now + timedelta(days=1),
+                            products=cls.seller_products[3:4])
+        cls.create_discount('inactive', percent=90, is_active=False, products=cls.seller_products[4:])
+
+    @classmethod
+    def create_discount(cls, name, products, is_active=True, **kwargs):
+        discount = ProductDiscount.objects.create(seller=cls.seller, name=name, is_active=is_active, **kwargs)
+        discount.seller_products.set(products)
+        return discount
+
+    def test_prices_by_one_query(self):
+        """Тест выбора приоритетной действующей скидки для всех товаров одним запросом"""
+        with self.assertNumQueries(2):
+            prices = list(get_discounted_prices_for_seller_products(SellerProduct.objects.order_by('id')))
+        self.assertEqual([(price, discount) for _, price, discount in prices], [
+            (900, self.low),
+            (500, self.high),
+            (300, self.fixed),
+            (None, None),
+            (None, None),
+        ])
+
+    def test_prices_match_sql_annotation(self):
+        """Тест совпадения цен со скидкой с ценами, рассчитанными в БД"""
+        goods = annotate_discounted_prices(SellerProduct.objects.order_by('id'))
+        prices = get_discounted_prices_for_seller_products(goods)
+        for seller_product, price, _ in prices:
+            self.assertEqual(seller_product.total, price if price is not None else seller_product.price)
+
+
+class EffectivePriceTest(TestCase):
+    """ Тесты таблицы текущих цен товаров продавцов """
+
+    def setUp(self):
+        user = User.objects.create_user(email='test@user.com', password='testp@sw0rd', first_name='user',
+                                        last_name='test', phone='+7(922)222-22-22')
+        self.seller = Seller.objects.create(name='Test Store', slug='test-store', owner=user)
+        category = ProductCategory.objects.create(name='Test category', slug='test-category')
+        product = Product.objects.create(category=category, name='Product', slug='product')
+        self.seller_product = SellerProduct.objects.create(seller=self.seller, product=product, price=1000,
+                                                           quantity=10)
+        self.now = timezone.now()
+        self.discount = ProductDiscount.objects.create(seller=self.seller, name='sale', percent=20, is_active=True,
+                                                       valid_from=self.now + timedelta(hours=1),
+                                                       valid_to=self.now + timedelta(hours=2))
+        self.discount.seller_products.add(self.seller_product)
+
+    def get_effective_price(self) -> EffectivePrice:
+        return EffectivePrice.objects.get(seller_product=self.seller_product)
+
+    def refresh_at(self, moment) -> list:
+        with mock.patch('discounts_app.services.timezone.now', return_value=moment):
+            return refresh_due_effective_prices()
+
+    def test_refresh_at_window_boundaries(self):
+        """Тест пересчета цены при наступлении и окончании срока действия скидки"""
+        effective_price = self.get_effective_price()
+        self.assertEqual((effective_price.price, effective_price.discount), (1000, None))
+        self.assertEqual(effective_price.next_change_at, self.discount.valid_from)
+
+        self.assertEqual(self.refresh_at(self.now + timedelta(minutes=30)), [])
+        self.assertEqual(self.refresh_at(self.now + timedelta(hours=1, minutes=1)), [self.seller_product.pk])
+        effective_price = self.get_effective_price()
+        self.assertEqual((effective_price.price, effective_price.discount), (800, self.discount))
+        self.assertEqual(effective_price.next_change_at, self.discount.valid_to)
+
+        self.assertEqual(self.refresh_at(self.now + timedelta(hours=2, minutes=1)), [self.seller_product.pk])
+        effective_price = self.get_effective_price()
+        self.assertEqual((effective_price.price, effective_price.discount, effective_price.next_change_at),
+                         (1000, None, None))
+
+    def test_refresh_by_signals(self):
+        """Тест пересчета цены при изменении товара продавца и скидки"""
+        self.discount.valid_from = None
+        self.discount.save()
+        self.assertEqual(self.get_effective_price().price, 800)
+
+        self.seller_product.price = 500
+        self.seller_product.save()
+        self.assertEqual(self.get_effective_price().price, 400)
+
+        self.discount.seller_products.remove(self.seller_product)
+        self.assertEqual(self.get_effective_price().price, 500)
+
+        self.discount.seller_products.add(self.seller_product)
+        # изображение по умолчанию общее для всех скидок и не должно удаляться вместе со скидкой
+        self.discount.image = None
+        self.discount.delete()
+        effective_price = self.get_effective_price()
+        self.assertEqual((effective_price.price, effective_price.discount), (500, None))
+
+
+class CartDiscountsQueriesTest(TestCase):
+    """ Тесты числа запросов при расчете скидок корзины """
+
+    @classmethod
+    def setUpTestData(cls):
+        # сброс наборов правил других процессов выполняется после фиксации транзакции
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.user = User.objects.create_user(email='test@user.com', password='testp@sw0rd', first_name='user',
+                                                last_name='test', phone='+7(922)222-22-22')
+            seller = Seller.objects.create(name='Test Store', slug='test-store', owner=cls.user)
+            categories = [ProductCategory.objects.create(name=f'Category {index}', slug=f'category-{index}')
+                          for index in range(3)]
+            cls.seller_products = []
+            for index in range(30):
+                product = Product.objects.create(category=categories[index % 3], name=f'Product {index}',
+                                                 slug=f'product-{index}')
+                cls.seller_products.append(SellerProduct.objects.create(seller=seller, product=product,
+                                                                        price=1000, quantity=10))
+            for index, category in enumerate(categories):
+                GroupDiscount.objects.create(seller=seller, name=f'group {index}', slug=f'group-{index}',
+                                             percent=10, priority='2', is_active=True, product_category=category)
+            CartDiscount.objects.create(seller=seller, name='cart', slug='cart', percent=5, priority='1',
+                                        is_active=True, min_quantity_threshold=1, max_quantity_threshold=100)
+            for index, seller_product in enumerate(cls.seller_products):
+                discount = ProductDiscount.objects.create(seller=seller, name=f'product {index}',
+                                                          slug=f'product-{index}', percent=20, priority='3',
+                                                          is_active=True, set_discount=index % 2 == 0)
+                discount.seller_products.set(cls.seller_products[index:index + 2])
+
+    def setUp(self):
+        cache.clear()
+
+    def get_cart(self, lines: int) -> CartService:
+        request = RequestFactory().get('/')
+        request.user = self.user
+        cart = CartService(request)
+        cart.cart.order_products.all().delete()
+        OrderProduct.objects.bulk_create(OrderProduct(order=cart.cart, seller_product=seller_product, quantity=1)
+                                         for seller_product in self.seller_products[:lines])
+        return cart
+
+    def count_queries(self, lines: int) -> int:
+        cart = self.get_cart(lines)
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            discount_service = DiscountsService(cart)
+            prices = [discount_service.get_discounted_price(product) for product in discount_service.goods]
+        self.assertEqual(len(prices), lines)
+        return len(context.captured_queries)
+
+    def test_constant_queries(self):
+        """Тест независимости числа запросов от количества товаров в корзине"""
+        self.assertEqual(self.count_queries(3), self.count_queries(30))
+
+    def test_rule_sets_in_memory(self):
+        """Тест расчета скидок корзины по наборам правил в памяти и сброса набора правил сигналом"""
+        cart = self.get_cart(3)
+        DiscountsService(cart)
+        with self.assertNumQueries(1):
+            discount_service = DiscountsService(cart)
+            prices = [discount_service.get_discounted_price(product) for product in discount_service.goods]
+        self.assertEqual(prices[1], 800)
+
+        group_discount = GroupDiscount.objects.get(product_category=self.seller_products[1].product.category)
+        version_key = get_rules_version_key(group_discount.seller_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            group_discount.priority = '3'
+            group_discount.percent = 5
+            group_discount.save()
+            discount_service = DiscountsService(cart)
+            self.assertEqual(discount_service.get_discounted_price(discount_service.goods[1]), 950)
+            # версия для других процессов меняется только после фиксации транзакции
+            self.assertIsNotNone(cache.get(version_key))
+        self.assertIsNone(cache.get(version_key))
+        discount_service = DiscountsService(cart)
+        self.assertEqual(discount_service.get_discounted_price(discount_service.goods[1]), 950)
+
+    def test_subcategory_group_discount(self):
+        """Тест действия групповой скидки категории на товары подкатегорий"""
+        seller_product = self.seller_products[1]
+        parent = ProductCategory.objects.create(name='Parent category', slug='parent-category')
+        category = seller_product.product.category
+        category.parent = parent
+        category.save()
+        GroupDiscount.objects.filter(product_category=category).delete()
+        group_discount = GroupDiscount.objects.create(seller=seller_product.seller, name='parent', slug='parent',
+                                                      percent=30, priority='2', is_active=True,
+                                                      product_category=parent)
+
+        discount_service = DiscountsService(self.get_cart(3))
+        self.assertIn(group_discount, discount_service.get_all_discounts_for_product(discount_service.goods[1]))
+        self.assertNotIn(group_discount, discount_service.get_all_discounts_for_product(discount_service.goods[2]))
@@ -1,12 +1,10 @@
-import datetime
 from typing import Dict
 
 from django.shortcuts import render
 from django.views.generic import DetailView, ListView
 
 from discounts_app.models import ProductDiscount
-from discounts_app.services import get_discounted_prices_for_seller_products
-from goods_app.services.product_detail import context_pagination
+from discounts_app.services import get_discounted_prices_for_seller_products, get_active_discounts_page
 
 
 class DiscountsListView(ListView):
@@ -17,16 +15,7 @@ class DiscountsListView(ListView):
     """
 
     def get(self, request, *args, **kwargs):
-        discounts = ProductDiscount.objects.filter(is_active=True, valid_from__lte=datetime.date.today(),
-                                                   valid_to__gte=datetime.date.today()) | \
-                    ProductDiscount.objects.filter(is_active=True, valid_from=None,
-                                                   valid_to=None) | \
-                    ProductDiscount.objects.filter(is_active=True, valid_from=None,
-                                                   valid_to__gte=datetime.date.today()) | \
-                    ProductDiscount.objects.filter(is_active=True, valid_from__lte=datetime.date.today(),
-                                                   valid_to=None)
-
-        discounts = context_pagination(request, discounts, 4)
+        discounts = get_active_discounts_page(request.GET.get('page'), 4)
         return render(request, 'discounts_app/discounts_list.html', {'discounts': discounts})
 
 
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from goods_app.services.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild catalog search index from scratch'
+
+    def handle(self, *args, **kwargs) -> None:
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Search index was successfully rebuilt for {count} products in shops!'
+        ))
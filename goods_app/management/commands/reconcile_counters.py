@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from goods_app.services.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recalculate drifted comments and sales counters of products and products in shops'
+
+    def handle(self, *args, **kwargs) -> None:
+        products_count, seller_products_count = reconcile_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Counters were fixed for {products_count} products and {seller_products_count} products in shops!'
+        ))
@@ -76,6 +76,9 @@ class Product(models.Model):
     image = models.ImageField(verbose_name=_('product image'))
     description = models.TextField(max_length=2550, null=True, verbose_name=_('product description'))
     rating = models.FloatField(null=True, default=0, verbose_name=_('rating'))
+    comments_count = models.PositiveIntegerField(default=0, db_index=True, editable=False,
+                                                 verbose_name=_('comments count'))
+    ratings_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('ratings sum'))
     is_published = models.BooleanField(verbose_name=_('is published'), null=True, blank=True, default=True)
     tags = TaggableManager()
     limited = models.BooleanField(default=False, verbose_name=_('limited edition'))
@@ -174,3 +177,23 @@ class ProductRequest(Product):
         verbose_name = _('new product')
         verbose_name_plural = _('new products')
         db_table = 'add_products'
+
+
+class SearchToken(models.Model):
+    """
+    Модель токена поискового индекса каталога.
+    Хранит слова из наименований товара, категории, тэгов и продавца для каждого товара продавца
+    """
+    token = models.CharField(max_length=50, db_index=True, verbose_name=_('token'))
+    seller_product = models.ForeignKey('stores_app.SellerProduct', on_delete=models.CASCADE,
+                                       related_name='search_tokens', verbose_name=_('product in shop'))
+    weight = models.PositiveSmallIntegerField(default=1, verbose_name=_('weight'))
+
+    def __str__(self) -> str:
+        return self.token
+
+    class Meta:
+        verbose_name = _('search token')
+        verbose_name_plural = _('search tokens')
+        db_table = 'search_tokens'
+        unique_together = ('token', 'seller_product')
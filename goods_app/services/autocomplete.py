@@ -0,0 +1,256 @@
+import bisect
+import threading
+import uuid
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import reverse
+from django.utils.http import urlencode
+from taggit.models import Tag
+
+from goods_app.models import Product, ProductCategory
+from goods_app.services.search import tokenize
+from stores_app.models import Seller
+
+AUTOCOMPLETE_VERSION_KEY = 'autocomplete:version'
+AUTOCOMPLETE_LIMIT = 10
+# максимальное число изменений, которые процесс применяет к индексу вместо его перезагрузки
+AUTOCOMPLETE_CHANGES_LIMIT = 1000
+
+# порядок видов подсказок в ответе
+KINDS_ORDER = {'product': 0, 'category': 1, 'tag': 2, 'store': 3}
+
+
+class Suggestion(NamedTuple):
+    """
+    Autocomplete suggestion with the words used for prefix search
+    """
+    kind: str
+    id: int
+    label: str
+    url: str
+    tokens: Tuple[str, ...]
+
+
+class SuggestionChange(NamedTuple):
+    """
+    Change of the suggestion in the change log shared by processes. Suggestion None removes it from the index
+    """
+    kind: str
+    id: int
+    suggestion: Optional[Suggestion]
+
+
+class PrefixIndex:
+    """
+    In-memory prefix index: sorted list of (token, kind, id) and the suggestions by (kind, id).
+    Lookup is a binary search of the prefix in the sorted list, so it does not touch the database.
+    The index is up to date with the change log position: the log version and the number of applied changes
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.version = None
+        self.sequence = 0
+        self.tokens: List[Tuple[str, str, int]] = []
+        self.suggestions: Dict[Tuple[str, int], Suggestion] = {}
+
+    def load(self, suggestions: List[Suggestion], version: str, sequence: int) -> None:
+        """
+        Replace the index content
+        """
+        tokens = sorted((token, suggestion.kind, suggestion.id)
+                        for suggestion in suggestions for token in suggestion.tokens)
+        with self.lock:
+            self.suggestions = {(suggestion.kind, suggestion.id): suggestion for suggestion in suggestions}
+            self.tokens = tokens
+            self.version = version
+            self.sequence = sequence
+
+    def apply(self, changes: List[SuggestionChange], sequence: int) -> None:
+        """
+        Apply changes from the change log in their order
+        """
+        for change in changes:
+            if change.suggestion is None:
+                self.remove(change.kind, change.id)
+            else:
+                self.put(change.suggestion)
+        self.sequence = sequence
+
+    def remove(self, kind: str, object_id: int) -> None:
+        """
+        Remove the suggestion from the index
+        """
+        with self.lock:
+            suggestion = self.suggestions.pop((kind, object_id), None)
+            if suggestion is None:
+                return
+            for token in suggestion.tokens:
+                position = bisect.bisect_left(self.tokens, (token, kind, object_id))
+                if position < len(self.tokens) and self.tokens[position] == (token, kind, object_id):
+                    del self.tokens[position]
+
+    def put(self, suggestion: Suggestion) -> None:
+        """
+        Add or replace the suggestion in the index
+        """
+        self.remove(suggestion.kind, suggestion.id)
+        with self.lock:
+            self.suggestions[(suggestion.kind, suggestion.id)] = suggestion
+            for token in suggestion.tokens:
+                bisect.insort(self.tokens, (token, suggestion.kind, suggestion.id))
+
+    def find(self, query: str, limit: int = AUTOCOMPLETE_LIMIT) -> List[Suggestion]:
+        """
+        Find suggestions, which have words starting with every word of the query
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self.lock:
+            found = set()
+            position = bisect.bisect_left(self.tokens, (terms[-1],))
+            while position < len(self.tokens) and self.tokens[position][0].startswith(terms[-1]):
+                found.add(self.tokens[position][1:])
+                position += 1
+            suggestions = [self.suggestions[key] for key in found]
+
+        suggestions = [suggestion for suggestion in suggestions
+                       if all(any(token.startswith(term) for token in suggestion.tokens) for term in terms[:-1])]
+        suggestions.sort(key=lambda suggestion: (KINDS_ORDER[suggestion.kind], suggestion.label.lower()))
+        return suggestions[:limit]
+
+
+_index = PrefixIndex()
+
+
+def make_suggestion(kind: str, instance) -> Suggestion:
+    """
+    Make suggestion from product, category, tag or store
+    """
+    catalog_url = reverse('goods-polls:catalog_url')
+    if kind == 'product':
+        url = instance.get_absolute_url()
+    elif kind == 'category':
+        url = '{}?{}'.format(catalog_url, urlencode({'slug': instance.slug}))
+    elif kind == 'tag':
+        url = '{}?{}'.format(catalog_url, urlencode({'main_tag': instance.name}))
+    else:
+        url = reverse('stores-polls:store-detail', kwargs={'slug': instance.slug})
+    label = str(instance.name or '')
+    return Suggestion(kind, instance.pk, label, url, tuple(sorted(set(tokenize(label)))))
+
+
+def get_all_suggestions() -> List[Suggestion]:
+    """
+    Get suggestions for all published products, categories, tags and stores. Objects without slug have no page
+    to link to, so they are not suggested
+    """
+    suggestions = [make_suggestion('product', product) for product in
+                   Product.objects.filter(is_published=True).exclude(slug='').only('pk', 'name', 'slug')]
+    suggestions += [make_suggestion('category', category)
+                    for category in ProductCategory.objects.exclude(slug='').only('pk', 'name', 'slug')]
+    suggestions += [make_suggestion('tag', tag) for tag in Tag.objects.only('pk', 'name')]
+    suggestions += [make_suggestion('store', seller)
+                    for seller in Seller.objects.exclude(slug='').only('pk', 'name', 'slug')]
+    return suggestions
+
+
+def get_sequence_key(version: str) -> str:
+    """
+    Get cache key of the number of changes in the change log of the version
+    """
+    return 'autocomplete:{}:sequence'.format(version)
+
+
+def get_change_key(version: str, sequence: int) -> str:
+    """
+    Get cache key of the change by its number in the change log of the version
+    """
+    return 'autocomplete:{}:change:{}'.format(version, sequence)
+
+
+def new_changes_log() -> Tuple[str, int]:
+    """
+    Start the new change log: every process reloads its index on the next use
+    """
+    version = uuid.uuid4().hex
+    cache.set(get_sequence_key(version), 0, settings.CACHE_VERSION_TIME)
+    cache.set(AUTOCOMPLETE_VERSION_KEY, version, settings.CACHE_VERSION_TIME)
+    return version, 0
+
+
+def get_changes_log_state() -> Tuple[str, int]:
+    """
+    Get the version of the change log and the number of changes in it. A log with the lost or expired
+    changes counter is replaced with a new one, so the counter never starts again from zero in the same log
+    """
+    version = cache.get(AUTOCOMPLETE_VERSION_KEY)
+    sequence = cache.get(get_sequence_key(version)) if version else None
+    if sequence is None:
+        return new_changes_log()
+    return version, sequence
+
+
+def publish_suggestion_change(change: SuggestionChange) -> None:
+    """
+    Append the change to the change log shared by processes
+    """
+    version, _ = get_changes_log_state()
+    try:
+        sequence = cache.incr(get_sequence_key(version))
+    except ValueError:
+        new_changes_log()
+        return
+    cache.set(get_change_key(version, sequence), change, settings.CACHE_VERSION_TIME)
+
+
+def refresh_index(version: str, sequence: int) -> None:
+    """
+    Bring the index of the process to the change log position: apply the missed changes or reload the index,
+    if it was loaded for other log, too many changes were missed or some of them are not in the cache already
+    """
+    if _index.version == version and _index.sequence <= sequence <= _index.sequence + AUTOCOMPLETE_CHANGES_LIMIT:
+        keys = [get_change_key(version, number) for number in range(_index.sequence + 1, sequence + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) == len(keys):
+            _index.apply([changes[key] for key in keys], sequence)
+            return
+    _index.load(get_all_suggestions(), version, sequence)
+
+
+def get_autocomplete_index() -> PrefixIndex:
+    """
+    Get the prefix index of the process. The index is loaded on the first use and brought up to date with
+    the change log shared by processes
+    """
+    version, sequence = get_changes_log_state()
+    if (_index.version, _index.sequence) != (version, sequence):
+        with _index.refresh_lock:
+            if (_index.version, _index.sequence) != (version, sequence):
+                refresh_index(version, sequence)
+    return _index
+
+
+def autocomplete(query: str, limit: int = AUTOCOMPLETE_LIMIT) -> List[Dict]:
+    """
+    Get suggestions for the search query
+    """
+    return [{'kind': suggestion.kind, 'label': suggestion.label, 'url': suggestion.url}
+            for suggestion in get_autocomplete_index().find(query, limit)]
+
+
+def update_suggestion(kind: str, instance, deleted: bool = False) -> None:
+    """
+    Publish the change of the suggestion to the change log, when the current transaction is committed.
+    Every process applies the change to its index on the next use instead of reloading the index
+    """
+    if deleted or (kind == 'product' and not instance.is_published) or (kind != 'tag' and not instance.slug):
+        change = SuggestionChange(kind, instance.pk, None)
+    else:
+        change = SuggestionChange(kind, instance.pk, make_suggestion(kind, instance))
+    transaction.on_commit(lambda: publish_suggestion_change(change))
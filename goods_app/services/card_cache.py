@@ -0,0 +1,105 @@
+import hashlib
+import uuid
+from typing import Dict, Iterable, List, Tuple
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import translation
+
+CATALOG_CARD_TEMPLATE = 'elems/good_card_item.html'
+OFFER_CARD_TEMPLATE = 'elems/card_item.html'
+CARD_CACHE_TIME = 24 * 60 * 60
+
+
+def get_card_version_key(seller_product_id: int) -> str:
+    """
+    Get cache key of the rendered cards version of the product in shop
+    """
+    return 'card_version:{}'.format(seller_product_id)
+
+
+def get_card_versions(seller_products_ids: Iterable[int]) -> Dict:
+    """
+    Get rendered cards versions of products in shops. A missing version gets a new random value,
+    so the cards rendered before the invalidation are never used again
+    """
+    keys = {get_card_version_key(seller_product_id): seller_product_id for seller_product_id in seller_products_ids}
+    versions = cache.get_many(keys)
+    new_versions = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if new_versions:
+        cache.set_many(new_versions, CARD_CACHE_TIME)
+        versions.update(new_versions)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def invalidate_cards(seller_products_ids: Iterable[int]) -> None:
+    """
+    Invalidate rendered cards of products in shops
+    """
+    cache.delete_many([get_card_version_key(seller_product_id) for seller_product_id in seller_products_ids])
+
+
+def get_discount_params(discount) -> Tuple:
+    """
+    Get params of discount shown on the card
+    """
+    if discount is None:
+        return ()
+    return (discount.pk, getattr(discount, 'type_of_discount', None), getattr(discount, 'percent', None),
+            getattr(discount, 'amount', None), getattr(discount, 'set_discount', None))
+
+
+def get_card_cache_key(template_name: str, seller_product_id: int, version: str, params: Tuple) -> str:
+    """
+    Get cache key of the rendered card by the template, product in shop, its version, language and shown params
+    """
+    digest = hashlib.md5(repr((template_name, translation.get_language(), params)).encode()).hexdigest()
+    return 'card:{}:{}:{}'.format(seller_product_id, version, digest)
+
+
+def render_cached_cards(template_name: str, cards: List[Tuple[int, Tuple, Dict]]) -> List[str]:
+    """
+    Render cards by the template. Every card is a tuple of product in shop id, shown params and template context.
+    Cached cards are got by one request to the cache, only missing cards are rendered
+    """
+    versions = get_card_versions(seller_product_id for seller_product_id, _, _ in cards)
+    keys = [get_card_cache_key(template_name, seller_product_id, versions[seller_product_id], params)
+            for seller_product_id, params, _ in cards]
+    rendered = cache.get_many(keys)
+
+    missing = {}
+    for key, (_, _, context) in zip(keys, cards):
+        if key not in rendered and key not in missing:
+            missing[key] = render_to_string(template_name, context)
+    if missing:
+        cache.set_many(missing, CARD_CACHE_TIME)
+        rendered.update(missing)
+    return [rendered[key] for key in keys]
+
+
+def render_catalog_cards(goods: Iterable) -> List[str]:
+    """
+    Render catalog cards of products in shops with prices after discounts
+    """
+    cards = []
+    for elem in goods:
+        discount = getattr(elem, 'discount', None)
+        params = (str(elem.price), str(getattr(elem, 'price_after_discount', None)), get_discount_params(discount))
+        cards.append((elem.id, params, {'elem': elem}))
+    return render_cached_cards(CATALOG_CARD_TEMPLATE, cards)
+
+
+def render_offer_cards(products: Iterable, slider: bool = False, exclude_id: int = None,
+                       seller_perm: bool = False) -> List[str]:
+    """
+    Render cards of offers - tuples of product in shop, price after discount and discount
+    """
+    cards = []
+    for offer, price_after_discount, discount in products:
+        if offer.id == exclude_id:
+            continue
+        params = (str(offer.price), str(price_after_discount), get_discount_params(discount), slider, seller_perm)
+        context = {'offer': offer, 'price_after_discount': price_after_discount, 'discount': discount,
+                   'slider': slider, 'seller_perm': seller_perm}
+        cards.append((offer.id, params, context))
+    return render_cached_cards(OFFER_CARD_TEMPLATE, cards)
@@ -1,75 +1,98 @@
+import base64
+import binascii
+import json
 from typing import List, Dict, Tuple
 
 from django.core.cache import cache
-from django.core.paginator import Paginator
+from django.core.paginator import Paginator, Page
 from django.http import HttpRequest
-from django.db.models import Count, QuerySet, Q
-from taggit.models import Tag
+from django.db.models import QuerySet, F, Q, Min, Max
 
 from goods_app.models import ProductCategory
+from goods_app.services.catalog_cache import CatalogResult, get_cached_catalog
+from goods_app.services.category_tree import get_category_node
+from goods_app.services.facets import get_catalog_facets, get_facets_signature
+from goods_app.services.search import search_seller_products
 from stores_app.models import SellerProduct
-from discounts_app.services import get_discounted_prices_for_seller_products
+from discounts_app.services import get_discounted_prices_for_seller_products, annotate_discounted_prices
+from orders_app.services.stock import annotate_available_stock
 
 
 class CatalogByCategoriesMixin:
     """
     класс-миксин для классбэйсд вью, для всех необходимых действий с каталогом
     """
+    PAGE_SIZE = 8
+
+    # поля выборки, по которым выполняется сортировка каждого типа
+    SORT_FIELDS = {
+        'name': 'product__name',
+        'price': 'total',
+        'comment': 'product__comments_count',
+        'pop': 'paid_orders_count',
+        'newness': 'date_added',
+        'rank': 'search_rank',
+    }
 
     @classmethod
-    def simple_sort(cls, some_list: List, sort_type: str) -> Tuple:
+    def simple_sort(cls, some_goods: QuerySet, sort_type: str) -> Tuple:
         """
-        метод сортирует входящую последовательность в соответствии с заданным типом м направлением сортировки
-        :param some_list: входящая последовательность для сортировки
+        метод сортирует входящую выборку в соответствии с заданным типом м направлением сортировки
+        :param some_goods: входящая выборка товаров для сортировки
         :param sort_type: тип сортировки - указывает на поле, по которому будет
         осуществляться сортировка и направление(возрастание/убывание)
-        :return:    some_list - отсортированный массив
+        :return:    some_goods - отсортированная выборка (сортировка выполняется в БД через ORDER BY)
                     next_state - следующее состояние типа сортировки(т.к. направление
                     сортировки меняется при повторном нажатии)
         """
-        next_state = ''
-
-        if sort_type == 'name_inc':
-            next_state = 'name_dec'
-            some_list = cls.sort_by_name(some_list, False)
-
-        if sort_type == 'name_dec':
-            next_state = 'name_inc'
-            some_list = cls.sort_by_name(some_list, True)
-
-        if sort_type == 'price_inc':
-            next_state = 'price_dec'
-            some_list = cls.sort_by_price(some_list, False)
-
-        if sort_type == 'price_dec':
-            next_state = 'price_inc'
-            some_list = cls.sort_by_price(some_list, True)
-
-        if sort_type == 'comment_inc':
-            next_state = 'comment_dec'
-            some_list = cls.sort_by_amount_of_comments(some_list, False)
+        sort_methods = {
+            'name': cls.sort_by_name,
+            'price': cls.sort_by_price,
+            'comment': cls.sort_by_amount_of_comments,
+            'pop': cls.sort_by_pop,
+            'newness': cls.sort_by_newness,
+            'rank': cls.sort_by_rank,
+        }
+        sort_name, _, direction = sort_type.rpartition('_')
 
-        if sort_type == 'comment_dec':
-            next_state = 'comment_inc'
-            some_list = cls.sort_by_amount_of_comments(some_list, True)
+        if sort_name not in sort_methods or direction not in ('inc', 'dec'):
+            return some_goods.order_by('id'), ''
 
-        if sort_type == 'pop_inc':
-            next_state = 'pop_dec'
-            some_list = cls.sort_by_pop(some_list, False)
+        next_state = '_'.join([sort_name, 'dec' if direction == 'inc' else 'inc'])
+        some_goods = sort_methods[sort_name](some_goods, direction == 'dec')
 
-        if sort_type == 'pop_dec':
-            next_state = 'pop_inc'
-            some_list = cls.sort_by_pop(some_list, True)
+        return some_goods, next_state
 
-        if sort_type == 'newness_inc':
-            next_state = 'newness_dec'
-            some_list = cls.sort_by_newness(some_list, False)
+    @classmethod
+    def annotate_catalog_fields(cls, some_goods: QuerySet) -> QuerySet:
+        """
+        метод добавляет к выборке вычисляемое в БД поле total - стоимость товара с учетом скидки,
+        по которому выполняются фильтрация и сортировка; количество комментариев и оплаченных заказов
+        хранятся в счетчиках товара и товара продавца
+        """
+        some_goods = some_goods.select_related('product', 'seller', 'product__category')
+        return annotate_discounted_prices(some_goods)
 
-        if sort_type == 'newness_dec':
-            next_state = 'newness_inc'
-            some_list = cls.sort_by_newness(some_list, True)
+    @classmethod
+    def get_cached_goods(cls, some_goods: QuerySet, search: str, tag: str, slug: str, filter_data: Dict or None,
+                         sort_type: str) -> CatalogResult:
+        """
+        метод возвращает отсортированную выборку товаров в виде списков id и стоимостей с учетом скидок из кэша;
+        ключ кэша строится по канонической форме параметров каталога и версии каталога (для фильтра "в наличии" -
+        также по версии остатков)
+        """
+        signature = get_facets_signature(search=search, tag=tag, slug=slug, filters=filter_data, sort_type=sort_type)
+        return get_cached_catalog(some_goods, signature, in_stock=bool(filter_data and filter_data['in_stock']))
 
-        return some_list, next_state
+    @classmethod
+    def get_catalog_page(cls, paginator: Paginator, page: str or int) -> Page:
+        """
+        метод возвращает страницу пагинации, в которой в модели превращаются только видимые товары;
+        стоимость со скидкой рассчитывается только для них
+        """
+        page_obj = paginator.get_page(page)
+        page_obj.object_list = cls.add_sale_prices_in_goods_if_needed(page_obj.object_list)
+        return page_obj
 
     @classmethod
     def add_sale_prices_in_goods_if_needed(cls, some_goods: QuerySet) -> List:
@@ -93,8 +116,12 @@ class CatalogByCategoriesMixin:
         return result
 
     @classmethod
-    def get_full_data(cls, tag: str = '', search: str = '', slug: str = '') -> Tuple[QuerySet or List, List, List]:
-        """метод возвращвет все товары или товары по тэгу или товары подходящие под запрос из строки поиска"""
+    def get_full_data(cls, tag: str = '', search: str = '', slug: str = '', with_facets: bool = True
+                      ) -> Tuple[QuerySet or List, List, List]:
+        """
+        метод возвращвет все товары или товары по тэгу или товары подходящие под запрос из строки поиска;
+        продавцы и тэги для блока фильтров рассчитываются только при with_facets=True
+        """
 
         if tag:
             goods = cls.get_data_by_tag(tag)
@@ -108,90 +135,67 @@ class CatalogByCategoriesMixin:
         else:
             goods = SellerProduct.objects.all()
 
-        sellers, tags = cls.get_sellers_and_tags(some_goods=goods, main_tag=tag)
+        goods = cls.annotate_catalog_fields(goods)
+        if not with_facets:
+            return goods, [], []
+        signature = get_facets_signature(tag=tag, search=search, slug=slug)
+        sellers, tags = cls.get_sellers_and_tags(some_goods=goods, main_tag=tag, signature=signature)
 
         return goods, sellers, tags
 
     @classmethod
     def get_data_by_slug(cls, some_slug: str) -> QuerySet:
-        """метод возвращает список товаров по слагу"""
-        acceptable_categories = ProductCategory.objects.get(slug=some_slug).get_children() \
-            if ProductCategory.objects.get(slug=some_slug).get_children() \
-            else [ProductCategory.objects.get(slug=some_slug)]
+        """метод возвращает список товаров категории и всех ее подкатегорий по слагу"""
+        category = get_category_node(some_slug)
+        if category is None:
+            return SellerProduct.objects.none()
 
-        return SellerProduct.objects.select_related('product', 'seller', ) \
-            .prefetch_related('product__category', 'product__tags') \
-            .filter(
-            product__category__in=acceptable_categories
-        ).annotate(Count('product__product_comments'))
+        return SellerProduct.objects.filter(product__category_id__in=category.descendants_ids)
 
     @classmethod
     def get_data_by_tag(cls, some_tag: str) -> QuerySet:
-        """метод возвращает список товаров по тэгу"""
-
-        return SellerProduct.objects.select_related('product', 'seller', ) \
-            .prefetch_related('product__category', 'product__tags') \
-            .filter(
-            product__tags__name__icontains=some_tag
-        ).annotate(Count('product__product_comments'))
+        """
+        метод возвращает список товаров по тэгу. Товары отбираются подзапросом, чтобы товар с несколькими
+        подходящими тэгами не повторялся в выборке
+        """
+        tagged = SellerProduct.objects.filter(product__tags__name__icontains=some_tag).values('pk')
+        return SellerProduct.objects.filter(pk__in=tagged)
 
     @classmethod
     def get_data_by_search_query(cls, some_search_query: str) -> QuerySet:
-        """метод возвращает список товаров по запросу из строки поиска"""
-
-        return SellerProduct.objects.select_related('product', 'seller', ) \
-            .prefetch_related('product__category', 'product__tags') \
-            .filter(
-            Q(product__name__icontains=some_search_query) |
-            Q(product__category__name__icontains=some_search_query) |
-            Q(product__tags__name__icontains=some_search_query) |
-            Q(seller__name__icontains=some_search_query)
-        ).annotate(Count('product__product_comments'))
+        """метод возвращает список товаров по запросу из строки поиска с учетом релевантности"""
 
-    @classmethod
-    def choose_popular_tags(cls, tags_list: List[Tag]) -> List:
-        """метод возвращает 6 самых популярных тегов из списка"""
-        pre_sort = []
-        for el in tags_list:
-            pre_sort.append((el, tags_list.count(el)))
-
-        the_most_popular_tags = sorted(list(set(pre_sort)), key=lambda x: x[1], reverse=True)
-        if len(the_most_popular_tags) <= 6:
-            return [tag[0] for tag in the_most_popular_tags]
-        return [tag[0] for tag in the_most_popular_tags][:6]
+        return search_seller_products(some_search_query)
 
     @classmethod
     def filtering_data(cls, some_goods: QuerySet, filter_data: Dict) -> QuerySet:
         """фильтрует товары в соответсвии с данными формы фильтров"""
-        print(f'filter*** {filter_data}')
-        print(f'start*** {some_goods}')
         some_goods = some_goods.filter(
             seller__name__icontains=filter_data['f_select'],
             product__name__icontains=filter_data['f_title'],
-            quantity__gte=filter_data['in_stock'],
             product__limited__icontains=filter_data['is_hot'],
-        ).annotate(Count('product__product_comments'))
-        print(f'big filter*** {some_goods}')
+        )
+        if filter_data['in_stock']:
+            some_goods = annotate_available_stock(some_goods).filter(available_quantity__gte=filter_data['in_stock'])
         if filter_data.get('tag', False):
             some_goods = some_goods.filter(
                 product__tags__name=filter_data['tag'],
             )
-        print(f'tag*** {some_goods}')
         if filter_data['f_price'][0] and filter_data['f_price'][1]:
             some_goods = cls.filtering_by_price(filter_data, some_goods)
-        print(f'price*** {some_goods}')
 
         return some_goods
 
     @classmethod
-    def get_full_data_with_filters(cls, search_query: str or None, search_tag: str or None, slug: str, filter_data: Dict
-                                   ) -> Tuple:
+    def get_full_data_with_filters(cls, search_query: str or None, search_tag: str or None, slug: str,
+                                   filter_data: Dict, with_facets: bool = True) -> Tuple:
         """
         метод для получения всех необходимых данных для отрисовки каталога с фильтрами
         :param search_query: пользовательский запрос из поисковой строки
         :param search_tag: пользовательский тэг для поиска всех товаров независимо от категории
         :param filter_data: словарь со значениями фильтров для отображения карточек товаров в магазинах
         :param slug: слаг категории товаров
+        :param with_facets: рассчитывать ли продавцов и тэги выборки
 
         :return:    items_for_catalog - список товаров из магазина для отрисовки в каталоге
                     sellers - список уникальных продавцов
@@ -206,115 +210,181 @@ class CatalogByCategoriesMixin:
         else:
             goods = SellerProduct.objects.all()
 
+        goods = cls.annotate_catalog_fields(goods)
         goods = cls.filtering_data(goods, filter_data)
-        sellers, tags = cls.get_sellers_and_tags(goods, search_tag)
+        if not with_facets:
+            return goods, [], []
+        signature = get_facets_signature(tag=search_tag, search=search_query, slug=slug, filters=filter_data)
+        sellers, tags = cls.get_sellers_and_tags(goods, search_tag, signature, bool(filter_data['in_stock']))
 
         return goods, sellers, tags
 
     @classmethod
-    def get_sellers_and_tags(cls, some_goods: QuerySet, main_tag: str = '') -> Tuple[List, List]:
-        """метод возвращает уникальных продавцов и тэги по списку товаров"""
-        sellers = []
-        tags = []
-
-        for good in some_goods:
-            if good.seller not in sellers:
-                sellers.append(good.seller)
-
-            for tag in good.product.tags.all():
-                if tag not in tags and tag.name != main_tag:
-                    tags.append(tag)
-
-        tags = cls.choose_popular_tags(tags)
-        return sellers, tags
+    def get_sellers_and_tags(cls, some_goods: QuerySet, main_tag: str = '', signature: tuple = None,
+                             in_stock: bool = False) -> Tuple[List, List]:
+        """метод возвращает уникальных продавцов и популярные тэги по выборке товаров"""
+        facets = get_catalog_facets(some_goods, main_tag, signature, in_stock)
+        return facets['sellers'], facets['tags']
 
     @classmethod
-    def filtering_by_price(cls, filter_data: dict, some_goods_list: QuerySet) -> List:
-        """метод фильтрации списка товаров по минимальной и максимальной стоимостям"""
+    def filtering_by_price(cls, filter_data: dict, some_goods: QuerySet) -> QuerySet:
+        """метод фильтрации выборки товаров по минимальной и максимальной стоимостям"""
 
         mini = int(filter_data['f_price'][0], 0)
         maxi = int(filter_data['f_price'][1], 0)
 
-        goods_with_price = cls.add_sale_prices_in_goods_if_needed(some_goods_list)
-        result_goods = []
-
-        for elem in goods_with_price:
-            if mini <= elem.total <= maxi:
-                result_goods.append(elem)
-
-        return result_goods
+        return some_goods.filter(total__gte=mini, total__lte=maxi)
 
     @classmethod
-    def sort_by_name(cls, some_list: List, direction: bool) -> List:
+    def sort_by_name(cls, some_goods: QuerySet, direction: bool) -> QuerySet:
         """
         метод сортировки товаров в магазинах по наименованию
-        :param some_list: исходный список товаров
-        :param direction: направление сорировки; true - по возрастанию, false - по убыванию
-        :return: отсортированный по наименованию список
+        :param some_goods: исходная выборка товаров
+        :param direction: направление сорировки; false - по возрастанию, true - по убыванию
+        :return: отсортированная по наименованию выборка
         """
-        return sorted(some_list, key=lambda x: x.product.name, reverse=direction)
+        return cls.order_goods(some_goods, cls.SORT_FIELDS['name'], direction)
 
     @classmethod
-    def sort_by_pop(cls, some_list: List, direction: bool) -> List:
+    def sort_by_pop(cls, some_goods: QuerySet, direction: bool) -> QuerySet:
         """
         метод сортировки товаров в магазинах по количеству заказов
-        :param some_list: исходный список товаров
-        :param direction: направление сорировки; true - по возрастанию, false - по убыванию
-        :return: отсортированный по наименованию список
+        :param some_goods: исходная выборка товаров
+        :param direction: направление сорировки; false - по возрастанию, true - по убыванию
+        :return: отсортированная по количеству заказов выборка
         """
-        return sorted(some_list, key=lambda x: len(x.order_products.all()), reverse=direction)
+        return cls.order_goods(some_goods, cls.SORT_FIELDS['pop'], direction)
 
     @classmethod
-    def sort_by_price(cls, some_list: List, direction: bool) -> List:
-        return sorted(some_list, key=lambda x: x.total, reverse=direction)
+    def sort_by_price(cls, some_goods: QuerySet, direction: bool) -> QuerySet:
+        """
+        метод сортировки товаров в магазинах по стоимости
+        :param some_goods: исходная выборка товаров
+        :param direction: направление сорировки; false - по возрастанию, true - по убыванию
+        :return: отсортированная по стоимости выборка
+        """
+        return cls.order_goods(some_goods, cls.SORT_FIELDS['price'], direction)
 
     @classmethod
-    def sort_by_amount_of_comments(cls, some_list: List, direction: bool) -> List:
+    def sort_by_amount_of_comments(cls, some_goods: QuerySet, direction: bool) -> QuerySet:
         """
         метод сортировки товаров в магазинах по количеству комментариев
-        :param some_list: исходный список товаров
-        :param direction: направление сорировки; true - по возрастанию, false - по убыванию
-        :return: отсортированный по количеству комментариев список
+        :param some_goods: исходная выборка товаров
+        :param direction: направление сорировки; false - по возрастанию, true - по убыванию
+        :return: отсортированная по количеству комментариев выборка
         """
-        return sorted(some_list, key=lambda x: x.product.product_comments.count(), reverse=direction)
+        return cls.order_goods(some_goods, cls.SORT_FIELDS['comment'], direction)
 
     @classmethod
-    def sort_by_newness(cls, some_list: List, direction: bool) -> List:
+    def sort_by_newness(cls, some_goods: QuerySet, direction: bool) -> QuerySet:
         """
         метод сортировки товаров в магазинах по новизне
-        :param some_list: исходный список товаров
-        :param direction: направление сорировки; true - по возрастанию, false - по убыванию
-        :return: отсортированный по новизне список
+        :param some_goods: исходная выборка товаров
+        :param direction: направление сорировки; false - по возрастанию, true - по убыванию
+        :return: отсортированная по новизне выборка
         """
-        return sorted(some_list, key=lambda x: x.date_added, reverse=direction)
+        return cls.order_goods(some_goods, cls.SORT_FIELDS['newness'], direction)
 
     @classmethod
-    def get_min_price(cls, some_list: List) -> int or float:
+    def sort_by_rank(cls, some_goods: QuerySet, direction: bool) -> QuerySet:
         """
-        метод для получения минимальной стоимости товара из списка товаров
-        :param some_list: список товаров в маганах
-        :return: минимальная стоимость товара из представленного списка товаров
+        метод сортировки товаров в магазинах по релевантности поисковому запросу
+        :param some_goods: исходная выборка товаров
+        :param direction: направление сорировки; false - по возрастанию, true - по убыванию
+        :return: отсортированная по релевантности выборка (для выборки не из поиска - по id)
         """
-        try:
-            mini = min([x.total for x in some_list])
+        if 'search_rank' not in some_goods.query.annotations:
+            return some_goods.order_by('id')
+        return cls.order_goods(some_goods, cls.SORT_FIELDS['rank'], direction)
 
-        except ValueError:
-            mini = 0
-        return mini
+    @classmethod
+    def order_goods(cls, some_goods: QuerySet, field: str, direction: bool) -> QuerySet:
+        """
+        метод сортировки выборки по полю; id добавляется для стабильного порядка страниц пагинации
+        """
+        if direction:
+            return some_goods.order_by(F(field).desc(), '-id')
+        return some_goods.order_by(F(field).asc(), 'id')
 
     @classmethod
-    def get_max_price(cls, some_list: List) -> int or float:
+    def get_sort_field(cls, some_goods: QuerySet, sort_type: str) -> Tuple:
         """
-        метод для получения максимальной стоимости товара из списка товаров
-        :param some_list: список товаров в маганах
-        :return: максимальная стоимость товара из представленного списка товаров
+        метод возвращает поле и направление сортировки выборки для заданного типа сортировки;
+        поле None означает сортировку только по id
         """
+        sort_name, _, direction = sort_type.rpartition('_')
+        field = cls.SORT_FIELDS.get(sort_name) if direction in ('inc', 'dec') else None
+        if field == cls.SORT_FIELDS['rank'] and field not in some_goods.query.annotations:
+            field = None
+        return field, field is not None and direction == 'dec'
+
+    @classmethod
+    def encode_cursor(cls, item: SellerProduct, field: str or None) -> str:
+        """метод возвращает непрозрачный токен курсора с ключом сортировки и id последнего товара страницы"""
+        value = item
+        for attr in field.split('__') if field else []:
+            value = getattr(value, attr)
+        key = [value.isoformat() if hasattr(value, 'isoformat') else str(value), item.id] if field else [item.id]
+        return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+    @classmethod
+    def decode_cursor(cls, cursor: str, field: str or None) -> List or None:
+        """метод возвращает ключ сортировки и id из токена курсора или None для некорректного токена"""
         try:
-            maxi = max([x.total for x in some_list])
+            key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError, UnicodeError):
+            return None
+        if not isinstance(key, list) or len(key) != (2 if field else 1) or not isinstance(key[-1], int):
+            return None
+        return key
+
+    @classmethod
+    def get_cursor_page(cls, some_goods: QuerySet, sort_type: str, cursor: str = '') -> Tuple[List, str or None]:
+        """
+        метод возвращает страницу товаров, следующую за курсором, без подсчета общего количества товаров:
+        вместо OFFSET используется условие по ключу сортировки и id последнего товара предыдущей страницы
+        :param some_goods: отсортированная методом simple_sort выборка товаров
+        :param sort_type: тип сортировки
+        :param cursor: токен курсора из параметра after; пустой токен - первая страница
+        :return:    items - товары страницы со стоимостями с учетом скидок
+                    next_cursor - токен курсора следующей страницы или None, если страница последняя
+        """
+        field, descending = cls.get_sort_field(some_goods, sort_type)
+        key = cls.decode_cursor(cursor, field) if cursor else None
+
+        if key:
+            lookup = 'lt' if descending else 'gt'
+            if field:
+                value, last_id = key
+                some_goods = some_goods.filter(
+                    Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': last_id})
+                )
+            else:
+                some_goods = some_goods.filter(**{f'id__{lookup}': key[0]})
+
+        items = list(some_goods[:cls.PAGE_SIZE + 1])
+        next_cursor = None
+        if len(items) > cls.PAGE_SIZE:
+            items = items[:cls.PAGE_SIZE]
+            next_cursor = cls.encode_cursor(items[-1], field)
+        return cls.add_sale_prices_in_goods_if_needed(items), next_cursor
 
-        except ValueError:
-            maxi = 10000
-        return maxi
+    @classmethod
+    def get_price_bounds(cls, some_goods: QuerySet) -> Tuple:
+        """
+        метод для получения минимальной и максимальной стоимостей товаров выборки одним агрегирующим запросом
+        или по стоимостям закэшированной выборки
+        :param some_goods: выборка товаров в маганах
+        :return: минимальная и максимальная стоимости товаров выборки
+        """
+        if isinstance(some_goods, CatalogResult):
+            mini, maxi = some_goods.get_price_bounds()
+        else:
+            bounds = some_goods.order_by().aggregate(mini=Min('total'), maxi=Max('total'))
+            mini, maxi = bounds['mini'], bounds['maxi']
+        mini = mini if mini is not None else 0
+        maxi = maxi if maxi is not None else 10000
+        return mini, maxi
 
     @classmethod
     def get_data_from_form(cls, request: HttpRequest) -> Dict:
@@ -348,7 +418,8 @@ class CatalogByCategoriesMixin:
         search = request.GET.get('query', None) \
             if request.GET.get('query', None) and request.GET.get('query', None) != 'undefined' else ''
         tag = request.GET.get('main_tag', None) if request.GET.get('main_tag', None) else ''
-        sort_type = request.GET.get('sort_type', None) if request.GET.get('sort_type', None) else 'price_inc'
+        default_sort_type = 'rank_dec' if search else 'price_inc'
+        sort_type = request.GET.get('sort_type', None) if request.GET.get('sort_type', None) else default_sort_type
         page = request.GET.get('page', None) if request.GET.get('page', None) else 1
         slug = request.GET.get('slug', None) if request.GET.get('slug', None) else ''
 
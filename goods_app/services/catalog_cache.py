@@ -0,0 +1,137 @@
+import hashlib
+import math
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, QuerySet
+from django.utils import timezone
+
+from settings_app.utils import get_cache_version, bump_cache_version, bump_cache_version_on_commit
+from stores_app.models import SellerProduct
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_STOCK_VERSION_KEY = 'catalog:stock:version'
+CATALOG_CACHE_TIME = 10 * 60
+# cached prefix of a catalog result: the first 50 pages of 8 products
+CATALOG_CACHED_ITEMS = 400
+
+
+def get_catalog_version(in_stock: bool = False) -> str:
+    """
+    Get version of cached catalog results and facets. Results filtered by the available stock
+    also depend on the version of the stock
+    """
+    version = get_cache_version(CATALOG_VERSION_KEY)
+    if in_stock:
+        version = '{}:{}'.format(version, get_cache_version(CATALOG_STOCK_VERSION_KEY))
+    return version
+
+
+def reset_catalog_cache() -> None:
+    """
+    Mark all cached catalog results and facets as stale
+    """
+    bump_cache_version(CATALOG_VERSION_KEY)
+
+
+def reset_catalog_stock_cache() -> None:
+    """
+    Mark cached catalog results and facets filtered by the available stock as stale, when the current transaction
+    is committed
+    """
+    bump_cache_version_on_commit(CATALOG_STOCK_VERSION_KEY)
+
+
+def get_catalog_cache_key(signature: tuple, in_stock: bool = False) -> str:
+    """
+    Get cache key of catalog result by the canonical signature of catalog params
+    """
+    digest = hashlib.md5(repr(signature).encode()).hexdigest()
+    return 'catalog:{}:{}'.format(get_catalog_version(in_stock), digest)
+
+
+def get_catalog_cache_time(in_stock: bool = False) -> int:
+    """
+    Get cache time of catalog result. A result filtered by the available stock is kept not longer than
+    the nearest stock hold expiry, which returns a product to stock
+    """
+    if in_stock:
+        from orders_app.services.stock import get_next_stock_return
+
+        next_return = get_next_stock_return()
+        if next_return is not None:
+            return max(1, min(CATALOG_CACHE_TIME, math.ceil((next_return - timezone.now()).total_seconds())))
+    return CATALOG_CACHE_TIME
+
+
+class CatalogResult:
+    """
+    Sorted catalog result: the cached prefix of products in shops ids and their prices after discounts,
+    the count and the price bounds of the whole result. Supports count and slicing, so it can be paginated;
+    only the requested slice is loaded from the database, slices after the prefix are loaded by the goods queryset
+    """
+
+    def __init__(self, goods: QuerySet, ids: List[int], totals: List[str], total_count: int,
+                 price_bounds: Tuple[Optional[str], Optional[str]]) -> None:
+        self.goods = goods
+        self.ids = ids
+        self.totals = totals
+        self.total_count = total_count
+        self.price_bounds = price_bounds
+
+    def count(self) -> int:
+        return self.total_count
+
+    def __len__(self) -> int:
+        return self.total_count
+
+    def __getitem__(self, item) -> List[SellerProduct]:
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop, _ = item.indices(self.total_count)
+        if stop <= len(self.ids):
+            return self.load(self.ids[start:stop], self.totals[start:stop])
+        return list(self.goods[start:stop])
+
+    @staticmethod
+    def load(ids: List[int], totals: List[str]) -> List[SellerProduct]:
+        """
+        Load products in shops by ids in the same order with prices after discounts
+        """
+        goods = SellerProduct.objects.select_related('product', 'seller', 'product__category').in_bulk(ids)
+        result = []
+        for seller_product_id, total in zip(ids, totals):
+            if seller_product_id in goods:
+                goods[seller_product_id].total = Decimal(total)
+                result.append(goods[seller_product_id])
+        return result
+
+    def get_price_bounds(self) -> Tuple:
+        """
+        Get minimal and maximal prices after discounts of the result or None, if the result is empty
+        """
+        return tuple(Decimal(total) if total is not None else None for total in self.price_bounds)
+
+
+def get_cached_catalog(goods: QuerySet, signature: tuple, in_stock: bool = False) -> CatalogResult:
+    """
+    Get sorted catalog result from the cache by the signature of catalog params or calculate it by the
+    sorted goods queryset annotated by prices after discounts. Only the first CATALOG_CACHED_ITEMS products
+    are cached, the count and the price bounds of a longer result are calculated by one aggregate query.
+    In_stock marks the result filtered by the available stock
+    """
+    catalog_cache_key = get_catalog_cache_key(signature, in_stock)
+    result = cache.get(catalog_cache_key)
+    if result is None:
+        rows = list(goods.values_list('pk', 'total')[:CATALOG_CACHED_ITEMS])
+        totals = [total for _, total in rows]
+        if len(rows) < CATALOG_CACHED_ITEMS:
+            total_count, bounds = len(rows), (min(totals, default=None), max(totals, default=None))
+        else:
+            aggregate = goods.order_by().aggregate(count=Count('pk'), mini=Min('total'), maxi=Max('total'))
+            total_count, bounds = aggregate['count'], (aggregate['mini'], aggregate['maxi'])
+        result = ([seller_product_id for seller_product_id, _ in rows], [str(total) for total in totals],
+                  total_count, tuple(str(total) if total is not None else None for total in bounds))
+        cache.set(catalog_cache_key, result, get_catalog_cache_time(in_stock))
+    return CatalogResult(goods, *result)
@@ -0,0 +1,94 @@
+from typing import Dict, FrozenSet, NamedTuple, Optional, Tuple
+
+from settings_app.utils import get_cache_version, bump_cache_version_on_commit
+
+CATEGORY_TREE_VERSION_KEY = 'categories:version'
+
+
+class CategoryNode(NamedTuple):
+    """
+    Category of the tree index with ids of the category and all its descendants
+    """
+    id: int
+    slug: str
+    parent_id: Optional[int]
+    tree_id: int
+    lft: int
+    rght: int
+    descendants_ids: FrozenSet[int]
+
+
+_category_tree = {'version': None, 'nodes': {}, 'ancestors': {}}
+
+
+def build_category_tree(categories) -> Dict[str, CategoryNode]:
+    """
+    Build the index slug -> category node. Descendants of every category are the following categories
+    of the same tree with lft less than rght of the category
+    """
+    categories = sorted(categories, key=lambda category: (category.tree_id, category.lft))
+    nodes = {}
+    for index, category in enumerate(categories):
+        descendants_ids = {category.id}
+        for descendant in categories[index + 1:]:
+            if descendant.tree_id != category.tree_id or descendant.lft > category.rght:
+                break
+            descendants_ids.add(descendant.id)
+        nodes[category.slug] = CategoryNode(category.id, category.slug, category.parent_id, category.tree_id,
+                                            category.lft, category.rght, frozenset(descendants_ids))
+    return nodes
+
+
+def build_category_ancestors(nodes: Dict[str, CategoryNode]) -> Dict[int, Tuple[int, ...]]:
+    """
+    Build the index category id -> ids of the category and all its ancestors from the nearest one to the root.
+    Parents go before their children in the tree order, so ancestors of the parent are always ready
+    """
+    ancestors = {}
+    for node in sorted(nodes.values(), key=lambda node: (node.tree_id, node.lft)):
+        ancestors[node.id] = (node.id, *ancestors.get(node.parent_id, ()))
+    return ancestors
+
+
+def load_category_tree() -> None:
+    """
+    Rebuild the category tree indexes of the process, when the categories version was changed
+    """
+    from goods_app.services.catalog import get_categories
+
+    version = get_cache_version(CATEGORY_TREE_VERSION_KEY)
+    if _category_tree['version'] != version:
+        nodes = build_category_tree(get_categories())
+        _category_tree['ancestors'] = build_category_ancestors(nodes)
+        _category_tree['nodes'] = nodes
+        _category_tree['version'] = version
+
+
+def get_category_tree() -> Dict[str, CategoryNode]:
+    """
+    Get the category tree index of the process. The index is rebuilt, when the categories version was changed
+    """
+    load_category_tree()
+    return _category_tree['nodes']
+
+
+def get_category_ancestors() -> Dict[int, Tuple[int, ...]]:
+    """
+    Get the index category id -> ids of the category and its ancestors
+    """
+    load_category_tree()
+    return _category_tree['ancestors']
+
+
+def get_category_node(slug: str) -> Optional[CategoryNode]:
+    """
+    Get category node by slug
+    """
+    return get_category_tree().get(slug)
+
+
+def reset_category_tree() -> None:
+    """
+    Mark the category tree index of every process as stale, when the current transaction is committed
+    """
+    bump_cache_version_on_commit(CATEGORY_TREE_VERSION_KEY)
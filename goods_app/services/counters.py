@@ -0,0 +1,101 @@
+from typing import Dict, Iterable, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from goods_app.models import Product, ProductComment
+from goods_app.services.card_cache import invalidate_cards
+from goods_app.services.catalog_cache import reset_catalog_cache
+from orders_app.models import OrderProduct
+from stores_app.models import SellerProduct
+
+
+def calculate_rating(comments_count: int, ratings_sum: int) -> float:
+    """
+    Calculate the average rating of the product rounded to a whole number. Python round is used,
+    so halves are rounded to even as before the counters were introduced
+    """
+    if not comments_count:
+        return 0.0
+    return float(round(ratings_sum / comments_count))
+
+
+def reset_products_rating_caches(products_ids: Iterable[int]) -> None:
+    """
+    Invalidate rendered cards and cached catalog results, which show the rating of products.
+    Ratings are written by QuerySet.update, which does not send post_save of products
+    """
+    invalidate_cards(SellerProduct.objects.filter(product_id__in=list(products_ids)).values_list('pk', flat=True))
+    reset_catalog_cache()
+
+
+def update_product_comments_counters(product_id: int, count_delta: int, rating_delta: int) -> None:
+    """
+    Update the comments count, the ratings sum and the average rating of the product.
+    Counters are not decreased below zero, they may be not reconciled for comments created before them
+    """
+    with transaction.atomic():
+        products = Product.objects.filter(pk=product_id)
+        products.update(comments_count=Greatest(F('comments_count') + count_delta, 0),
+                        ratings_sum=Greatest(F('ratings_sum') + rating_delta, 0))
+        counters = products.values_list('comments_count', 'ratings_sum').first()
+        if counters is None:
+            return
+        products.update(rating=calculate_rating(*counters))
+    reset_products_rating_caches([product_id])
+
+
+def update_seller_products_sales(lines: Iterable[Tuple[int, int]], sign: int = 1) -> None:
+    """
+    Update the sold quantity and the paid orders count of products in shops by paid order lines -
+    tuples of product in shop id and quantity. Sign -1 is used for lines leaving paid orders.
+    Counters are not decreased below zero, they may be not reconciled for orders paid before them
+    """
+    sales: Dict[int, list] = {}
+    for seller_product_id, quantity in lines:
+        quantity_and_orders = sales.setdefault(seller_product_id, [0, 0])
+        quantity_and_orders[0] += quantity or 0
+        quantity_and_orders[1] += 1
+    for seller_product_id, (quantity, orders) in sales.items():
+        SellerProduct.objects.filter(pk=seller_product_id).update(
+            sold_quantity=Greatest(F('sold_quantity') + sign * quantity, 0),
+            paid_orders_count=Greatest(F('paid_orders_count') + sign * orders, 0),
+        )
+
+
+def reconcile_counters() -> Tuple[int, int]:
+    """
+    Recalculate drifted counters of products and products in shops from comments and paid order lines.
+    Returns the number of fixed products and products in shops
+    """
+    comments = ProductComment.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    real_count = Coalesce(Subquery(comments.annotate(count=Count('pk')).values('count'),
+                                   output_field=IntegerField()), 0)
+    real_sum = Coalesce(Subquery(comments.annotate(total=Sum('rating')).values('total'),
+                                 output_field=IntegerField()), 0)
+    products_ids = list(Product.objects.annotate(real_count=real_count, real_sum=real_sum)
+                                       .exclude(comments_count=F('real_count'), ratings_sum=F('real_sum'))
+                                       .values_list('pk', flat=True))
+    if products_ids:
+        Product.objects.filter(pk__in=products_ids).update(comments_count=real_count, ratings_sum=real_sum)
+        products = list(Product.objects.filter(pk__in=products_ids).only('pk', 'comments_count', 'ratings_sum'))
+        for product in products:
+            product.rating = calculate_rating(product.comments_count, product.ratings_sum)
+        Product.objects.bulk_update(products, ['rating'])
+        reset_products_rating_caches(products_ids)
+
+    lines = OrderProduct.objects.filter(seller_product=OuterRef('pk'), order__paid=True) \
+                                .order_by().values('seller_product')
+    real_quantity = Coalesce(Subquery(lines.annotate(total=Sum('quantity')).values('total'),
+                                      output_field=IntegerField()), 0)
+    real_orders = Coalesce(Subquery(lines.annotate(count=Count('pk')).values('count'),
+                                    output_field=IntegerField()), 0)
+    seller_products_ids = list(SellerProduct.objects.annotate(real_quantity=real_quantity, real_orders=real_orders)
+                                                    .exclude(sold_quantity=F('real_quantity'),
+                                                             paid_orders_count=F('real_orders'))
+                                                    .values_list('pk', flat=True))
+    if seller_products_ids:
+        SellerProduct.objects.filter(pk__in=seller_products_ids).update(sold_quantity=real_quantity,
+                                                                        paid_orders_count=real_orders)
+    return len(products_ids), len(seller_products_ids)
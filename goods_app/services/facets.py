@@ -0,0 +1,58 @@
+import hashlib
+from typing import Dict
+
+from django.core.cache import cache
+from django.db.models import Count, QuerySet
+from taggit.models import Tag
+
+from goods_app.services.catalog_cache import get_catalog_version
+from stores_app.models import Seller
+
+POPULAR_TAGS_COUNT = 6
+
+
+def get_facets_cache_key(signature: tuple, in_stock: bool = False) -> str:
+    """
+    Get cache key for catalog facets by the filter signature and the catalog version
+    """
+    digest = hashlib.md5(repr(signature).encode()).hexdigest()
+    return 'catalog_facets:{}:{}'.format(get_catalog_version(in_stock), digest)
+
+
+def get_catalog_facets(goods: QuerySet, main_tag: str = '', signature: tuple = None, in_stock: bool = False) -> Dict:
+    """
+    Function to get catalog facets for the goods queryset: distinct sellers and the most popular tags with
+    the count of seller products for every tag. Every facet is calculated by one grouped query.
+    If signature is passed the result is cached by it, in_stock marks goods filtered by the available stock
+    """
+    facets_cache_key = get_facets_cache_key(signature, in_stock) if signature is not None else None
+    if facets_cache_key:
+        facets = cache.get(facets_cache_key)
+        if facets is not None:
+            return facets
+
+    goods_ids = goods.order_by().values('pk')
+    sellers = list(Seller.objects.filter(seller_products__in=goods_ids)
+                                 .annotate(count=Count('seller_products', distinct=True))
+                                 .order_by('name'))
+    tags = list(Tag.objects.filter(product__seller_products__in=goods_ids)
+                           .exclude(name=main_tag)
+                           .annotate(count=Count('product__seller_products', distinct=True))
+                           .order_by('-count', 'name')[:POPULAR_TAGS_COUNT])
+    facets = {'sellers': sellers, 'tags': tags}
+
+    if facets_cache_key:
+        cache.set(facets_cache_key, facets, 10 * 60)
+    return facets
+
+
+def get_facets_signature(**params) -> tuple:
+    """
+    Get canonical signature of catalog filter params
+    """
+    signature = []
+    for key, value in sorted(params.items()):
+        if isinstance(value, dict):
+            value = tuple(sorted((item_key, repr(item)) for item_key, item in value.items()))
+        signature.append((key, value))
+    return tuple(signature)
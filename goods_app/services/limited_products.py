@@ -178,9 +178,7 @@ def get_all_products(count: int) -> QuerySet:
         queryset = SellerProduct.objects.select_related('seller', 'product',
                                                         'product__category',
                                                         'product__category__parent')\
-                                        .annotate(buying=Count('order_products__quantity',
-                                                               filter=Q(order_products__order__paid=True)))\
-                                        .order_by('-buying')[:count]
+                                        .order_by('-paid_orders_count', 'id')[:count]
         # queryset = order_products_by_quantity_selling(queryset)
         cache.set(products_cache_key, queryset, 24 * 60 * 60)
     products = get_discounted_prices_for_seller_products(queryset)
@@ -3,12 +3,12 @@ from typing import Dict, List
 from django.conf import settings
 from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.db.models import Avg, QuerySet
+from django.db.models import QuerySet
 from django.http import HttpRequest
 from dynamic_preferences.registries import global_preferences_registry
 
 from discounts_app.services import get_discounted_prices_for_seller_products
-from goods_app.models import ProductComment, Product
+from goods_app.models import Product
 from stores_app.models import SellerProduct
 
 
@@ -160,14 +160,10 @@ class CurrentProduct:
 
     def update_product_rating(self) -> None:
         """
-        Method for calculating and updating product rating, when the review added
+        Method for reloading product rating, when the review added. The rating and the comments count are
+        maintained by the comments signals
         """
-        rating = ProductComment.objects.only('rating') \
-            .filter(product_id=self.product.id) \
-            .aggregate(Avg('rating'))['rating__avg']
-        if rating:
-            self.product.rating = round(float(rating), 0)
-            self.product.save(update_fields=['rating'])
+        self.product.refresh_from_db(fields=['rating', 'comments_count', 'ratings_sum'])
 
 
 def context_pagination(request: HttpRequest, queryset: QuerySet, size_page: int = 3) -> Paginator:
@@ -0,0 +1,99 @@
+import re
+from typing import Dict, List
+
+from django.db.models import IntegerField, OuterRef, Q, QuerySet, Subquery, Sum, Value
+
+from goods_app.models import SearchToken
+from stores_app.models import SellerProduct
+
+TOKEN_MAX_LENGTH = 50
+
+PRODUCT_NAME_WEIGHT = 4
+TAG_WEIGHT = 3
+CATEGORY_WEIGHT = 2
+SELLER_WEIGHT = 1
+
+INDEX_BATCH_SIZE = 500
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text to lowercase word tokens
+    """
+    if not text:
+        return []
+    return [token[:TOKEN_MAX_LENGTH] for token in re.findall(r'\w+', text.lower())]
+
+
+def get_seller_product_tokens(seller_product: SellerProduct) -> Dict[str, int]:
+    """
+    Get all tokens of the seller product with their weights. If the token is found in several
+    fields, the biggest weight is used
+    """
+    sources = [
+        (seller_product.product.name, PRODUCT_NAME_WEIGHT),
+        (seller_product.product.category.name, CATEGORY_WEIGHT),
+        (seller_product.seller.name, SELLER_WEIGHT),
+    ]
+    sources += [(tag.name, TAG_WEIGHT) for tag in seller_product.product.tags.all()]
+
+    tokens = dict()
+    for text, weight in sources:
+        for token in tokenize(text):
+            tokens[token] = max(weight, tokens.get(token, 0))
+    return tokens
+
+
+def index_seller_products(seller_products: QuerySet) -> None:
+    """
+    Rebuild search tokens for the seller products queryset
+    """
+    seller_products = seller_products.select_related('product', 'product__category', 'seller') \
+                                     .prefetch_related('product__tags') \
+                                     .order_by('pk')
+    last_id = 0
+    while True:
+        batch = list(seller_products.filter(pk__gt=last_id)[:INDEX_BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].pk
+        SearchToken.objects.filter(seller_product__in=[item.pk for item in batch]).delete()
+        SearchToken.objects.bulk_create([
+            SearchToken(token=token, seller_product=item, weight=weight)
+            for item in batch
+            for token, weight in get_seller_product_tokens(item).items()
+        ])
+
+
+def rebuild_search_index() -> int:
+    """
+    Rebuild search index from scratch. Returns count of indexed seller products
+    """
+    SearchToken.objects.all().delete()
+    index_seller_products(SellerProduct.objects.all())
+    return SellerProduct.objects.count()
+
+
+def search_seller_products(query: str, goods: QuerySet = None) -> QuerySet:
+    """
+    Search seller products by the query. Every word of the query must be a prefix of any product token.
+    Returns the queryset without duplicates annotated with search_rank - sum of matched tokens weights
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if goods is None:
+        goods = SellerProduct.objects.all()
+    if not terms:
+        return goods.annotate(search_rank=Value(0, output_field=IntegerField())).none()
+
+    matched = Q()
+    for term in terms:
+        term_filter = Q(token__startswith=term)
+        goods = goods.filter(pk__in=SearchToken.objects.filter(term_filter).values('seller_product_id'))
+        matched |= term_filter
+
+    rank = SearchToken.objects.filter(matched, seller_product=OuterRef('pk')) \
+                              .order_by() \
+                              .values('seller_product') \
+                              .annotate(rank=Sum('weight')) \
+                              .values('rank')
+    return goods.annotate(search_rank=Subquery(rank))
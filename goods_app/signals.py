@@ -1,9 +1,16 @@
 from django.core.cache import cache
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
 from taggit.models import Tag
 
 from goods_app.models import ProductComment, ProductCategory, Product, Specifications, ProductRequest
+from goods_app.services.autocomplete import update_suggestion
+from goods_app.services.card_cache import invalidate_cards
+from goods_app.services.catalog_cache import reset_catalog_cache
+from goods_app.services.category_tree import reset_category_tree
+from goods_app.services.counters import update_product_comments_counters
+from goods_app.services.search import index_seller_products
+from stores_app.models import SellerProduct
 
 
 @receiver(post_save, sender=ProductComment)
@@ -13,6 +20,7 @@ def comment_post_reset_cache_save_handler(sender, **kwargs) -> None:
     """
     product_id = kwargs['instance'].product_id
     cache.delete('reviews:{}'.format(product_id))
+    reset_catalog_cache()
 
 
 @receiver(pre_delete, sender=ProductComment)
@@ -22,6 +30,7 @@ def comment_post_reset_cache_del_handler(sender, **kwargs) -> None:
     """
     product_id = kwargs['instance'].product_id
     cache.delete('reviews:{}'.format(product_id))
+    reset_catalog_cache()
 
 
 @receiver(post_save, sender=ProductCategory)
@@ -30,6 +39,7 @@ def category_reset_cache_save_handler(sender, **kwargs) -> None:
     Signal for clearing cache
     """
     cache.delete_many(['categories:all', 'random_categories:all'])
+    reset_catalog_cache()
 
 
 @receiver(pre_delete, sender=ProductCategory)
@@ -41,6 +51,7 @@ def category_cache_del_handler(sender, **kwargs) -> None:
     instance.image.delete()
     instance.icon.delete()
     cache.delete_many(['categories:all', 'random_categories:all'])
+    reset_catalog_cache()
 
 
 @receiver(post_save, sender=Product)
@@ -49,6 +60,7 @@ def product_reset_cache_save_handler(sender, **kwargs) -> None:
     Signal for clearing cache
     """
     cache.delete_many(['tags:all', 'specifications:all', 'base_products:all'])
+    reset_catalog_cache()
 
 
 @receiver(pre_delete, sender=Product)
@@ -59,6 +71,7 @@ def product_reset_cache_del_handler(sender, **kwargs) -> None:
     instance = kwargs['instance']
     instance.image.delete()
     cache.delete_many(['tags:all', 'specifications:all', 'base_products:all'])
+    reset_catalog_cache()
 
 
 @receiver(post_save, sender=Tag)
@@ -67,6 +80,7 @@ def tags_reset_cache_save_handler(sender, **kwargs) -> None:
     Signal for clearing cache
     """
     cache.delete('tags:all')
+    reset_catalog_cache()
 
 
 @receiver(pre_delete, sender=Tag)
@@ -75,6 +89,7 @@ def tags_reset_cache_del_handler(sender, **kwargs) -> None:
     Signal for clearing cache
     """
     cache.delete('tags:all')
+    reset_catalog_cache()
 
 
 @receiver(post_save, sender=Specifications)
@@ -101,3 +116,176 @@ def delete_instance(sender, **kwargs) -> None:
     instance = kwargs.get('instance')
     if instance.is_published:
         instance.delete(keep_parents=True)
+
+
+@receiver(post_save, sender=Product)
+def product_search_index_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search index of product in shops
+    """
+    if not kwargs.get('raw'):
+        index_seller_products(SellerProduct.objects.filter(product=kwargs['instance']))
+
+
+@receiver(post_save, sender=ProductCategory)
+def category_search_index_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search index of category products in shops
+    """
+    if not kwargs.get('raw') and not kwargs.get('created'):
+        index_seller_products(SellerProduct.objects.filter(product__category=kwargs['instance']))
+
+
+@receiver(post_save, sender=Tag)
+def tag_search_index_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search index of tagged products in shops
+    """
+    if not kwargs.get('raw') and not kwargs.get('created'):
+        index_seller_products(SellerProduct.objects.filter(product__tags=kwargs['instance']))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_search_index_pre_delete_handler(sender, **kwargs) -> None:
+    """
+    Signal for remembering tagged products in shops before the tag deleting
+    """
+    instance = kwargs['instance']
+    instance.seller_products_ids = list(SellerProduct.objects.filter(product__tags=instance).values_list('pk',
+                                                                                                         flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_search_index_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search index of products in shops, which were tagged by deleted tag
+    """
+    seller_products_ids = getattr(kwargs['instance'], 'seller_products_ids', None)
+    if seller_products_ids:
+        index_seller_products(SellerProduct.objects.filter(pk__in=seller_products_ids))
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def product_tags_search_index_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search index, when product tags were changed
+    """
+    if kwargs['action'] in ('post_add', 'post_remove', 'post_clear') and isinstance(kwargs['instance'], Product):
+        index_seller_products(SellerProduct.objects.filter(product=kwargs['instance']))
+        reset_catalog_cache()
+
+
+@receiver(post_save, sender=Product)
+def product_cards_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for invalidating rendered cards of product in shops
+    """
+    invalidate_cards(SellerProduct.objects.filter(product=kwargs['instance']).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=ProductCategory)
+def category_cards_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for invalidating rendered cards of products in shops of the category and its subcategories
+    """
+    if not kwargs.get('created'):
+        categories = kwargs['instance'].get_descendants(include_self=True)
+        invalidate_cards(SellerProduct.objects.filter(product__category__in=categories).values_list('pk', flat=True))
+
+
+@receiver(pre_save, sender=ProductComment)
+def comment_counters_pre_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for remembering the previous rating of changed comment
+    """
+    instance = kwargs['instance']
+    if not kwargs.get('raw') and instance.pk:
+        previous = ProductComment.objects.filter(pk=instance.pk).values_list('rating', flat=True)
+        instance.previous_rating = previous.first()
+
+
+@receiver(post_save, sender=ProductComment)
+def comment_counters_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating comments counters of product
+    """
+    instance = kwargs['instance']
+    if kwargs.get('raw'):
+        return
+    if kwargs.get('created'):
+        update_product_comments_counters(instance.product_id, 1, instance.rating)
+    elif getattr(instance, 'previous_rating', None) is not None and instance.previous_rating != instance.rating:
+        update_product_comments_counters(instance.product_id, 0, instance.rating - instance.previous_rating)
+
+
+@receiver(post_delete, sender=ProductComment)
+def comment_counters_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating comments counters of product
+    """
+    instance = kwargs['instance']
+    update_product_comments_counters(instance.product_id, -1, -instance.rating)
+
+
+@receiver(post_save, sender=ProductCategory)
+def category_tree_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for refreshing category tree index
+    """
+    reset_category_tree()
+
+
+@receiver(post_delete, sender=ProductCategory)
+def category_tree_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for refreshing category tree index
+    """
+    reset_category_tree()
+
+
+@receiver(post_save, sender=Product)
+def product_autocomplete_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search suggestions
+    """
+    update_suggestion('product', kwargs['instance'])
+
+
+@receiver(post_delete, sender=Product)
+def product_autocomplete_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search suggestions
+    """
+    update_suggestion('product', kwargs['instance'], deleted=True)
+
+
+@receiver(post_save, sender=ProductCategory)
+def category_autocomplete_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search suggestions
+    """
+    update_suggestion('category', kwargs['instance'])
+
+
+@receiver(post_delete, sender=ProductCategory)
+def category_autocomplete_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search suggestions
+    """
+    update_suggestion('category', kwargs['instance'], deleted=True)
+
+
+@receiver(post_save, sender=Tag)
+def tag_autocomplete_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search suggestions
+    """
+    update_suggestion('tag', kwargs['instance'])
+
+
+@receiver(post_delete, sender=Tag)
+def tag_autocomplete_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search suggestions
+    """
+    update_suggestion('tag', kwargs['instance'], deleted=True)
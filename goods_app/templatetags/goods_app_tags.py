@@ -1,6 +1,9 @@
 from typing import Dict, Iterable
 
 from django import template
+from django.utils.safestring import mark_safe
+
+from goods_app.services.card_cache import render_catalog_cards, render_offer_cards
 from goods_app.services.catalog import get_categories
 
 register = template.Library()
@@ -35,9 +38,13 @@ def cards(products, **kwargs) -> Dict:
         slider = True
     if kwargs.get('exclude'):
         exclude = kwargs['exclude']
+    rendered_cards = render_offer_cards(products, slider=slider, exclude_id=getattr(exclude, 'id', None),
+                                        seller_perm=seller_perm)
     return {
-        'products': products,
-        'slider': slider,
-        'exclude': exclude,
-        'seller_perm': seller_perm
+        'rendered_cards': [mark_safe(card) for card in rendered_cards],
     }
+
+
+@register.simple_tag()
+def catalog_cards(goods) -> str:
+    return mark_safe(''.join(render_catalog_cards(goods)))
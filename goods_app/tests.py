@@ -1,3 +1,522 @@
+import re
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.shortcuts import reverse
+
+from discounts_app.models import ProductDiscount
+from goods_app.models import Product, ProductCategory, ProductComment, SearchToken
+from goods_app.services.card_cache import get_card_version_key, render_catalog_cards, render_offer_cards
+from goods_app.services.autocomplete import autocomplete, get_change_key, get_changes_log_state
+from goods_app.services.catalog import CatalogByCategoriesMixin
+from goods_app.services.catalog_cache import get_cached_catalog, get_catalog_version
+from goods_app.services.category_tree import get_category_node, get_category_ancestors
+from goods_app.services.counters import reconcile_counters
+from orders_app.models import Order, OrderProduct
+from goods_app.services.search import search_seller_products, rebuild_search_index
+from stores_app.models import Seller, SellerProduct
+from profiles_app.models import User
+
+
+class CatalogTest(TestCase):
+    """ Тесты каталога товаров """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(email='test@user.com', password='testp@sw0rd', first_name='user',
+                                        last_name='test', phone='+7(922)222-22-22')
+        cls.seller = Seller.objects.create(name='Test Store', slug='test-store', owner=user)
+        cls.category = ProductCategory.objects.create(name='Test category', slug='test-category')
+
+        for index in range(10):
+            product = Product.objects.create(category=cls.category, name=f'Product {index}',
+                                             slug=f'product-{index}', is_published=True)
+            SellerProduct.objects.create(seller=cls.seller, product=product, price=(index + 1) * 100, quantity=10)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_catalog_page(self):
+        """Тест страницы каталога: первая страница содержит 8 самых дешевых товаров"""
+        response = self.client.get(reverse('goods-polls:catalog_url'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'goods_app/catalog.html')
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 10)
+        self.assertEqual([item.price for item in page_obj], [(index + 1) * 100 for index in range(8)])
+        self.assertEqual(response.context['mini'], 100)
+        self.assertEqual(response.context['maxi'], 1000)
+
+    def test_catalog_sort_by_price_dec(self):
+        """Тест сортировки по убыванию стоимости и второй страницы пагинации"""
+        response = self.client.get(reverse('goods-polls:ajax_full'), {'sort_type': 'price_dec', 'page': 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['next_state'], 'price_inc')
+        self.assertIn('Product 1<', data['html'])
+        self.assertIn('Product 0<', data['html'])
+        self.assertNotIn('Product 9<', data['html'])
+
+    def test_catalog_sort_by_name(self):
+        """Тест сортировки по наименованию"""
+        response = self.client.get(reverse('goods-polls:ajax_full'), {'sort_type': 'name_dec'})
+        html = response.json()['html']
+        self.assertLess(html.index('Product 9<'), html.index('Product 8<'))
+
+    def test_catalog_filter_by_price(self):
+        """Тест фильтрации по стоимости"""
+        response = self.client.get(reverse('goods-polls:ajax_full'), {'sort_type': 'price_inc', 'price': '250;550'})
+        html = response.json()['html']
+        for index in range(2, 5):
+            self.assertIn(f'Product {index}<', html)
+        self.assertNotIn('Product 1<', html)
+        self.assertNotIn('Product 5<', html)
+
+    def test_catalog_price_with_discount(self):
+        """Тест фильтрации и сортировки по стоимости с учетом скидки"""
+        discount = ProductDiscount.objects.create(seller=self.seller, name='Half price', percent=50, is_active=True)
+        discount.seller_products.set([SellerProduct.objects.get(product__slug='product-9')])
+
+        response = self.client.get(reverse('goods-polls:ajax_full'), {'sort_type': 'price_inc', 'price': '450;550'})
+        html = response.json()['html']
+        self.assertIn('Product 4<', html)
+        self.assertIn('Product 9<', html)
+        self.assertIn('500.00', html)
+        self.assertLess(html.index('Product 4<'), html.index('Product 9<'))
+
+        response = self.client.get(reverse('goods-polls:catalog_url'))
+        self.assertEqual(response.context['maxi'], 900)
+
+    def walk_cursor(self, params):
+        """Проходит каталог в курсорном режиме и возвращает наименования товаров и количество запросов страниц"""
+        names, after, requests_count = [], '', 0
+        while after is not None:
+            response = self.client.get(reverse('goods-polls:ajax_full'), {**params, 'after': after})
+            data = response.json()
+            self.assertNotIn('pages_list', data)
+            names.extend(re.findall(r'>(Product \d+)<', data['html']))
+            after = data['next_after']
+            requests_count += 1
+        return names, requests_count
+
+    def test_catalog_cursor_pagination(self):
+        """Тест курсорной пагинации: все товары проходятся без пропусков и повторов"""
+        names, requests_count = self.walk_cursor({'sort_type': 'price_dec'})
+        self.assertEqual(names, [f'Product {index}' for index in range(9, -1, -1)])
+        self.assertEqual(requests_count, 2)
+
+        # одинаковые значения ключа сортировки упорядочиваются по id
+        SellerProduct.objects.update(price=100)
+        names, _ = self.walk_cursor({'sort_type': 'price_inc'})
+        self.assertEqual(names, [f'Product {index}' for index in range(10)])
+
+        names, _ = self.walk_cursor({'sort_type': 'name_dec', 'price': '50;550'})
+        self.assertEqual(names, [f'Product {index}' for index in range(9, -1, -1)])
+
+        names, _ = self.walk_cursor({'sort_type': 'newness_dec'})
+        self.assertEqual(sorted(names), sorted(f'Product {index}' for index in range(10)))
+
+    def test_catalog_invalid_cursor(self):
+        """Тест некорректного токена курсора: возвращается первая страница"""
+        response = self.client.get(reverse('goods-polls:ajax_full'), {'sort_type': 'price_inc', 'after': 'broken!'})
+        data = response.json()
+        self.assertIn('Product 0<', data['html'])
+        self.assertIsNotNone(data['next_after'])
+
+    def test_catalog_result_cache(self):
+        """Тест кэша результатов каталога: изменения без сигналов не видны до смены версии каталога"""
+        params = {'sort_type': 'price_dec'}
+        html = self.client.get(reverse('goods-polls:ajax_full'), params).json()['html']
+        self.assertLess(html.index('Product 9<'), html.index('Product 8<'))
+
+        SellerProduct.objects.filter(product__slug='product-0').update(price=5000)
+        html = self.client.get(reverse('goods-polls:ajax_full'), params).json()['html']
+        self.assertNotIn('Product 0<', html)
+
+        SellerProduct.objects.get(product__slug='product-0').save()
+        html = self.client.get(reverse('goods-polls:ajax_full'), params).json()['html']
+        self.assertLess(html.index('Product 0<'), html.index('Product 9<'))
+
+        response = self.client.get(reverse('goods-polls:catalog_url'))
+        self.assertEqual(response.context['maxi'], 5000)
+
+    def test_catalog_result_cached_prefix(self):
+        """Тест кэширования только первых товаров результата: следующие страницы загружаются из БД"""
+        with mock.patch('goods_app.services.catalog_cache.CATALOG_CACHED_ITEMS', 5):
+            response = self.client.get(reverse('goods-polls:catalog_url'))
+            self.assertEqual(response.context['page_obj'].paginator.count, 10)
+            self.assertEqual((response.context['mini'], response.context['maxi']), (100, 1000))
+            self.assertEqual([item.price for item in response.context['page_obj']],
+                             [(index + 1) * 100 for index in range(8)])
+            response = self.client.get(reverse('goods-polls:catalog_url'), {'page': 2})
+            self.assertEqual([item.price for item in response.context['page_obj']], [900, 1000])
+
+            goods = CatalogByCategoriesMixin.annotate_catalog_fields(SellerProduct.objects.order_by('price', 'id'))
+            result = get_cached_catalog(goods, ('prefix',))
+            self.assertEqual((len(result.ids), result.count()), (5, 10))
+
+    def test_catalog_facets(self):
+        """Тест блока продавцов и популярных тэгов каталога"""
+        for index, product in enumerate(Product.objects.order_by('id')):
+            product.tags.add('common')
+            if index % 2:
+                product.tags.add('odd')
+        Product.objects.get(slug='product-0').tags.add('rare')
+
+        response = self.client.get(reverse('goods-polls:catalog_url'))
+        self.assertEqual(list(response.context['sellers']), [self.seller])
+        tags = response.context['tags']
+        self.assertEqual([tag.name for tag in tags], ['common', 'odd', 'rare'])
+        self.assertEqual([tag.count for tag in tags], [10, 5, 1])
+
+        response = self.client.get(reverse('goods-polls:catalog_url'), {'main_tag': 'odd'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 5)
+        self.assertEqual([tag.name for tag in response.context['tags']], ['common'])
+
+    def test_catalog_by_tag_without_duplicates(self):
+        """Тест отсутствия повторов товара с несколькими подходящими тэгами в каталоге по тэгу"""
+        first, second = Product.objects.order_by('id')[:2]
+        first.tags.add('phone', 'smartphone')
+        second.tags.add('phone')
+
+        goods, _, _ = CatalogByCategoriesMixin.get_full_data(tag='phone', with_facets=False)
+        self.assertEqual(sorted(goods.values_list('product_id', flat=True)), [first.pk, second.pk])
+
+        response = self.client.get(reverse('goods-polls:catalog_url'), {'main_tag': 'phone'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+        self.assertEqual(len({item.pk for item in response.context['page_obj']}), 2)
+
+
+class CategoryTreeTest(TestCase):
+    """ Тесты индекса дерева категорий """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(email='test@user.com', password='testp@sw0rd', first_name='user',
+                                        last_name='test', phone='+7(922)222-22-22')
+        seller = Seller.objects.create(name='Test Store', slug='test-store', owner=user)
+        cls.root = ProductCategory.objects.create(name='Electronics', slug='electronics')
+        cls.child = ProductCategory.objects.create(name='Computers', slug='computers', parent=cls.root)
+        cls.grandchild = ProductCategory.objects.create(name='Laptops', slug='laptops', parent=cls.child)
+        cls.other = ProductCategory.objects.create(name='Books', slug='books')
+        for category in (cls.root, cls.child, cls.grandchild, cls.other):
+            product = Product.objects.create(category=category, name=f'{category.name} item',
+                                             slug=f'{category.slug}-item')
+            SellerProduct.objects.create(seller=seller, product=product, price=100, quantity=10)
+
+    def setUp(self):
+        cache.clear()
+
+    def catalog(self, slug):
+        response = self.client.get(reverse('goods-polls:catalog_url'), {'slug': slug})
+        return sorted(item.product.slug for item in response.context['page_obj'])
+
+    def test_category_descendants(self):
+        """Тест выборки товаров категории со всеми уровнями подкатегорий"""
+        self.assertEqual(self.catalog('electronics'), ['computers-item', 'electronics-item', 'laptops-item'])
+        self.assertEqual(self.catalog('computers'), ['computers-item', 'laptops-item'])
+        self.assertEqual(self.catalog('laptops'), ['laptops-item'])
+        self.assertEqual(self.catalog('unknown'), [])
+
+        get_category_node('books')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_category_node('books').descendants_ids, {self.other.id})
+
+    def test_category_tree_refresh(self):
+        """Тест обновления индекса при изменении дерева категорий"""
+        self.assertEqual(get_category_node('books').descendants_ids, {self.other.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grandchild.parent = self.other
+            self.grandchild.save()
+            # до фиксации транзакции индекс других процессов не перестраивается
+            self.assertEqual(get_category_node('books').descendants_ids, {self.other.id})
+        self.assertEqual(get_category_node('books').descendants_ids, {self.other.id, self.grandchild.id})
+        self.assertEqual(get_category_node('electronics').descendants_ids, {self.root.id, self.child.id})
+        self.assertEqual(get_category_ancestors()[self.grandchild.id], (self.grandchild.id, self.other.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.child.delete()
+        self.assertIsNone(get_category_node('computers'))
+
+
+class CountersTest(TestCase):
+    """ Тесты счетчиков комментариев и продаж """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='test@user.com', password='testp@sw0rd', first_name='user',
+                                            last_name='test', phone='+7(922)222-22-22')
+        seller = Seller.objects.create(name='Test Store', slug='test-store', owner=cls.user)
+        category = ProductCategory.objects.create(name='Test category', slug='test-category')
+        cls.products = [Product.objects.create(category=category, name=f'Product {index}', slug=f'product-{index}')
+                        for index in range(2)]
+        cls.seller_products = [SellerProduct.objects.create(seller=seller, product=product, price=100, quantity=10)
+                               for product in cls.products]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comments_counters(self):
+        """Тест счетчика комментариев и среднего рейтинга товара"""
+        product = self.products[0]
+        comment = ProductComment.objects.create(product=product, user=self.user, author='user', rating=5)
+        ProductComment.objects.create(product=product, user=self.user, author='user', rating=2)
+        product.refresh_from_db()
+        self.assertEqual((product.comments_count, product.ratings_sum, product.rating), (2, 7, 4))
+
+        comment.rating = 4
+        comment.save()
+        comment.delete()
+        product.refresh_from_db()
+        self.assertEqual((product.comments_count, product.ratings_sum, product.rating), (1, 2, 2))
+
+    def test_rating_rounding_and_caches(self):
+        """Тест округления рейтинга половин до четного и сброса кэша карточек и каталога при изменении рейтинга"""
+        product = self.products[0]
+        cache.set(get_card_version_key(self.seller_products[0].pk), 'version')
+        catalog_version = get_catalog_version()
+        ProductComment.objects.create(product=product, user=self.user, author='user', rating=2)
+        ProductComment.objects.create(product=product, user=self.user, author='user', rating=3)
+        product.refresh_from_db()
+        self.assertEqual(product.rating, 2)
+        self.assertIsNone(cache.get(get_card_version_key(self.seller_products[0].pk)))
+        self.assertNotEqual(get_catalog_version(), catalog_version)
+
+        Product.objects.filter(pk=product.pk).update(rating=0, ratings_sum=0)
+        reconcile_counters()
+        product.refresh_from_db()
+        self.assertEqual((product.ratings_sum, product.rating), (5, 2))
+
+    def test_sales_counters(self):
+        """Тест счетчиков продаж: учитываются только оплаченные заказы"""
+        order = Order.objects.create(customer=self.user)
+        line = OrderProduct.objects.create(order=order, seller_product=self.seller_products[0], quantity=3)
+        self.seller_products[0].refresh_from_db()
+        self.assertEqual(self.seller_products[0].sold_quantity, 0)
+
+        order.paid = True
+        order.save()
+        self.seller_products[0].refresh_from_db()
+        self.assertEqual((self.seller_products[0].sold_quantity, self.seller_products[0].paid_orders_count), (3, 1))
+
+        line.quantity = 5
+        line.save()
+        OrderProduct.objects.create(order=order, seller_product=self.seller_products[1], quantity=1)
+        self.seller_products[0].refresh_from_db()
+        self.assertEqual(self.seller_products[0].sold_quantity, 5)
+
+        order.delete()
+        self.assertEqual(list(SellerProduct.objects.order_by('id').values_list('sold_quantity', 'paid_orders_count')),
+                         [(0, 0), (0, 0)])
+
+    def test_counters_not_negative(self):
+        """Тест отмены оплаты и удаления комментария, не учтенных в счетчиках"""
+        order = Order.objects.create(customer=self.user, paid=True)
+        OrderProduct.objects.create(order=order, seller_product=self.seller_products[0], quantity=2)
+        comment = ProductComment.objects.create(product=self.products[0], user=self.user, author='user', rating=3)
+        SellerProduct.objects.update(sold_quantity=0, paid_orders_count=0)
+        Product.objects.update(comments_count=0, ratings_sum=0, rating=0)
+
+        order.paid = False
+        order.save()
+        comment.delete()
+        self.assertEqual(list(SellerProduct.objects.order_by('id').values_list('sold_quantity', 'paid_orders_count')),
+                         [(0, 0), (0, 0)])
+        self.assertEqual(list(Product.objects.order_by('id').values_list('comments_count', 'ratings_sum')),
+                         [(0, 0), (0, 0)])
+
+    def test_reconcile_counters(self):
+        """Тест исправления рассинхронизации счетчиков"""
+        order = Order.objects.create(customer=self.user, paid=True)
+        OrderProduct.objects.create(order=order, seller_product=self.seller_products[1], quantity=2)
+        ProductComment.objects.create(product=self.products[0], user=self.user, author='user', rating=3)
+        self.assertEqual(reconcile_counters(), (0, 0))
+
+        Product.objects.update(comments_count=0, ratings_sum=0, rating=0)
+        SellerProduct.objects.update(sold_quantity=7, paid_orders_count=7)
+        self.assertEqual(reconcile_counters(), (1, 2))
+        self.assertEqual(list(Product.objects.order_by('id').values_list('comments_count', 'rating')),
+                         [(1, 3), (0, 0)])
+        self.assertEqual(list(SellerProduct.objects.order_by('id').values_list('sold_quantity', 'paid_orders_count')),
+                         [(0, 0), (2, 1)])
+
+    def test_catalog_sort_by_counters(self):
+        """Тест сортировки каталога по популярности и количеству комментариев"""
+        SellerProduct.objects.filter(pk=self.seller_products[1].pk).update(paid_orders_count=1)
+        Product.objects.filter(pk=self.products[1].pk).update(comments_count=1)
+        for sort_type in ('pop_dec', 'comment_dec'):
+            response = self.client.get(reverse('goods-polls:ajax_full'), {'sort_type': sort_type})
+            html = response.json()['html']
+            self.assertLess(html.index('Product 1<'), html.index('Product 0<'))
+
+
+class CardCacheTest(TestCase):
+    """ Тесты кэша карточек товаров """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(email='test@user.com', password='testp@sw0rd', first_name='user',
+                                        last_name='test', phone='+7(922)222-22-22')
+        cls.seller = Seller.objects.create(name='Test Store', slug='test-store', owner=user)
+        cls.category = ProductCategory.objects.create(name='Test category', slug='test-category')
+        cls.product = Product.objects.create(category=cls.category, name='Product', slug='product')
+        cls.seller_product = SellerProduct.objects.create(seller=cls.seller, product=cls.product, price=100,
+                                                          quantity=10)
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self):
+        return render_catalog_cards(SellerProduct.objects.select_related('product__category', 'seller'))[0]
+
+    def get_discounted(self):
+        return CatalogByCategoriesMixin.add_sale_prices_in_goods_if_needed(
+            SellerProduct.objects.select_related('product__category', 'seller'))[0]
+
+    def test_cached_card(self):
+        """Тест повторного использования карточки: изменения без сигналов не видны в карточке"""
+        self.assertIn('>Product<', self.render())
+        Product.objects.filter(pk=self.product.pk).update(name='Renamed')
+        self.assertIn('>Product<', self.render())
+
+        card = render_offer_cards([(SellerProduct.objects.get(pk=self.seller_product.pk), None, None)])[0]
+        seller_product = SellerProduct.objects.get(pk=self.seller_product.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(render_offer_cards([(seller_product, None, None)]), [card])
+
+    def test_card_invalidation(self):
+        """Тест сброса карточки при сохранении товара, товара продавца, категории и скидки"""
+        self.render()
+        self.product.name = 'Renamed'
+        self.product.save()
+        self.assertIn('>Renamed<', self.render())
+
+        self.category.name = 'Phones'
+        self.category.save()
+        self.assertIn('Phones', self.render())
+
+        SellerProduct.objects.filter(pk=self.seller_product.pk).update(price=200)
+        self.assertIn('200', self.render())
+
+        discount = ProductDiscount.objects.create(seller=self.seller, name='Sale', percent=10, is_active=True)
+        discount.seller_products.add(self.seller_product)
+        self.assertIn('-10%', render_catalog_cards([self.get_discounted()])[0])
+        discount.percent = 20
+        discount.save()
+        self.assertIn('-20%', render_catalog_cards([self.get_discounted()])[0])
+
+
+class SearchTest(TestCase):
+    """ Тесты поискового индекса каталога """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(email='test@user.com', password='testp@sw0rd', first_name='user',
+                                        last_name='test', phone='+7(922)222-22-22')
+        cls.seller = Seller.objects.create(name='Mega Store', slug='mega-store', owner=user)
+        cls.phones = ProductCategory.objects.create(name='Phones', slug='phones')
+        cls.laptops = ProductCategory.objects.create(name='Laptops', slug='laptops')
+
+        cls.galaxy = Product.objects.create(category=cls.phones, name='Samsung Galaxy S21', slug='galaxy')
+        cls.galaxy.tags.add('android', 'samsung')
+        cls.book = Product.objects.create(category=cls.laptops, name='Samsung Galaxy Book', slug='galaxy-book')
+        cls.aspire = Product.objects.create(category=cls.laptops, name='Acer Aspire', slug='aspire')
+        cls.aspire.tags.add('laptop')
+
+        for product in (cls.galaxy, cls.book, cls.aspire):
+            SellerProduct.objects.create(seller=cls.seller, product=product, price=100, quantity=10)
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        return [item.product.slug for item in search_seller_products(query).order_by('-search_rank', 'id')]
+
+    def test_search_by_fields(self):
+        """Тест поиска по наименованию, категории, тэгу и продавцу"""
+        self.assertEqual(self.search('galaxy'), ['galaxy', 'galaxy-book'])
+        self.assertEqual(set(self.search('laptop')), {'galaxy-book', 'aspire'})
+        self.assertEqual(self.search('android'), ['galaxy'])
+        self.assertEqual(set(self.search('mega')), {'galaxy', 'galaxy-book', 'aspire'})
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_search_ranking_and_duplicates(self):
+        """Тест ранжирования: совпадения в наименованиях и тэгах весят больше категории, дубликатов нет"""
+        self.assertEqual(self.search('laptop'), ['aspire', 'galaxy-book'])
+        self.assertEqual(self.search('samsung phones'), ['galaxy'])
+        self.assertEqual(self.search('samsung galaxy book'), ['galaxy-book'])
+
+    def test_index_updates_by_signals(self):
+        """Тест инкрементального обновления индекса"""
+        self.aspire.name = 'Acer Swift'
+        self.aspire.save()
+        self.assertEqual(self.search('swift'), ['aspire'])
+        self.assertEqual(self.search('aspire'), [])
+
+        self.aspire.tags.add('ultrabook')
+        self.assertEqual(self.search('ultrabook'), ['aspire'])
+
+        self.seller.name = 'Giga Store'
+        self.seller.save()
+        self.assertEqual(len(self.search('giga')), 3)
+
+        self.laptops.name = 'Notebooks'
+        self.laptops.save()
+        self.assertEqual(set(self.search('notebooks')), {'galaxy-book', 'aspire'})
+
+    def test_rebuild_index(self):
+        """Тест полной перестройки индекса"""
+        SearchToken.objects.all().delete()
+        self.assertEqual(rebuild_search_index(), 3)
+        self.assertEqual(self.search('acer'), ['aspire'])
+
+    def test_catalog_search(self):
+        """Тест поиска в каталоге"""
+        response = self.client.get(reverse('goods-polls:catalog_url'), {'query': 'laptop'})
+        self.assertEqual(response.context['sort_type'], 'rank_dec')
+        self.assertEqual([item.product.slug for item in response.context['page_obj']], ['aspire', 'galaxy-book'])
+
+    def suggest(self, query):
+        response = self.client.get(reverse('goods-polls:autocomplete'), {'q': query})
+        return [(item['kind'], item['label']) for item in response.json()['suggestions']]
+
+    def test_autocomplete(self):
+        """Тест подсказок строки поиска по началу слов"""
+        self.assertEqual(self.suggest('gal'), [('product', 'Samsung Galaxy Book'), ('product', 'Samsung Galaxy S21')])
+        self.assertEqual(self.suggest('sams bo'), [('product', 'Samsung Galaxy Book')])
+        self.assertEqual(self.suggest('lap'), [('category', 'Laptops'), ('tag', 'laptop')])
+        self.assertEqual(self.suggest('meg'), [('store', 'Mega Store')])
+        self.assertEqual(self.suggest('xyz'), [])
+        self.assertEqual(self.suggest(''), [])
+
+        with self.assertNumQueries(0):
+            autocomplete('acer')
+
+    def test_autocomplete_updates_by_signals(self):
+        """Тест инкрементального обновления подсказок"""
+        autocomplete('acer')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.aspire.name = 'Acer Swift'
+            self.aspire.save()
+            self.laptops.name = 'Notebooks'
+            self.laptops.save()
+            self.galaxy.delete()
+            # до фиксации транзакции изменения не публикуются
+            self.assertEqual(autocomplete('swi'), [])
+        # изменения применяются к индексу из журнала изменений в кэше, без перезагрузки индекса
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete('swi')[0]['label'], 'Acer Swift')
+            self.assertEqual(autocomplete('laptops'), [])
+            self.assertEqual(autocomplete('note')[0]['label'], 'Notebooks')
+            self.assertEqual([item['label'] for item in autocomplete('galaxy')], ['Samsung Galaxy Book'])
 
-# Create your tests here.
+    def test_autocomplete_lost_changes(self):
+        """Тест перезагрузки индекса, если изменений уже нет в кэше"""
+        autocomplete('acer')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.aspire.name = 'Acer Swift'
+            self.aspire.save()
+        version, sequence = get_changes_log_state()
+        cache.delete(get_change_key(version, sequence))
+        self.assertEqual(autocomplete('swi')[0]['label'], 'Acer Swift')
@@ -1,6 +1,6 @@
 from django.urls import path
 from goods_app.views import IndexView, ProductDetailView, get_reviews, post_review, \
-    FullCatalogView, AllCardForAjax
+    FullCatalogView, AllCardForAjax, get_suggestions
 
 app_name = 'goods'
 urlpatterns = [
@@ -12,4 +12,6 @@ urlpatterns = [
     path('catalogs/', FullCatalogView.as_view(), name="catalog_url"),
 
     path('async_catalog/', AllCardForAjax.as_view(), name="ajax_full"),
+
+    path('autocomplete/', get_suggestions, name="autocomplete"),
 ]
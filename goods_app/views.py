@@ -8,6 +8,7 @@ from django.utils.translation import gettext_lazy as _
 from django.views import View
 from django.views.generic import DetailView, ListView
 
+from goods_app.services.autocomplete import autocomplete
 from goods_app.services.catalog import CatalogByCategoriesMixin
 from settings_app.dynamic_preferences_registry import global_preferences_registry
 from banners_app.services import banner
@@ -144,19 +145,18 @@ class FullCatalogView(CatalogByCategoriesMixin, View):
         search, tag, sort_type, page, slug = self.get_request_params_for_full_catalog(request)
 
         # получаем товары в соответсвии с параметрами гет-запроса
-        row_items_for_catalog, sellers, tags = self.get_full_data(tag, search, slug)
-        row_items_for_catalog = self.add_sale_prices_in_goods_if_needed(row_items_for_catalog)
+        goods, sellers, tags = self.get_full_data(tag, search, slug)
 
-        # сортируем товары
-        items_for_catalog, *_ = self.simple_sort(row_items_for_catalog, sort_type)
+        # сортируем товары и получаем закэшированный результат
+        goods, *_ = self.simple_sort(goods, sort_type)
+        goods = self.get_cached_goods(goods, search, tag, slug, None, sort_type)
 
         # пагинатор
-        paginator = Paginator(items_for_catalog, 8)
-        page_obj = paginator.get_page(page)
+        paginator = Paginator(goods, 8)
+        page_obj = self.get_catalog_page(paginator, page)
 
         # кастомные параметры для рэнж-инпута в фильтре каталога
-        maxi = self.get_max_price(items_for_catalog)
-        mini = self.get_min_price(items_for_catalog)
+        mini, maxi = self.get_price_bounds(goods)
         midi = round((maxi + mini) / 2, 2)
 
         # настройка кнопок пагинации
@@ -200,9 +200,10 @@ class AllCardForAjax(CatalogByCategoriesMixin, View):
             sort_type - тип сортировки
             page - страница пагинации
             slug - слаг категории товаров
+            after - токен курсора; при его наличии (в т.ч. пустом) включается курсорный режим пагинации
         :param request: искомый запрос клиента
 
-        :return: json с ключами:
+        :return: json с ключами (в курсорном режиме - html, next_after, current_state, next_state, sort_type):
                 html - текст разметки необходимых карточек товаров с учетов входных условий
                 current_state - вид и направление текущей использованной сортировки
                 next_state - тип и направление сортировки для повторного запроса
@@ -213,28 +214,41 @@ class AllCardForAjax(CatalogByCategoriesMixin, View):
 
         search, tag, sort_type, page, slug = self.get_request_params_for_full_catalog(request)
 
+        filter_data = None
         if not self.check_if_filter_params(request):
-            # получаем товары без фильтра и актуальные стоимости
-            row_items_for_catalog, sellers, tags = self.get_full_data(tag, search, slug)
-            row_items_for_catalog = self.add_sale_prices_in_goods_if_needed(row_items_for_catalog)
+            # получаем товары без фильтра
+            goods, sellers, tags = self.get_full_data(tag, search, slug, with_facets=False)
 
         else:
-            # получаем товары с фильтром и актуальные стоимости
+            # получаем товары с фильтром
             filter_data = self.get_data_from_form(request)
-            row_items_for_catalog, sellers, tags = self.get_full_data_with_filters(
+            goods, sellers, tags = self.get_full_data_with_filters(
                 search_query=search,
                 search_tag=tag,
                 slug=slug,
-                filter_data=filter_data
+                filter_data=filter_data,
+                with_facets=False
             )
 
-        items_for_catalog, next_state = self.simple_sort(row_items_for_catalog, sort_type)
+        goods, next_state = self.simple_sort(goods, sort_type)
 
-        # пагинатор
-        paginator = Paginator(items_for_catalog, 8)
+        if 'after' in request.GET:
+            # курсорная пагинация без подсчета общего количества товаров
+            items, next_after = self.get_cursor_page(goods, sort_type, request.GET.get('after'))
+            return JsonResponse({
+                'html': render_to_string('elems/good_card.html', context={'page_obj': items, 'cursor_mode': True}),
+                'next_after': next_after,
+                'current_state': sort_type,
+                'next_state': next_state,
+                'sort_type': sort_type,
+            })
+
+        # пагинатор по закэшированному результату
+        goods = self.get_cached_goods(goods, search, tag, slug, filter_data, sort_type)
+        paginator = Paginator(goods, 8)
 
         pages_list = self.custom_pagination_list(paginator, page)
-        page_obj = paginator.get_page(page)
+        page_obj = self.get_catalog_page(paginator, page)
 
         # кнопки пагинации
         next_page = str(page_obj.next_page_number() if page_obj.has_next() else page_obj.paginator.num_pages)
@@ -257,3 +271,14 @@ class AllCardForAjax(CatalogByCategoriesMixin, View):
             'pages_list': pages_list,
             'sort_type': sort_type,
         })
+
+
+def get_suggestions(request: HttpRequest) -> JsonResponse:
+    """
+    Представление для получения подсказок строки поиска по началу слов наименований товаров, категорий,
+    тэгов и магазинов
+
+    ::Страница: Все страницы (строка поиска)
+    """
+    query = request.GET.get('q', '')
+    return JsonResponse({'query': query, 'suggestions': autocomplete(query)})
@@ -1,6 +1,7 @@
 from decimal import Decimal
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models import Count, DecimalField, F, Sum
 from stores_app.models import SellerProduct
 from profiles_app.models import User
 from django.utils.translation import gettext_lazy as _
@@ -54,21 +55,57 @@ class Order(models.Model):
 
     delivery_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name=_('Delivery cost'))
 
+    # итоги заказа, пересчитываются при изменении товаров заказа; None - итоги еще не рассчитаны
+    items_count = models.PositiveIntegerField(null=True, blank=True, editable=False,
+                                              verbose_name=_('items count'))
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, db_index=True,
+                                   editable=False, verbose_name=_('subtotal'))
+    discounted_subtotal = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, db_index=True,
+                                              editable=False, verbose_name=_('discounted subtotal'))
+
+    TOTALS_FIELDS = ('items_count', 'subtotal', 'discounted_subtotal')
+
+    def save(self, *args, **kwargs):
+        """
+        Сохранение заказа. Итоги обновляются только пересчетом, поэтому полное сохранение ранее загруженного
+        заказа их не перезаписывает
+        """
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.TOTALS_FIELDS]
+        super().save(*args, **kwargs)
+
+    def calculate_totals(self) -> dict:
+        """Расчет итогов заказа одним агрегирующим запросом по товарам заказа"""
+        totals = self.order_products.aggregate(
+            items_count=Count('pk'),
+            subtotal=Sum(F('seller_product__price') * F('quantity'),
+                         output_field=DecimalField(max_digits=10, decimal_places=2)),
+            discounted_subtotal=Sum(F('final_price') * F('quantity'),
+                                    output_field=DecimalField(max_digits=10, decimal_places=2)),
+        )
+        return {name: value if value is not None else Decimal(0) for name, value in totals.items()}
+
+    def get_totals(self) -> dict:
+        """Итоги заказа из сохраненных полей. Не рассчитанные итоги рассчитываются и сохраняются"""
+        if self.get_deferred_fields().intersection(self.TOTALS_FIELDS):
+            self.refresh_from_db(fields=self.TOTALS_FIELDS)
+        if any(getattr(self, name) is None for name in self.TOTALS_FIELDS):
+            totals = self.calculate_totals()
+            Order.objects.filter(pk=self.pk).update(**totals)
+            for name, value in totals.items():
+                setattr(self, name, value)
+        return {name: getattr(self, name) for name in self.TOTALS_FIELDS}
+
     @property
     def total_sum(self) -> Decimal:
         """Метод получения общей стоимости товаров в заказе"""
-        total = Decimal(0.00)
-        for product in self.order_products.all():
-            total += product.seller_product.price * product.quantity
-        return Decimal(total)
+        return self.get_totals()['subtotal']
 
     @property
     def total_discounted_sum(self) -> Decimal:
         """Метод получения общей стоимости товаров в заказе со скидками"""
-        total = Decimal(0.00)
-        for product in self.order_products.all():
-            total += product.final_price * product.quantity
-        return Decimal(total)
+        return self.get_totals()['discounted_subtotal']
 
     @property
     def final_total(self):
@@ -82,7 +119,7 @@ class Order(models.Model):
 
     def __len__(self) -> int:
         """Метод получения количества товаров в заказе"""
-        return len(self.order_products.all())
+        return self.get_totals()['items_count']
 
     class Meta:
         verbose_name = _('order')
@@ -130,3 +167,23 @@ class ViewedProduct(models.Model):
     class Meta:
         verbose_name = _('viewed product')
         verbose_name_plural = _('viewed products')
+
+
+class StockHold(models.Model):
+    """
+    Модель временного резерва товара продавца строкой корзины.
+    Действующие (не истекшие) резервы уменьшают доступный остаток товара, истекшие не учитываются
+    и удаляются периодической задачей
+    """
+    cart_id = models.CharField(max_length=64, verbose_name=_('cart id'))
+    seller_product = models.ForeignKey(SellerProduct, on_delete=models.CASCADE, related_name='stock_holds',
+                                       verbose_name=_('product in shop'))
+    quantity = models.PositiveIntegerField(verbose_name=_('quantity'))
+    expires_at = models.DateTimeField(db_index=True, verbose_name=_('expires at'))
+
+    class Meta:
+        verbose_name = _('stock hold')
+        verbose_name_plural = _('stock holds')
+        db_table = 'stock_holds'
+        unique_together = (('cart_id', 'seller_product'),)
+        indexes = [models.Index(fields=['seller_product', 'expires_at'], name='stock_hold_product_idx')]
@@ -1,78 +1,123 @@
+import time
+import uuid
 from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
 from django.conf import settings
+from django.core.cache import cache
 from stores_app.models import SellerProduct
-from orders_app.utils import check_stock
+from orders_app.services.stock import hold_stock, release_stock_holds
+
+
+def get_anonym_cart(request) -> 'AnonymCart':
+    """Корзина анонимного пользователя, общая для всех сервисов корзины одного запроса"""
+    if not hasattr(request, 'anonym_cart'):
+        request.anonym_cart = AnonymCart(request)
+    return request.anonym_cart
 
 
 class AnonymCart:
     """
     Класс корзины анонимного пользователя
+
+    Строки корзины (id товара продавца -> (количество, цена)) хранятся в кэше по идентификатору корзины из сессии,
+    поэтому изменение количеств и просмотр сайта с корзиной не пишут в БД. Снимок строк сохраняется в сессию
+    при каждом добавлении и удалении строки, а изменения количеств - не чаще раза в CART_PERSIST_INTERVAL секунд.
+    Если корзины нет в кэше (другой процесс с локальным кэшем, вытеснение), она восстанавливается из снимка
+    со всеми строками, на которые есть резервы; теряются только последние изменения количеств
     """
     def __init__(self, request):
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        self.cart_uuid = self.session.get(settings.CART_ID_SESSION_KEY)
+        self.cart: Dict[int, Tuple[int, str]] = self.load()
+        self.items: Optional[List[Dict]] = None
+
+    def get_cache_key(self) -> str:
+        """Ключ строк корзины в кэше"""
+        return 'anonym_cart:{}'.format(self.cart_uuid)
+
+    def load(self) -> Dict[int, Tuple[int, str]]:
+        """Загрузка строк корзины из кэша или из снимка в сессии"""
+        if not self.cart_uuid:
+            return {}
+        cart = cache.get(self.get_cache_key())
+        if cart is None:
+            snapshot = self.session.get(settings.CART_SESSION_ID) or {}
+            cart = {product_id: (quantity, price) for product_id, quantity, price in snapshot.get('lines', [])}
+            cache.set(self.get_cache_key(), cart, settings.SESSION_COOKIE_AGE)
+        return cart
 
     def add(self, product: SellerProduct, quantity: int = 1, update_quantity: bool = False):
         """Добавление товара в корзину или обновление его количества"""
-        product_id = str(product.id)
-        if product_id not in self.cart:
-            self.cart[product_id] = {'quantity': 0,
-                                     'price': str(product.price)}
-        if update_quantity:
-            delta = quantity - self.cart[product_id]['quantity']
-            if check_stock(product, delta):
-                self.cart[product_id]['quantity'] = quantity
-                self.save()
-                return True
-            return False
-        else:
-            delta = quantity
-            if check_stock(product, delta):
-                self.cart[product_id]['quantity'] += quantity
-                self.save()
-                return True
-            return False
-
-    def save(self):
-        """Отметка сессии как измененной"""
-        self.session.modified = True
+        new_line = product.id not in self.cart
+        current_quantity, price = self.cart.get(product.id, (0, str(product.price)))
+        if not update_quantity:
+            quantity += current_quantity
+        if hold_stock(product, self.get_cart_id(), quantity):
+            self.cart[product.id] = (quantity, price)
+            self.save(persist=new_line)
+            return True
+        return False
+
+    def get_cart_id(self) -> str:
+        """Идентификатор корзины для резервов товаров на складе, создается при первом обращении"""
+        if not self.cart_uuid:
+            self.cart_uuid = self.session[settings.CART_ID_SESSION_KEY] = uuid.uuid4().hex
+        return 'session:{}'.format(self.cart_uuid)
+
+    def save(self, persist: bool = False):
+        """
+        Сохранение строк корзины в кэш и в сессию, если изменился состав строк (persist) или снимок в сессии устарел
+        """
+        self.get_cart_id()
+        self.items = None
+        cache.set(self.get_cache_key(), self.cart, settings.SESSION_COOKIE_AGE)
+        snapshot = self.session.get(settings.CART_SESSION_ID) or {}
+        if persist or time.time() - snapshot.get('saved_at', 0) >= settings.CART_PERSIST_INTERVAL:
+            self.persist()
+
+    def persist(self):
+        """Сохранение снимка строк корзины в сессию"""
+        self.session[settings.CART_SESSION_ID] = {
+            'lines': [[product_id, quantity, price] for product_id, (quantity, price) in self.cart.items()],
+            'saved_at': time.time(),
+        }
 
     def remove(self, product: SellerProduct):
         """Удаление товара из корзины."""
-        product_id = str(product.id)
-        if product_id in self.cart:
-            product.quantity += self.cart[product_id]['quantity']
-            product.save()
-            del self.cart[product_id]
-            self.save()
+        if product.id in self.cart:
+            release_stock_holds(self.get_cart_id(), [product.pk])
+            del self.cart[product.id]
+            self.save(persist=True)
 
     def __iter__(self):
-        """Проходим по товарам корзины и получаем соответствующие объекты SellerProduct"""
-        product_ids = self.cart.keys()
-        products = SellerProduct.objects.filter(id__in=product_ids)
-        cart = self.cart.copy()
-        for product in products:
-            cart[str(product.id)]['seller_product'] = product
-        for item in cart.values():
-            item['price'] = float(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+        """Проходим по товарам корзины с объектами SellerProduct, загруженными один раз за запрос"""
+        if self.items is None:
+            products = SellerProduct.objects.select_related('seller', 'product').in_bulk(list(self.cart))
+            self.items = []
+            for product_id, (quantity, price) in self.cart.items():
+                if product_id in products:
+                    self.items.append({'seller_product': products[product_id],
+                                       'quantity': quantity,
+                                       'price': float(price),
+                                       'total_price': float(price) * quantity})
+        return iter(self.items)
 
     def __len__(self) -> int:
         """Получение количества товаров в корзине"""
-        return len(self.cart.values())
+        return len(self.cart)
 
     def total_sum(self):
         """Получение общей стоимости товаров в корзине"""
         return sum(
-            Decimal(item['price']) * item['quantity']
-            for item in self.cart.values()
+            Decimal(price) * quantity
+            for quantity, price in self.cart.values()
         )
 
     def clear(self):
         """Очистка корзины"""
-        del self.session[settings.CART_SESSION_ID]
-        self.save()
+        if self.cart_uuid:
+            release_stock_holds(self.get_cart_id())
+            cache.delete(self.get_cache_key())
+        self.cart = {}
+        self.items = None
+        self.session.pop(settings.CART_SESSION_ID, None)
@@ -1,10 +1,24 @@
 from decimal import Decimal
-from typing import Union
+from typing import List, NamedTuple, Tuple, Union
+from django.core.cache import cache
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from discounts_app.services import DiscountsService
 from orders_app.models import Order, OrderProduct
-from orders_app.services.anonim_cart import AnonymCart
+from orders_app.services.anonim_cart import AnonymCart, get_anonym_cart
+from orders_app.services.order_totals import update_order_totals, forget_order_totals
 from stores_app.models import SellerProduct
-from orders_app.utils import check_stock
+from orders_app.services.stock import hold_stock, hold_stock_bulk, release_stock_holds, get_order_cart_id
+
+
+class CartPricing(NamedTuple):
+    """
+    Цены строк корзины со скидками и итоги корзины
+    """
+    items: List[Tuple[Union[OrderProduct, dict], Decimal]]
+    quantity: int
+    total_sum: Decimal
+    total_discounted_sum: Decimal
 
 
 class CartService:
@@ -14,10 +28,12 @@ class CartService:
     add_to_cart: метод добавления товара в корзину
     remove_from_cart: убирает товар из корзины
     update_product: изменить количество товара в корзине и заменить продавца
+    get_cart_id: получение идентификатора корзины для резервов товаров на складе
     get_goods: получение товаров из корзины
     get_quantity: получение количества товаров в корзине
     get_total_sum: получение общей суммы товаров в корзине
     get_total_discounted_sum: получение общей суммы товаров в корзине со скидками
+    reprice: пересчет цен товаров корзины со скидками
     clear: очистка корзины
     """
     def __init__(self, request):
@@ -27,7 +43,7 @@ class CartService:
                                                        in_order=False)
 
         else:
-            self.cart = AnonymCart(request)
+            self.cart = get_anonym_cart(request)
 
     def remove_from_cart(self, product_id: int) -> None:
         """
@@ -37,9 +53,8 @@ class CartService:
         """
         product = get_object_or_404(SellerProduct, id=product_id)
         if isinstance(self.cart, Order):
-            cart_product = get_object_or_404(OrderProduct, order=self.cart, seller_product=product)
-            product.quantity += cart_product.quantity
-            product.save()
+            cart_product = get_object_or_404(self.cart.order_products, seller_product=product)
+            release_stock_holds(self.get_cart_id(), [product.pk])
             cart_product.delete()
             self.cart.save()
         else:
@@ -52,32 +67,22 @@ class CartService:
         quantity: новое количество
         """
         if isinstance(self.cart, Order):
-            cart_product = OrderProduct.objects.filter(order=self.cart, seller_product=product).first()
+            cart_product = self.cart.order_products.filter(seller_product=product).first()
             if not cart_product:
                 cart_product = OrderProduct(order=self.cart,
                                             seller_product=product,
                                             quantity=0,
                                             final_price=price)
 
-            if update_quantity:
-                delta = quantity - cart_product.quantity
-                if check_stock(product, delta):
-                    cart_product.quantity = quantity
-                    cart_product.save()
-                    self.cart.save()
-                    return True
+            if not update_quantity:
+                quantity += cart_product.quantity
+            if hold_stock(product, self.get_cart_id(), quantity):
+                cart_product.quantity = quantity
+                cart_product.save()
+                self.cart.save()
+                return True
 
-                return False
-
-            else:
-                delta = quantity
-                if check_stock(product, delta):
-                    cart_product.quantity += quantity
-                    cart_product.save()
-                    self.cart.save()
-                    return True
-
-                return False
+            return False
         else:
             return self.cart.add(product, quantity, update_quantity=update_quantity)
 
@@ -90,10 +95,16 @@ class CartService:
         if self.add_to_cart(product, quantity):
             self.remove_from_cart(product_id)
 
+    def get_cart_id(self) -> str:
+        """получить идентификатор корзины для резервов товаров на складе"""
+        if isinstance(self.cart, Order):
+            return get_order_cart_id(self.cart)
+        return self.cart.get_cart_id()
+
     def get_goods(self) -> Union[OrderProduct, AnonymCart]:
         """получить товары из корзины"""
         if isinstance(self.cart, Order):
-            return self.cart.order_products.prefetch_related('seller_product__product_discounts').all()
+            return self.cart.order_products.select_related('seller_product__seller', 'seller_product__product').all()
         return self.cart
 
     def get_quantity(self) -> int:
@@ -106,14 +117,71 @@ class CartService:
             return self.cart.total_sum
         return self.cart.total_sum()
 
+    def reprice(self) -> CartPricing:
+        """
+        пересчитать цены товаров корзины со скидками. В БД одним bulk_update записываются
+        только строки корзины, у которых изменилась цена со скидкой
+        """
+        discount_service = DiscountsService(self)
+        items, changed = [], []
+        total_discounted_sum = Decimal(0)
+        for item in discount_service.goods:
+            discounted_price = discount_service.get_discounted_price(item)
+            if isinstance(item, OrderProduct):
+                if item.final_price != discounted_price:
+                    item.final_price = discounted_price
+                    changed.append(item)
+                quantity = item.quantity
+            else:
+                item['final_price'] = discounted_price
+                quantity = item['quantity']
+            items.append((item, discounted_price))
+            total_discounted_sum += discounted_price * quantity
+
+        if changed:
+            OrderProduct.objects.bulk_update(changed, ['final_price'])
+            update_order_totals([self.cart.pk])
+            forget_order_totals(self.cart)
+        return CartPricing(items, len(items), discount_service.total_sum, total_discounted_sum)
+
     def merge_carts(self, other):
-        """Перенос анонимной корзины в корзину зарегистрированного"""
-        for item in other.get_goods():
-            self.add_to_cart(item['seller_product'], item['quantity'],)
+        """
+        Перенос анонимной корзины в корзину зарегистрированного. Строки корзины и товары продавцов загружаются
+        один раз, количества складываются в памяти, товары резервируются и строки записываются пакетно
+        в одной транзакции вместе с резервами анонимной корзины. Строки, для которых не хватает товара,
+        не переносятся. Анонимная корзина очищается только после успешного переноса
+        """
+        added = {item['seller_product'].pk: item['quantity'] for item in other.get_goods()}
+        if not added:
+            other.clear()
+            return
+
+        with transaction.atomic():
+            lines = {line.seller_product_id: line
+                     for line in self.cart.order_products.filter(seller_product_id__in=list(added))}
+            quantities = {seller_product_id: quantity + (lines[seller_product_id].quantity
+                                                         if seller_product_id in lines else 0)
+                          for seller_product_id, quantity in added.items()}
+            held = sorted(hold_stock_bulk(self.get_cart_id(), quantities, merged_cart_id=other.get_cart_id()))
+
+            changed = [lines[seller_product_id] for seller_product_id in held if seller_product_id in lines]
+            for line in changed:
+                line.quantity = quantities[line.seller_product_id]
+            OrderProduct.objects.bulk_update(changed, ['quantity'])
+            OrderProduct.objects.bulk_create(OrderProduct(order_id=self.cart.pk, seller_product_id=seller_product_id,
+                                                          quantity=quantities[seller_product_id])
+                                             for seller_product_id in held if seller_product_id not in lines)
+            update_order_totals([self.cart.pk])
+        forget_order_totals(self.cart)
+        cache.delete(get_cart_summary_cache_key(self.cart.customer_id))
         other.clear()
 
     def clear(self) -> None:
         """очистить корзину"""
+        if isinstance(self.cart, Order):
+            release_stock_holds(self.get_cart_id())
+            self.cart.order_products.all().delete()
+            return self.cart.save()
         return self.cart.clear()
 
     def save(self) -> None:
@@ -123,3 +191,39 @@ class CartService:
     def __len__(self):
         """получить общее количество товаров в корзине"""
         return len(self.cart)
+
+
+class CartSummary(NamedTuple):
+    """
+    Количество позиций и сумма корзины для шапки сайта
+    """
+    quantity: int
+    total_sum: Decimal
+
+
+def get_cart_summary_cache_key(user_id: int) -> str:
+    """получить ключ кэша количества позиций и суммы корзины пользователя"""
+    return 'cart_summary:{}'.format(user_id)
+
+
+def get_cart_summary(request) -> CartSummary:
+    """
+    получить количество позиций и сумму корзины без создания корзины. Для зарегистрированного пользователя
+    читаются сохраненные итоги корзины, которые пересчитываются при изменении ее товаров и цен товаров в магазинах;
+    значение кэшируется и сбрасывается теми же сигналами. Анонимная корзина уже хранится в кэше
+    """
+    if not request.user.is_authenticated:
+        cart = get_anonym_cart(request)
+        return CartSummary(len(cart), cart.total_sum())
+
+    cache_key = get_cart_summary_cache_key(request.user.pk)
+    summary = cache.get(cache_key)
+    if summary is None:
+        cart = Order.objects.filter(customer=request.user, in_order=False).only(*Order.TOTALS_FIELDS).first()
+        if cart is None:
+            summary = CartSummary(0, Decimal(0))
+        else:
+            totals = cart.get_totals()
+            summary = CartSummary(totals['items_count'], totals['subtotal'])
+        cache.set(cache_key, summary, 24 * 60 * 60)
+    return summary
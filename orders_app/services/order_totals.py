@@ -0,0 +1,36 @@
+from typing import Iterable
+
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from orders_app.models import Order, OrderProduct
+
+
+def get_lines_total(expression, output_field) -> Coalesce:
+    """
+    Подзапрос агрегата по товарам заказа для UPDATE заказов
+    """
+    lines = OrderProduct.objects.filter(order=OuterRef('pk')).order_by().values('order') \
+                                .annotate(total=expression).values('total')
+    return Coalesce(Subquery(lines, output_field=output_field), Value(0), output_field=output_field)
+
+
+def update_order_totals(orders_ids: Iterable[int]) -> int:
+    """
+    Пересчитать итоги заказов (количество товаров, сумма без скидок и со скидками) одним запросом UPDATE
+    с подзапросами, поэтому параллельные изменения товаров заказа не теряются. Возвращает число заказов
+    """
+    money = DecimalField(max_digits=10, decimal_places=2)
+    return Order.objects.filter(pk__in=list(orders_ids)).update(
+        items_count=get_lines_total(Count('pk'), IntegerField()),
+        subtotal=get_lines_total(Sum(F('seller_product__price') * F('quantity'), output_field=money), money),
+        discounted_subtotal=get_lines_total(Sum(F('final_price') * F('quantity'), output_field=money), money),
+    )
+
+
+def forget_order_totals(order: Order) -> None:
+    """
+    Сбросить загруженные итоги заказа в памяти: при следующем обращении они будут прочитаны из БД
+    """
+    for name in Order.TOTALS_FIELDS:
+        order.__dict__.pop(name, None)
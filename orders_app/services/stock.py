@@ -0,0 +1,250 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, IntegerField, Min, OuterRef, QuerySet, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from goods_app.services.catalog_cache import reset_catalog_stock_cache
+from orders_app.models import StockHold
+from stores_app.models import SellerProduct
+
+STOCK_HOLDS_BATCH_SIZE = 1000
+
+
+class OutOfStock(Exception):
+    """
+    Недостаточно товара продавца на складе
+    """
+
+
+def group_lines(lines: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+    """
+    Сложить количества строк (id товара продавца, количество) по товарам продавцов
+    """
+    quantities: Dict[int, int] = {}
+    for seller_product_id, quantity in lines:
+        quantities[seller_product_id] = quantities.get(seller_product_id, 0) + quantity
+    return quantities
+
+
+def change_stock(seller_product_id: int, delta: int) -> bool:
+    """
+    Изменить остаток товара продавца на delta одним условным запросом
+    UPDATE ... SET quantity = quantity + delta WHERE quantity + delta >= 0.
+    Возвращает False, если остатка не хватает для списания
+    """
+    if delta == 0:
+        return True
+    seller_products = SellerProduct.objects.filter(pk=seller_product_id)
+    if delta < 0:
+        seller_products = seller_products.filter(quantity__gte=-delta)
+    return seller_products.update(quantity=F('quantity') + delta) == 1
+
+
+def release_stock_bulk(lines: Iterable[Tuple[int, int]]) -> None:
+    """
+    Вернуть на склад товары строк (id товара продавца, количество)
+    """
+    quantities = group_lines(lines)
+    with transaction.atomic():
+        for seller_product_id in sorted(quantities):
+            change_stock(seller_product_id, quantities[seller_product_id])
+        if quantities:
+            reset_in_stock_catalog(get_current_available_stock(quantities), quantities, {})
+
+
+def get_order_cart_id(order) -> str:
+    """
+    Получить идентификатор корзины зарегистрированного пользователя для резервов
+    """
+    return 'order:{}'.format(order.pk)
+
+
+def get_hold_expiry() -> datetime:
+    """
+    Получить время окончания резерва, созданного или продленного сейчас
+    """
+    return timezone.now() + timedelta(seconds=settings.STOCK_HOLD_TIME)
+
+
+def annotate_available_stock(queryset: QuerySet) -> QuerySet:
+    """
+    Добавить к выборке товаров продавцов доступный остаток available_quantity: остаток на складе
+    за вычетом действующих резервов корзин
+    """
+    holds = StockHold.objects.filter(seller_product=OuterRef('pk'), expires_at__gt=timezone.now()) \
+                             .order_by().values('seller_product').annotate(total=Sum('quantity')).values('total')
+    return queryset.annotate(
+        available_quantity=F('quantity') - Coalesce(Subquery(holds, output_field=IntegerField()), 0)
+    )
+
+
+def get_available_stock(seller_products_ids: Iterable[int], exclude_carts_ids: Iterable[str] = ()) -> Dict[int, int]:
+    """
+    Получить доступные остатки товаров продавцов за вычетом действующих резервов корзин, кроме exclude_carts_ids.
+    Строки товаров блокируются до конца транзакции, поэтому функция вызывается внутри transaction.atomic
+    """
+    stock = dict(SellerProduct.objects.select_for_update().filter(pk__in=list(seller_products_ids))
+                                      .order_by('pk').values_list('pk', 'quantity'))
+    holds = StockHold.objects.filter(seller_product_id__in=stock, expires_at__gt=timezone.now())
+    exclude_carts_ids = list(exclude_carts_ids)
+    if exclude_carts_ids:
+        holds = holds.exclude(cart_id__in=exclude_carts_ids)
+    for seller_product_id, held in holds.order_by().values('seller_product_id') \
+                                        .annotate(total=Sum('quantity')).values_list('seller_product_id', 'total'):
+        stock[seller_product_id] -= held
+    return stock
+
+
+def get_current_available_stock(seller_products_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Получить доступные остатки товаров продавцов без блокировки строк
+    """
+    return dict(annotate_available_stock(SellerProduct.objects.filter(pk__in=list(seller_products_ids)))
+                .values_list('pk', 'available_quantity'))
+
+
+def get_cart_holds(cart_id: str, seller_products_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Получить действующие резервы корзины на товары продавцов
+    """
+    return dict(StockHold.objects.filter(cart_id=cart_id, seller_product_id__in=list(seller_products_ids),
+                                         expires_at__gt=timezone.now())
+                                 .values_list('seller_product_id', 'quantity'))
+
+
+def reset_in_stock_catalog(available: Dict[int, int], before: Dict[int, int], after: Dict[int, int]) -> None:
+    """
+    Сбросить кэш каталога с фильтром "в наличии", если товар появился в наличии или закончился.
+    available - доступные остатки без учета изменяемых количеств, before и after - изменяемые количества
+    (резервы или списания) до и после изменения
+    """
+    if any((quantity - before.get(seller_product_id, 0) > 0) != (quantity - after.get(seller_product_id, 0) > 0)
+           for seller_product_id, quantity in available.items()):
+        reset_catalog_stock_cache()
+
+
+def get_next_stock_return() -> Optional[datetime]:
+    """
+    Получить ближайшее время окончания резерва на товар, который есть на складе, но полностью зарезервирован:
+    после окончания такого резерва товар снова появляется в наличии
+    """
+    reserved = annotate_available_stock(SellerProduct.objects.filter(quantity__gt=0)) \
+        .filter(available_quantity__lte=0).values('pk')
+    return StockHold.objects.filter(seller_product__in=reserved, expires_at__gt=timezone.now()) \
+                            .aggregate(next_return=Min('expires_at'))['next_return']
+
+
+def extend_cart_holds(cart_id: str, expires_at: datetime) -> None:
+    """
+    Продлить действующие резервы корзины до expires_at. Истекшие резервы не продлеваются: их товар могла уже
+    зарезервировать другая корзина, такие резервы удаляет release_expired_stock_holds
+    """
+    StockHold.objects.filter(cart_id=cart_id, expires_at__gt=timezone.now()).update(expires_at=expires_at)
+
+
+def hold_stock(product: SellerProduct, cart_id: str, quantity: int) -> bool:
+    """
+    Установить резерв строки корзины на товар продавца равным quantity и продлить действующие резервы корзины.
+    Возвращает False, если доступного остатка не хватает. Нулевое количество снимает резерв строки
+    """
+    with transaction.atomic():
+        available = get_available_stock([product.pk], exclude_carts_ids=[cart_id])
+        if quantity > available.get(product.pk, 0):
+            return False
+        held = get_cart_holds(cart_id, [product.pk])
+        expires_at = get_hold_expiry()
+        if quantity > 0:
+            StockHold.objects.update_or_create(cart_id=cart_id, seller_product_id=product.pk,
+                                               defaults={'quantity': quantity, 'expires_at': expires_at})
+        else:
+            StockHold.objects.filter(cart_id=cart_id, seller_product_id=product.pk).delete()
+        extend_cart_holds(cart_id, expires_at)
+        reset_in_stock_catalog(available, held, {product.pk: quantity})
+    return True
+
+
+def hold_stock_bulk(cart_id: str, quantities: Dict[int, int], merged_cart_id: Optional[str] = None) -> Set[int]:
+    """
+    Установить резервы корзины на несколько товаров продавцов (id товара продавца -> количество) и продлить
+    действующие резервы корзины постоянным числом запросов. Каждый товар резервируется независимо: возвращаются id
+    товаров, для которых доступного остатка хватило. Резервы переносимой корзины merged_cart_id на эти товары
+    не уменьшают доступный остаток и снимаются в той же транзакции
+    """
+    carts_ids = [cart_id] if merged_cart_id is None else [cart_id, merged_cart_id]
+    with transaction.atomic():
+        available = get_available_stock(quantities, exclude_carts_ids=carts_ids)
+        held = {seller_product_id for seller_product_id, quantity in quantities.items()
+                if 0 < quantity <= available.get(seller_product_id, 0)}
+        own: Dict[int, int] = {}
+        previous: Dict[int, int] = {}
+        for hold_cart_id, seller_product_id, quantity in StockHold.objects.filter(
+                cart_id__in=carts_ids, seller_product_id__in=list(quantities), expires_at__gt=timezone.now()) \
+                .values_list('cart_id', 'seller_product_id', 'quantity'):
+            previous[seller_product_id] = previous.get(seller_product_id, 0) + quantity
+            if hold_cart_id == cart_id:
+                own[seller_product_id] = quantity
+        expires_at = get_hold_expiry()
+        StockHold.objects.filter(cart_id=cart_id, seller_product_id__in=held).delete()
+        if merged_cart_id is not None:
+            StockHold.objects.filter(cart_id=merged_cart_id, seller_product_id__in=list(quantities)).delete()
+        StockHold.objects.bulk_create(StockHold(cart_id=cart_id, seller_product_id=seller_product_id,
+                                                quantity=quantities[seller_product_id], expires_at=expires_at)
+                                      for seller_product_id in held)
+        extend_cart_holds(cart_id, expires_at)
+        reset_in_stock_catalog(available, previous,
+                               {seller_product_id: quantities[seller_product_id] if seller_product_id in held
+                                else own.get(seller_product_id, 0) for seller_product_id in quantities})
+    return held
+
+
+def release_stock_holds(cart_id: str, seller_products_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Снять резервы корзины (все или на указанные товары продавцов)
+    """
+    holds = StockHold.objects.filter(cart_id=cart_id)
+    if seller_products_ids is not None:
+        holds = holds.filter(seller_product_id__in=list(seller_products_ids))
+    released = dict(holds.filter(expires_at__gt=timezone.now()).values_list('seller_product_id', 'quantity'))
+    holds.delete()
+    if released:
+        reset_in_stock_catalog(get_current_available_stock(released), released, {})
+
+
+def commit_stock_holds(cart_id: str, lines: Iterable[Tuple[int, int]]) -> bool:
+    """
+    Списать со склада товары строк (id товара продавца, количество) оформленной корзины и снять ее резервы.
+    Строка с истекшим резервом списывается, только если товар не зарезервирован другими корзинами
+    """
+    quantities = group_lines(lines)
+    try:
+        with transaction.atomic():
+            available = get_available_stock(quantities, exclude_carts_ids=[cart_id])
+            for seller_product_id in sorted(quantities):
+                quantity = quantities[seller_product_id]
+                if quantity > available.get(seller_product_id, 0) or not change_stock(seller_product_id, -quantity):
+                    raise OutOfStock(seller_product_id)
+            held = get_cart_holds(cart_id, quantities)
+            StockHold.objects.filter(cart_id=cart_id).delete()
+            reset_in_stock_catalog(available, held, quantities)
+    except OutOfStock:
+        return False
+    return True
+
+
+def release_expired_stock_holds(batch_size: int = STOCK_HOLDS_BATCH_SIZE) -> int:
+    """
+    Удалить истекшие резервы пачками по batch_size. Возвращает количество удаленных резервов.
+    Истекшие резервы уже не учитываются в доступных остатках, поэтому кэш каталога не сбрасывается
+    """
+    released = 0
+    while True:
+        holds_ids = list(StockHold.objects.filter(expires_at__lte=timezone.now())
+                                          .values_list('pk', flat=True)[:batch_size])
+        if not holds_ids:
+            break
+        released += StockHold.objects.filter(pk__in=holds_ids).delete()[0]
+    return released
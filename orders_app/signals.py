@@ -1,8 +1,12 @@
 from django.core.cache import cache
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 
+from goods_app.services.catalog_cache import reset_catalog_cache
+from goods_app.services.counters import update_seller_products_sales
 from orders_app.models import Order, ViewedProduct, OrderProduct
+from orders_app.services.order_totals import update_order_totals, forget_order_totals
+from stores_app.models import SellerProduct
 
 
 @receiver(post_save, sender=Order)
@@ -13,6 +17,7 @@ def order_reset_cache_save_handler(sender, **kwargs) -> None:
     user_id = kwargs['instance'].customer_id
     cache.delete('user_orders:{}'.format(user_id))
     cache.delete('user_last_order:{}'.format(user_id))
+    cache.delete('cart_summary:{}'.format(user_id))
 
 
 @receiver(pre_delete, sender=Order)
@@ -23,6 +28,7 @@ def order_reset_cache_del_handler(sender, **kwargs) -> None:
     user_id = kwargs['instance'].customer_id
     cache.delete('user_orders:{}'.format(user_id))
     cache.delete('user_last_order:{}'.format(user_id))
+    cache.delete('cart_summary:{}'.format(user_id))
 
 
 @receiver(post_save, sender=ViewedProduct)
@@ -51,3 +57,96 @@ def products_reset_cache_save_order_handler(sender, **kwargs) -> None:
     instance = kwargs['instance']
     if instance.order.paid:
         cache.delete('products:all')
+
+
+@receiver(pre_save, sender=Order)
+def order_sales_pre_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for remembering the previous payment state of order
+    """
+    instance = kwargs['instance']
+    instance.was_paid = not kwargs.get('raw') and bool(instance.pk) and \
+        Order.objects.filter(pk=instance.pk, paid=True).exists()
+
+
+@receiver(post_save, sender=Order)
+def order_sales_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating sales counters of products in shops, when the order was paid or the payment was cancelled
+    """
+    instance = kwargs['instance']
+    if kwargs.get('raw') or instance.paid == getattr(instance, 'was_paid', False):
+        return
+    lines = instance.order_products.values_list('seller_product_id', 'quantity')
+    update_seller_products_sales(lines, 1 if instance.paid else -1)
+    reset_catalog_cache()
+
+
+@receiver(pre_save, sender=OrderProduct)
+def order_product_sales_pre_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for remembering the previous state of the paid order line
+    """
+    instance = kwargs['instance']
+    instance.previous_paid_line = None
+    if not kwargs.get('raw') and instance.pk:
+        instance.previous_paid_line = OrderProduct.objects.filter(pk=instance.pk, order__paid=True) \
+                                                          .values_list('seller_product_id', 'quantity').first()
+
+
+@receiver(post_save, sender=OrderProduct)
+def order_product_sales_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating sales counters of product in shop, when the paid order line was changed
+    """
+    instance = kwargs['instance']
+    if kwargs.get('raw'):
+        return
+    previous_line = getattr(instance, 'previous_paid_line', None)
+    if previous_line:
+        update_seller_products_sales([previous_line], -1)
+    if instance.order.paid:
+        update_seller_products_sales([(instance.seller_product_id, instance.quantity)])
+
+
+@receiver(pre_delete, sender=OrderProduct)
+def order_product_sales_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating sales counters of product in shop, when the paid order line was deleted
+    """
+    instance = kwargs['instance']
+    if instance.order.paid:
+        update_seller_products_sales([(instance.seller_product_id, instance.quantity)], -1)
+
+
+@receiver(post_save, sender=OrderProduct)
+@receiver(post_delete, sender=OrderProduct)
+def order_product_totals_handler(sender, **kwargs) -> None:
+    """
+    Signal for recalculating totals of the order, when its line was changed
+    """
+    instance = kwargs['instance']
+    if kwargs.get('raw'):
+        return
+    update_order_totals([instance.order_id])
+    forget_order_totals(instance.order)
+    user_id = instance.order.customer_id
+    if instance.order.in_order:
+        cache.delete_many(['user_orders:{}'.format(user_id), 'user_last_order:{}'.format(user_id)])
+    else:
+        cache.delete('cart_summary:{}'.format(user_id))
+
+
+@receiver(post_save, sender=SellerProduct)
+def seller_product_carts_totals_handler(sender, **kwargs) -> None:
+    """
+    Signal for recalculating totals of carts with the product in shop, when its price was changed
+    """
+    update_fields = kwargs.get('update_fields')
+    if kwargs.get('raw') or kwargs.get('created') or (update_fields and 'price' not in update_fields):
+        return
+    carts = dict(Order.objects.filter(in_order=False, order_products__seller_product=kwargs['instance'])
+                              .values_list('pk', 'customer_id').distinct())
+    if carts:
+        update_order_totals(carts)
+        cache.delete_many(['cart_summary:{}'.format(customer_id) for customer_id in set(carts.values())])
@@ -15,6 +15,10 @@ def set_periodic(sender, **kwrags) -> None:
         crontab(minute="*/10"),
         clear_unpaid_orders.s()
     )
+    sender.add_periodic_task(
+        crontab(minute="*/5"),
+        release_expired_stock_holds_task.s()
+    )
 
 
 @app.task
@@ -22,16 +26,22 @@ def clear_unpaid_orders() -> None:
     """
     Функция очистки просроченных неоплаченных товаров
     """
-    from orders_app.models import Order
+    from orders_app.models import Order, OrderProduct
+    from orders_app.services.stock import release_stock_bulk
 
     time = datetime.datetime.now() - datetime.timedelta(minutes=5)
-    orders_to_clear = Order.objects.prefetch_related('order_products', 'order_products__seller_product').\
-        filter(ordered__lte=time, in_order=True, paid=False)
+    orders_ids = list(Order.objects.filter(ordered__lte=time, in_order=True, paid=False).values_list('pk', flat=True))
+
+    release_stock_bulk(OrderProduct.objects.filter(order_id__in=orders_ids)
+                                           .values_list('seller_product_id', 'quantity'))
+    Order.objects.filter(pk__in=orders_ids).delete()
+
 
-    for order in orders_to_clear:
-        order_products = order.order_products.all()
-        for o_p in order_products:
-            o_p.seller_product.quantity += o_p.quantity
-            o_p.seller_product.save()
+@app.task
+def release_expired_stock_holds_task() -> None:
+    """
+    Функция удаления истекших резервов товаров корзин
+    """
+    from orders_app.services.stock import release_expired_stock_holds
 
-    orders_to_clear.delete()
+    release_expired_stock_holds()
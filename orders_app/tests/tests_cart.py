@@ -1,5 +1,14 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.cache import SessionStore
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.shortcuts import reverse
+from orders_app.models import StockHold
+from orders_app.services.cart import CartService
 from goods_app.models import Product, SpecificationsNames, Specifications, ProductCategory
 from stores_app.models import SellerProduct, Seller
 from discounts_app.models import ProductDiscount, GroupDiscount, CartDiscount
@@ -433,3 +442,110 @@ class CartTest(TestCase):
     #     self.assertContains(response, 'name5')
     #
     #     self.assertContains(response, '1500')
+
+    def test_anonym_cart_browsing_without_writes(self):
+        """Тест отсутствия записей сессии при изменении количеств анонимной корзины и записей в БД при просмотре"""
+        self.client.get(reverse('orders:cart_add', kwargs={'product_id': 1}), HTTP_REFERER='/orders/cart/')
+        self.client.get(reverse('orders:cart_add', kwargs={'product_id': 4}), HTTP_REFERER='/orders/cart/')
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('orders:cart_add', kwargs={'product_id': 4}), HTTP_REFERER='/orders/cart/')
+            self.client.get(reverse('orders:cart_add', kwargs={'product_id': 4}), HTTP_REFERER='/orders/cart/')
+        self.assertFalse([query for query in context.captured_queries
+                          if 'django_session' in query['sql'] and not query['sql'].startswith('SELECT')])
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('orders-polls:cart_detail'))
+            response = self.client.get(reverse('orders-polls:cart_detail'))
+        self.assertContains(response, 'name4')
+        self.assertFalse([query for query in context.captured_queries
+                          if query['sql'].split()[0].upper() in ('INSERT', 'UPDATE', 'DELETE')])
+
+    def test_anonym_cart_restored_from_session(self):
+        """Тест восстановления анонимной корзины со всеми строками из снимка в сессии при потере кэша"""
+        self.client.get(reverse('orders:cart_add', kwargs={'product_id': 1}), HTTP_REFERER='/orders/cart/')
+        self.client.get(reverse('orders:cart_add', kwargs={'product_id': 4}), HTTP_REFERER='/orders/cart/')
+        cache.clear()
+        response = self.client.get(reverse('orders-polls:cart_detail'))
+        self.assertContains(response, 'name1')
+        self.assertContains(response, 'name4')
+
+    def test_cart_page_writes_only_changed_prices(self):
+        """Тест записи цен со скидкой строк корзины одним запросом и только при их изменении"""
+        self.client._login(self.customer, backend='django.contrib.auth.backends.ModelBackend')
+        for product_id in (1, 2, 4):
+            self.client.get(reverse('orders:cart_add', kwargs={'product_id': product_id}),
+                            HTTP_REFERER='/orders/cart/')
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('orders-polls:cart_detail'))
+        self.assertEqual(len([query for query in context.captured_queries
+                              if query['sql'].startswith('UPDATE "orders_app_orderproduct"')]), 1)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('orders-polls:cart_detail'))
+        self.assertFalse([query for query in context.captured_queries if query['sql'].startswith('UPDATE')])
+        self.assertEqual(response.context['total_price'], 700)
+        self.assertEqual(response.context['total_discounted_price'], sum(
+            price * item.quantity for item, price in response.context['items']))
+
+
+class MergeCartsTest(TestCase):
+    """ Тесты переноса анонимной корзины в корзину пользователя """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='test@user.com', password='testp@sw0rd', first_name='user',
+                                            last_name='test', phone='+7(922)222-22-22')
+        seller = Seller.objects.create(name='Test Store', slug='test-store', owner=cls.user)
+        category = ProductCategory.objects.create(name='Test category', slug='test-category')
+        cls.seller_products = []
+        for index in range(20):
+            product = Product.objects.create(category=category, name=f'Product {index}', slug=f'product-{index}')
+            cls.seller_products.append(SellerProduct.objects.create(seller=seller, product=product,
+                                                                    price=100, quantity=5))
+
+    def get_cart(self, user) -> CartService:
+        request = RequestFactory().get('/')
+        request.user = user
+        request.session = SessionStore()
+        return CartService(request)
+
+    def test_merge_carts(self):
+        """Тест пакетного переноса строк постоянным числом запросов с учетом остатков"""
+        cart = self.get_cart(self.user)
+        cart.add_to_cart(self.seller_products[0], 2)
+        cart.add_to_cart(self.seller_products[1], 4)
+        anonym_cart = self.get_cart(AnonymousUser())
+        for seller_product in self.seller_products:
+            anonym_cart.add_to_cart(seller_product, 3 if seller_product == self.seller_products[0] else 1)
+
+        with CaptureQueriesContext(connection) as context:
+            cart.merge_carts(anonym_cart)
+        self.assertLessEqual(len(context.captured_queries), 18)
+
+        quantities = dict(cart.cart.order_products.values_list('seller_product_id', 'quantity'))
+        self.assertEqual(len(quantities), 20)
+        self.assertEqual(quantities[self.seller_products[0].pk], 5)
+        self.assertEqual(quantities[self.seller_products[1].pk], 5)
+        self.assertEqual(quantities[self.seller_products[2].pk], 1)
+        self.assertEqual((len(cart.cart), cart.get_total_sum()), (20, 2800))
+        self.assertEqual(len(anonym_cart), 0)
+        self.assertFalse(StockHold.objects.filter(cart_id=anonym_cart.get_cart_id()).exists())
+
+    def test_merge_carts_failure(self):
+        """Тест сохранения анонимной корзины и ее резервов при ошибке переноса"""
+        cart = self.get_cart(self.user)
+        cart.add_to_cart(self.seller_products[0], 2)
+        anonym_cart = self.get_cart(AnonymousUser())
+        anonym_cart.add_to_cart(self.seller_products[0], 3)
+        anonym_cart.add_to_cart(self.seller_products[1], 1)
+
+        with mock.patch('orders_app.services.cart.update_order_totals', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                cart.merge_carts(anonym_cart)
+
+        self.assertEqual(dict(cart.cart.order_products.values_list('seller_product_id', 'quantity')),
+                         {self.seller_products[0].pk: 2})
+        self.assertEqual(len(anonym_cart), 2)
+        self.assertEqual(dict(StockHold.objects.filter(cart_id=anonym_cart.get_cart_id())
+                              .values_list('seller_product_id', 'quantity')),
+                         {self.seller_products[0].pk: 3, self.seller_products[1].pk: 1})
@@ -0,0 +1,64 @@
+from django.test import TestCase
+
+from goods_app.models import Product, ProductCategory
+from orders_app.models import Order, OrderProduct
+from profiles_app.models import User
+from stores_app.models import SellerProduct, Seller
+
+
+class OrderTotalsTest(TestCase):
+    """ Тесты сохраненных итогов заказа """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='test@user.com', password='testp@sw0rd', first_name='user',
+                                            last_name='test', phone='+7(922)222-22-22')
+        seller = Seller.objects.create(name='Test Store', slug='test-store', owner=cls.user)
+        category = ProductCategory.objects.create(name='Test category', slug='test-category')
+        cls.seller_products = []
+        for index in range(2):
+            product = Product.objects.create(category=category, name=f'Product {index}', slug=f'product-{index}')
+            cls.seller_products.append(SellerProduct.objects.create(seller=seller, product=product,
+                                                                    price=100 * (index + 1), quantity=10))
+
+    def setUp(self):
+        self.order = Order.objects.create(customer=self.user)
+        self.first = OrderProduct.objects.create(order=self.order, seller_product=self.seller_products[0],
+                                                 quantity=2, final_price=90)
+        OrderProduct.objects.create(order=self.order, seller_product=self.seller_products[1], quantity=1,
+                                    final_price=150)
+
+    def get_totals(self) -> tuple:
+        order = Order.objects.get(pk=self.order.pk)
+        with self.assertNumQueries(0):
+            return len(order), order.total_sum, order.total_discounted_sum, order.final_total
+
+    def test_totals_without_lines(self):
+        """Тест чтения итогов заказа без загрузки товаров заказа и их пересчета при изменении товаров"""
+        self.assertEqual(self.get_totals(), (2, 400, 330, 330))
+
+        self.first.quantity = 3
+        self.first.save()
+        self.assertEqual(self.get_totals(), (2, 500, 420, 420))
+
+        self.first.delete()
+        self.assertEqual(self.get_totals(), (1, 200, 150, 150))
+
+    def test_stale_order_save(self):
+        """Тест сохранения ранее загруженного заказа без перезаписи итогов"""
+        order = Order.objects.get(pk=self.order.pk)
+        self.first.delete()
+        order.city = 'Moscow'
+        order.save()
+        self.assertEqual(self.get_totals(), (1, 200, 150, 150))
+
+    def test_fallback_and_price_change(self):
+        """Тест расчета не рассчитанных итогов и пересчета итогов корзины при изменении цены товара"""
+        Order.objects.filter(pk=self.order.pk).update(items_count=None, subtotal=None, discounted_subtotal=None)
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual(order.total_sum, 400)
+        self.assertEqual(self.get_totals(), (2, 400, 330, 330))
+
+        self.seller_products[1].price = 300
+        self.seller_products[1].save()
+        self.assertEqual(self.get_totals(), (2, 500, 330, 330))
@@ -0,0 +1,155 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection, OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from goods_app.models import Product, ProductCategory
+from orders_app.models import StockHold
+from goods_app.services.catalog_cache import get_catalog_version
+from orders_app.services.stock import (hold_stock, hold_stock_bulk, annotate_available_stock, change_stock,
+                                       commit_stock_holds, release_expired_stock_holds, release_stock_holds,
+                                       get_next_stock_return)
+from profiles_app.models import User
+from stores_app.models import SellerProduct, Seller
+
+
+def create_seller_products(count: int, quantity: int) -> list:
+    user = User.objects.create_user(email='test@user.com', password='testp@sw0rd', first_name='user',
+                                    last_name='test', phone='+7(922)222-22-22')
+    seller = Seller.objects.create(name='Test Store', slug='test-store', owner=user)
+    category = ProductCategory.objects.create(name='Test category', slug='test-category')
+    seller_products = []
+    for index in range(count):
+        product = Product.objects.create(category=category, name=f'Product {index}', slug=f'product-{index}')
+        seller_products.append(SellerProduct.objects.create(seller=seller, product=product, price=1000,
+                                                            quantity=quantity))
+    return seller_products
+
+
+class StockHoldTest(TestCase):
+    """ Тесты временных резервов товаров корзинами """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first, cls.second = create_seller_products(2, quantity=5)
+
+    def get_available(self) -> list:
+        return list(annotate_available_stock(SellerProduct.objects.order_by('pk'))
+                    .values_list('available_quantity', flat=True))
+
+    def test_holds_reduce_available_stock(self):
+        """Тест уменьшения доступного остатка действующими резервами без списания со склада"""
+        self.assertTrue(hold_stock(self.first, 'session:first', 3))
+        self.assertTrue(hold_stock(self.first, 'session:first', 4))
+        self.assertFalse(hold_stock(self.first, 'session:second', 2))
+        self.assertTrue(hold_stock(self.first, 'session:second', 1))
+        self.assertEqual(self.get_available(), [0, 5])
+        self.assertEqual(SellerProduct.objects.get(pk=self.first.pk).quantity, 5)
+
+        self.assertTrue(hold_stock(self.first, 'session:first', 0))
+        self.assertEqual(self.get_available(), [4, 5])
+
+    def test_expired_holds(self):
+        """Тест неучета истекших резервов и их удаления пачками"""
+        hold_stock(self.first, 'session:abandoned', 5)
+        hold_stock(self.second, 'session:abandoned', 5)
+        hold_stock(self.second, 'session:active', 0)
+        later = timezone.now() + timedelta(days=1)
+        with mock.patch('orders_app.services.stock.timezone.now', return_value=later):
+            self.assertEqual(self.get_available(), [5, 5])
+            self.assertTrue(hold_stock(self.first, 'session:active', 5))
+            self.assertEqual(release_expired_stock_holds(batch_size=1), 2)
+        self.assertEqual(list(StockHold.objects.values_list('cart_id', flat=True)), ['session:active'])
+
+    def test_expired_holds_not_extended(self):
+        """Тест того, что продление резервов корзины не возобновляет ее истекший резерв, занятый другой корзиной"""
+        self.assertTrue(hold_stock(self.first, 'session:first', 5))
+        later = timezone.now() + timedelta(days=1)
+        with mock.patch('orders_app.services.stock.timezone.now', return_value=later):
+            self.assertTrue(hold_stock(self.first, 'session:second', 5))
+            self.assertTrue(hold_stock(self.second, 'session:first', 1))
+            self.assertEqual(self.get_available(), [0, 4])
+            self.assertTrue(hold_stock_bulk('session:first', {self.second.pk: 2}))
+            self.assertEqual(self.get_available(), [0, 3])
+
+    def test_commit_holds(self):
+        """Тест списания со склада зарезервированных товаров при оформлении заказа"""
+        hold_stock(self.first, 'order:1', 3)
+        hold_stock(self.first, 'session:other', 2)
+        self.assertFalse(commit_stock_holds('order:1', [(self.first.pk, 4)]))
+        self.assertTrue(commit_stock_holds('order:1', [(self.first.pk, 3)]))
+        self.assertEqual(SellerProduct.objects.get(pk=self.first.pk).quantity, 2)
+        self.assertEqual(self.get_available(), [0, 5])
+        self.assertFalse(StockHold.objects.filter(cart_id='order:1').exists())
+
+    def test_conditional_stock_changes(self):
+        """Тест списания остатка условным запросом: остаток не уходит ниже нуля, заказ списывается целиком или никак"""
+        self.assertTrue(change_stock(self.first.pk, -3))
+        self.assertFalse(change_stock(self.first.pk, -3))
+        self.assertEqual(SellerProduct.objects.get(pk=self.first.pk).quantity, 2)
+
+        self.assertFalse(commit_stock_holds('order:1', [(self.first.pk, 2), (self.second.pk, 6)]))
+        self.assertEqual(list(SellerProduct.objects.order_by('pk').values_list('quantity', flat=True)), [2, 5])
+        self.assertTrue(commit_stock_holds('order:1', [(self.first.pk, 2), (self.second.pk, 5)]))
+        self.assertEqual(list(SellerProduct.objects.order_by('pk').values_list('quantity', flat=True)), [0, 0])
+
+    def test_in_stock_catalog_reset(self):
+        """Тест сброса кэша каталога с фильтром наличия, только когда товар закончился или снова появился"""
+        catalog_version, version = get_catalog_version(), get_catalog_version(in_stock=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            hold_stock(self.first, 'session:first', 3)
+        self.assertEqual(get_catalog_version(in_stock=True), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            hold_stock(self.first, 'session:second', 2)
+        self.assertNotEqual(get_catalog_version(in_stock=True), version)
+        self.assertEqual(get_next_stock_return(), StockHold.objects.get(cart_id='session:first').expires_at)
+
+        version = get_catalog_version(in_stock=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            release_stock_holds('session:second')
+        self.assertNotEqual(get_catalog_version(in_stock=True), version)
+        self.assertIsNone(get_next_stock_return())
+        self.assertEqual(get_catalog_version(), catalog_version)
+
+
+class ConcurrentStockTest(TransactionTestCase):
+    """ Тесты параллельного резервирования одного товара """
+
+    def test_no_overbooking(self):
+        """Тест отсутствия резервов сверх остатка при параллельных резервированиях корзинами из многих потоков"""
+        seller_product = create_seller_products(1, quantity=10)[0]
+        results = []
+        barrier = threading.Barrier(20)
+
+        def hold(index):
+            barrier.wait()
+            try:
+                # SQLite с общим кэшем в памяти не ждет блокировки таблицы, а отклоняет запрос: резервирование
+                # повторяется, пока не будет выполнено, поэтому результат не зависит от СУБД
+                while True:
+                    try:
+                        results.append(hold_stock(SellerProduct.objects.get(pk=seller_product.pk),
+                                                  f'session:{index}', 1))
+                        break
+                    except OperationalError:
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=hold, args=(index,)) for index in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        available = annotate_available_stock(SellerProduct.objects.filter(pk=seller_product.pk)) \
+            .values_list('available_quantity', flat=True).get()
+        self.assertEqual(len(results), 20)
+        self.assertEqual(results.count(True), 10)
+        self.assertEqual(available, 0)
+        self.assertEqual(StockHold.objects.count(), 10)
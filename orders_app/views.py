@@ -17,16 +17,16 @@ from django.http.response import Http404
 from orders_app.models import (
     Order,
     ViewedProduct,
-    OrderProduct
 )
 
 from orders_app.services.cart import CartService
+from orders_app.services.stock import commit_stock_holds, get_order_cart_id
 from orders_app.forms import OrderStepOneForm, OrderStepTwoForm, OrderStepThreeForm
 from orders_app.utils import DecimalEncoder
 from profiles_app.forms import RegisterForm
 from profiles_app.services import reset_phone_format, get_auth_user
 from stores_app.models import SellerProduct
-from discounts_app.services import DiscountsService, get_discounted_prices_for_seller_products
+from discounts_app.services import get_discounted_prices_for_seller_products
 from settings_app.dynamic_preferences_registry import global_preferences_registry
 from payments_app.services import process_payment
 from stores_app.services import StoreServiceMixin
@@ -71,35 +71,12 @@ class CartView(View):
 
     @classmethod
     def get(cls, request: HttpRequest):
-        cart = CartService(request)
-        discount_service = DiscountsService(cart)
-
-        discounted_prices = []
-        quantities = []
-
-        items = cart.get_goods()
-        for item in items:
-            discounted_price = discount_service.get_discounted_price(item)
-
-            if isinstance(item, OrderProduct):
-                item.final_price = discounted_price
-                item.save()
-                quantities.append(item.quantity)
-            else:
-                item['final_price'] = discounted_price
-                quantities.append(item['quantity'])
-
-            discounted_prices.append(discounted_price)
+        pricing = CartService(request).reprice()
 
-        products = zip(items, discounted_prices)
-        total = cart.get_quantity
-        total_price = cart.get_total_sum
-        total_discounted_price = sum([quantities[i] * discounted_prices[i] for i in range(len(items))])
-
-        context = {'items': products,
-                   'total': total,
-                   'total_price': total_price,
-                   'total_discounted_price': total_discounted_price
+        context = {'items': pricing.items,
+                   'total': pricing.quantity,
+                   'total_price': pricing.total_sum,
+                   'total_discounted_price': pricing.total_discounted_sum
                    }
 
         return render(request, 'orders_app/cart.html', context=context)
@@ -232,13 +209,7 @@ class OrderStepOneAnonym(View):
             login(request, get_auth_user(data=form.cleaned_data))
             new_cart = CartService(self.request)
             new_cart.merge_carts(old_cart)
-
-            discount_service = DiscountsService(new_cart)
-            items = new_cart.get_goods()
-            for item in items:
-                discounted_price = discount_service.get_discounted_price(item)
-                item.final_price = discounted_price
-                item.save()
+            new_cart.reprice()
 
             order = Order.objects.get(customer=request.user, in_order=False)
             fio = request.POST.get('name')
@@ -328,6 +299,11 @@ class OrderStepThree(View):
         form = self.form_class(request.POST)
         order = Order.objects.get(customer=request.user, in_order=False)
         if form.is_valid():
+            lines = order.order_products.values_list('seller_product_id', 'quantity')
+            if not commit_stock_holds(get_order_cart_id(order), lines):
+                messages.add_message(request, settings.ERROR_ADD_TO_CART,
+                                     _('The quantity in stock for some products is not enough.'))
+                return redirect('orders:cart_detail')
             payment_method = form.cleaned_data['payment_method']
             order.payment_method = payment_method
             order.in_order = True
@@ -6,3 +6,7 @@ class SettningsAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'settings_app'
     verbose_name = _('Site settings')
+
+    def ready(self):
+        from settings_app.utils import check_shared_cache
+        check_shared_cache()
@@ -1,17 +1,25 @@
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject, lazy
 
 from dynamic_preferences.registries import global_preferences_registry
-from orders_app.services.cart import CartService
+from orders_app.services.cart import CartService, get_cart_summary
 from orders_app.views import CompareView
 from stores_app.forms import ImportForm
 from stores_app.models import ProductImportFile
 
 
-def custom_context(request):
+def get_banners_time_expire() -> int:
+    """
+    Время кэширования блока баннеров из настроек сайта
+    """
+    return global_preferences_registry.manager()['general__banners_time_expire']
+
 
-    OPTIONS = global_preferences_registry.manager().by_name()
-    cart = CartService(request)
-    total = CompareView().get_quantity(request)
+def custom_context(request):
+    """
+    Контекст-процессор сообщений, корзины и сравнения. Корзина, ее итоги, количество сравниваемых товаров
+    и время кэширования баннеров вычисляются только при обращении к ним из шаблона
+    """
     return {
         'SUCCESS_OPTIONS_ACTIVATE': settings.SUCCESS_OPTIONS_ACTIVATE,
         'SEND_PRODUCT_REQUEST': settings.SEND_PRODUCT_REQUEST,
@@ -23,9 +31,10 @@ def custom_context(request):
         'SUCCESS_DEL_PRODUCT_DISCOUNT': settings.SUCCESS_DEL_PRODUCT_DISCOUNT,
         'SUCCESS_ADD_TO_CART': settings.SUCCESS_ADD_TO_CART,
         'ERROR_ADD_TO_CART': settings.ERROR_ADD_TO_CART,
-        'cart': cart,
-        'total_compared': total,
-        'banners_time_expire': OPTIONS['banners_time_expire'],
+        'cart': SimpleLazyObject(lambda: CartService(request)),
+        'cart_summary': SimpleLazyObject(lambda: get_cart_summary(request)),
+        'total_compared': SimpleLazyObject(lambda: CompareView.get_quantity(request)),
+        'banners_time_expire': lazy(get_banners_time_expire, int)(),
     }
 
 
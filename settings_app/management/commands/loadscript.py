@@ -60,6 +60,9 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.WARNING('Not all fixtures have been loaded. Check it:'))
                 self.stdout.write(self.style.WARNING(err_list))
             else:
+                management.call_command('rebuild_search_index')
+                management.call_command('reconcile_counters')
+                management.call_command('refresh_effective_prices')
                 self.stdout.write(self.style.SUCCESS('\nAll commands and loadings have been successful!'))
                 self.stdout.write(self.style.SUCCESS(f'\nFixtures upload order: {order_load}'))
 
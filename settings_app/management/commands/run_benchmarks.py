@@ -0,0 +1,74 @@
+import json
+import platform
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from benchmarks.cases import cart_cases, prices_cases, catalog_cases
+from benchmarks.data import generate_data
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic data and benchmark cart and catalog pricing. ' \
+           'The data is rolled back and an isolated in-memory cache is used'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--seller-products',
+                            type=int,
+                            default=1000,
+                            help='Number of generated products in shops (1k - 1M)')
+        parser.add_argument('--sellers',
+                            type=int,
+                            default=10,
+                            help='Number of generated sellers')
+        parser.add_argument('--repeat',
+                            type=int,
+                            default=5,
+                            help='Number of timed runs of every case')
+        parser.add_argument('--output',
+                            type=str,
+                            help='Path of the JSON report. The report is printed, if it is not set')
+
+    def handle(self, *args, **kwargs) -> None:
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmarks'}}
+        with override_settings(CACHES=caches, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), \
+                transaction.atomic():
+            start = time.perf_counter()
+            data = generate_data(kwargs['seller_products'], kwargs['sellers'])
+            generation_time = time.perf_counter() - start
+
+            results = cart_cases(data, kwargs['repeat'])
+            results += prices_cases(data, kwargs['repeat'])
+            results += catalog_cases(kwargs['repeat'])
+            transaction.set_rollback(True)
+
+        report = json.dumps({
+            'meta': {
+                'commit': self.get_commit(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'seller_products': kwargs['seller_products'],
+                'sellers': kwargs['sellers'],
+                'repeat': kwargs['repeat'],
+                'generation_time': generation_time,
+            },
+            'results': results,
+        }, indent=2)
+        if kwargs['output']:
+            with open(kwargs['output'], 'w') as file:
+                file.write(report)
+            self.stdout.write(self.style.SUCCESS(f'Benchmark report was saved to {kwargs["output"]}'))
+        else:
+            self.stdout.write(report)
+
+    @staticmethod
+    def get_commit() -> str or None:
+        try:
+            return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
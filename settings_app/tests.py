@@ -1,3 +1,91 @@
-from django.test import TestCase
+import json
+import tempfile
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+
+from goods_app.models import Product, ProductCategory
+from orders_app.models import Order
+from orders_app.services.cart import CartService
+from profiles_app.models import User
+from settings_app.context_processor import custom_context
+from settings_app.utils import check_shared_cache
+from stores_app.models import Seller, SellerProduct
+
+
+class RunBenchmarksTest(TestCase):
+    """ Тесты команды замера производительности расчета цен """
+
+    def test_report(self):
+        """Тест отчета команды: все замеры выполнены, синтетические данные не сохраняются"""
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command('run_benchmarks', seller_products=50, sellers=2, repeat=1, output=output.name,
+                         stdout=StringIO())
+            report = json.load(output)
+
+        self.assertEqual(report['meta']['seller_products'], 50)
+        names = {result['name'] for result in report['results']}
+        self.assertEqual(names, {'discounts_service', 'discounted_prices', 'catalog_page', 'catalog_ajax'})
+        for result in report['results']:
+            self.assertGreater(result['wall_time']['median'], 0)
+            self.assertGreaterEqual(result['queries'], 1)
+            self.assertGreater(result['peak_memory'], 0)
+        self.assertFalse(Seller.objects.exists())
+
+
+class CustomContextTest(TestCase):
+    """ Тесты ленивого контекст-процессора корзины и сравнения """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='test@user.com', password='testp@sw0rd', first_name='user',
+                                            last_name='test', phone='+7(922)222-22-22')
+        seller = Seller.objects.create(name='Test Store', slug='test-store', owner=cls.user)
+        category = ProductCategory.objects.create(name='Test category', slug='test-category')
+        product = Product.objects.create(category=category, name='Product', slug='product')
+        cls.seller_product = SellerProduct.objects.create(seller=seller, product=product, price=100, quantity=10)
+
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+        self.request.session = self.client.session
+
+    def test_lazy_context(self):
+        """Тест отсутствия запросов и создания корзины, пока шаблон не обращается к корзине"""
+        with self.assertNumQueries(0):
+            custom_context(self.request)
+        self.assertFalse(Order.objects.exists())
+
+    def test_cart_summary(self):
+        """Тест кэширования итогов корзины и их сброса при изменении корзины и цены товара"""
+        self.assertEqual(tuple(custom_context(self.request)['cart_summary']), (0, 0))
+        with self.assertNumQueries(0):
+            self.assertEqual(custom_context(self.request)['cart_summary'].quantity, 0)
+
+        CartService(self.request).add_to_cart(self.seller_product, 3)
+        self.assertEqual(tuple(custom_context(self.request)['cart_summary']), (1, 300))
+
+        self.seller_product.price = 150
+        self.seller_product.save(update_fields=['price'])
+        self.assertEqual(tuple(custom_context(self.request)['cart_summary']), (1, 450))
+
+
+class SharedCacheTest(SimpleTestCase):
+    """ Тесты проверки общего для процессов кэша """
+
+    def test_process_local_cache(self):
+        """Тест запрета локального кэша процесса вне режима отладки"""
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+                              'LOCATION': '127.0.0.1:11211'}}
+        with override_settings(DEBUG=True, CACHES=local):
+            check_shared_cache()
+        with override_settings(DEBUG=False, CACHES=shared):
+            check_shared_cache()
+        with override_settings(DEBUG=False, CACHES=local):
+            with self.assertRaises(ImproperlyConfigured):
+                check_shared_cache()
@@ -1,12 +1,21 @@
+import uuid
 from typing import Callable
 
-from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import transaction
 from django.utils.safestring import mark_safe
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
 from dynamic_preferences.registries import global_preferences_registry
 
+# кэши, не общие для процессов приложения: версии данных в них не видны другим процессам
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
 
 def get_help_text(**kwargs) -> Callable:
     """
@@ -55,3 +64,44 @@ def check_image_resolution(image) -> bool:
         return True
     except (ValueError, AttributeError):
         return False
+
+
+def get_cache_version(key: str) -> str:
+    """
+    Get version of cached data shared between processes. A missing or expired version gets a new random value,
+    so data built by processes from the version is never kept longer than CACHE_VERSION_TIME
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, settings.CACHE_VERSION_TIME)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(key: str) -> str:
+    """
+    Set new version of cached data shared between processes
+    """
+    version = uuid.uuid4().hex
+    cache.set(key, version, settings.CACHE_VERSION_TIME)
+    return version
+
+
+def bump_cache_version_on_commit(key: str) -> None:
+    """
+    Set new version of cached data after the current transaction is committed, so other processes
+    do not rebuild the data before the changes are visible to them
+    """
+    transaction.on_commit(lambda: bump_cache_version(key))
+
+
+def check_shared_cache() -> None:
+    """
+    Check that the default cache is shared between processes. Versions of in-process indexes (discount rule sets,
+    category tree, autocomplete) and anonymous carts are kept in the cache, so with a process-local cache changes
+    made by one process never reach the others. Only DEBUG mode may run with a process-local cache
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if not settings.DEBUG and backend in PROCESS_LOCAL_CACHE_BACKENDS:
+        raise ImproperlyConfigured(f'Cache backend {backend} is not shared between processes. '
+                                   'Set CACHE_BACKEND and CACHE_LOCATION to a shared cache or enable DEBUG.')
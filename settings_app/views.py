@@ -14,9 +14,11 @@ from django.views import View
 from dynamic_preferences.registries import global_preferences_registry
 
 from django.conf import settings
+from goods_app.services.card_cache import invalidate_cards
+from goods_app.services.catalog_cache import reset_catalog_cache
 from goods_app.services.limited_products import random_product, get_limited_products
 from goods_app.models import Product
-from stores_app.models import Seller
+from stores_app.models import Seller, SellerProduct
 
 User = get_user_model()
 
@@ -104,6 +106,8 @@ def clear_catalog_cache(request: HttpRequest) -> Callable:
                        'hot_offers:all',
                        'stores:all',
                        'random_categories:all'])
+    invalidate_cards(SellerProduct.objects.values_list('pk', flat=True))
+    reset_catalog_cache()
     messages.add_message(request, settings.SUCCESS_OPTIONS_ACTIVATE, _('Cache was cleaned.'))
     return redirect(request.META.get('HTTP_REFERER'))
 
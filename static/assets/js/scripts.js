@@ -1190,6 +1190,34 @@ function searchFoo(some_page) {
     })
 }
 
+// ======================================= search suggestions ========================================================
+
+function autocompleteFoo() {
+    const input = document.getElementById('query')
+    const datalist = document.getElementById('query_suggestions')
+    let timer = null
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer)
+        timer = setTimeout(function () {
+            if (input.value.trim().length < 2) {
+                datalist.innerHTML = ''
+                return
+            }
+            fetch(`${input.dataset.url}?q=${encodeURIComponent(input.value)}`)
+                .then(response => response.json())
+                .then(function (data) {
+                    datalist.innerHTML = ''
+                    data.suggestions.forEach(function (suggestion) {
+                        const option = document.createElement('option')
+                        option.value = suggestion.label
+                        datalist.appendChild(option)
+                    })
+                })
+        }, 150)
+    })
+}
+
 // ======================================  set languages ==============================================================
 
 function getCookie(name) {
@@ -1253,6 +1281,7 @@ function main() {
 
         if (document.getElementById('search_div')) {
             searchFoo()
+            autocompleteFoo()
         }
 
         if (document.querySelectorAll('#submit_btn').length > 0) {
@@ -72,6 +72,10 @@ class SellerProduct(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_('price'))
     quantity = models.IntegerField(verbose_name=_('quantity'))
     date_added = models.DateTimeField(verbose_name=_('date added'), auto_now_add=True)
+    sold_quantity = models.PositiveIntegerField(default=0, db_index=True, editable=False,
+                                                verbose_name=_('sold quantity'))
+    paid_orders_count = models.PositiveIntegerField(default=0, db_index=True, editable=False,
+                                                    verbose_name=_('paid orders count'))
 
     def __str__(self) -> str:
         return f'{self.product} in {self.seller}'
@@ -1,7 +1,11 @@
 from django.core.cache import cache
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_save, pre_delete, post_delete
 from django.dispatch import receiver
 
+from goods_app.services.autocomplete import update_suggestion
+from goods_app.services.card_cache import invalidate_cards
+from goods_app.services.catalog_cache import reset_catalog_cache
+from goods_app.services.search import index_seller_products
 from stores_app.models import Seller, SellerProduct
 
 
@@ -13,6 +17,7 @@ def seller_reset_cache_save_handler(sender, **kwargs) -> None:
     user_id = kwargs['instance'].owner_id
     cache.delete('stores:{}'.format(user_id))
     cache.delete('stores:all')
+    reset_catalog_cache()
 
 
 @receiver(pre_delete, sender=Seller)
@@ -26,6 +31,7 @@ def seller_reset_cache_del_handler(sender, **kwargs) -> None:
     cache.delete('stores:{}'.format(user_id))
     cache.delete('seller_sp:{}'.format(user_id))
     cache.delete('stores:all')
+    reset_catalog_cache()
 
 
 @receiver(post_save, sender=SellerProduct)
@@ -36,6 +42,7 @@ def seller_product_reset_cache_save_handler(sender, **kwargs) -> None:
     user_id = kwargs['instance'].seller.owner_id
     cache.delete('owner_sp:{}'.format(user_id))
     cache.delete_many(['limited:all', 'hot_offers:all', 'products:all'])
+    reset_catalog_cache()
 
 
 @receiver(pre_delete, sender=SellerProduct)
@@ -47,3 +54,63 @@ def seller_product_reset_cache_del_handler(sender, **kwargs) -> None:
     user_id = instance.seller.owner_id
     cache.delete('owner_sp:{}'.format(user_id))
     cache.delete_many(['limited:all', 'hot_offers:all', 'products:all'])
+    reset_catalog_cache()
+
+
+@receiver(post_save, sender=Seller)
+def seller_search_index_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search index of store products
+    """
+    if not kwargs.get('raw') and not kwargs.get('created'):
+        index_seller_products(SellerProduct.objects.filter(seller=kwargs['instance']))
+
+
+@receiver(post_save, sender=SellerProduct)
+def seller_product_search_index_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search index of product in shop
+    """
+    if not kwargs.get('raw'):
+        index_seller_products(SellerProduct.objects.filter(pk=kwargs['instance'].pk))
+
+
+@receiver(post_save, sender=Seller)
+def seller_cards_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for invalidating rendered cards of store products
+    """
+    if not kwargs.get('created'):
+        invalidate_cards(SellerProduct.objects.filter(seller=kwargs['instance']).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=SellerProduct)
+def seller_product_cards_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for invalidating rendered cards of product in shop
+    """
+    invalidate_cards([kwargs['instance'].pk])
+
+
+@receiver(pre_delete, sender=SellerProduct)
+def seller_product_cards_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for invalidating rendered cards of product in shop
+    """
+    invalidate_cards([kwargs['instance'].pk])
+
+
+@receiver(post_save, sender=Seller)
+def seller_autocomplete_save_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search suggestions
+    """
+    update_suggestion('store', kwargs['instance'])
+
+
+@receiver(post_delete, sender=Seller)
+def seller_autocomplete_del_handler(sender, **kwargs) -> None:
+    """
+    Signal for updating search suggestions
+    """
+    update_suggestion('store', kwargs['instance'], deleted=True)